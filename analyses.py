@@ -0,0 +1,379 @@
+"""Importable weapon analyses.
+
+Every analysis is a pure function registered with ``@analysis``.  It
+declares the weapons-frame columns it reads and the other analyses it
+builds on, takes the frame plus the results of those dependencies, and
+returns an AnalysisResult holding DataFrames and scalar values.  Nothing is
+printed or plotted here; analyze_weapons.py formats the results.
+
+``run`` resolves the requested analyses and their dependencies in
+registration order and evaluates only those, so a service can compute one
+leaderboard without running the whole report:
+
+    from weapon_data import load_weapons
+    from analyses import prepare_frame, run
+
+    df = prepare_frame(load_weapons())
+    top = run(df, ['power'])['power'].tables['top_20m']
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from class_index import ClassIndex
+from correlations import correlate
+from outlier_engine import find_outliers
+from range_table import build_range_table
+from ttk_engine import BTK_COLUMNS, BTK_DISTANCES, POWER_TTK, TTK_COLUMNS, ttk_grid
+from weapon_data import SCHEMA
+
+ID_COLUMNS = ['Weapon', 'Weapon Class']
+# Every numeric column of the weapons frame, in file order
+NUMERIC_COLUMNS = [col for col, dtype in SCHEMA.items() if dtype not in ('str', 'category')]
+OUTLIER_METRICS = ['RPM', 'TTK at 20 m, ms', '20 m Power Score',
+                   'Burst Accuracy Coefficient', 'Velocity, ms']
+CLASS_METRICS = ['RPM', 'TTK at 20 m, ms', '20 m Power Score', 'Burst Accuracy Coefficient']
+SUMMARY_METRICS = ['RPM', 'TTK at 20 m, ms', '20 m Power Score',
+                   'Burst Accuracy Coefficient', 'Velocity, ms']
+# Composite score components: column -> weight
+COMPOSITE_WEIGHTS = {
+    '20 m Power Score': 0.4,
+    'Burst Accuracy Coefficient': 0.3,
+    'RPM': 0.15,
+    'Velocity, ms': 0.15,
+}
+EXTRA_DISTANCES = [10, 50, 120]
+# Columns where a lower value ranks better (the rest rank higher first)
+LOWER_IS_BETTER = set(TTK_COLUMNS + BTK_COLUMNS + list(POWER_TTK) + ['fire interval ms'])
+# Rows per chunk when a derived column is computed over the whole frame
+DERIVED_CHUNK = 131_072
+# Correlation intervals and p-values are opt-in (``resamples``, e.g. 2000),
+# and only run up to CORRELATION_RESAMPLE_ROWS weapons (with more, the
+# intervals are narrow and resampling costs seconds per thousand rows)
+CORRELATION_RESAMPLE_ROWS = 1000
+LEADERBOARD_SIZE = 5
+
+
+@dataclass
+class AnalysisResult:
+    """Output of one analysis: named tables plus scalar values."""
+    name: str
+    tables: dict = field(default_factory=dict)
+    values: dict = field(default_factory=dict)
+
+    def __getitem__(self, key):
+        return self.tables[key]
+
+
+@dataclass
+class Analysis:
+    """A registered analysis and what it depends on."""
+    name: str
+    func: object
+    title: str
+    columns: tuple
+    requires: tuple
+    chart: str = None
+
+
+REGISTRY = {}
+
+
+def analysis(name, title, columns, requires=(), chart=None):
+    """Register ``func(df, deps) -> AnalysisResult`` under ``name``.
+
+    ``columns`` are the weapons-frame columns the function reads and
+    ``requires`` the analyses whose results it receives in ``deps``.
+    ``chart`` names the figure in charts.py that illustrates it.
+    """
+    def register(func):
+        unknown = [dep for dep in requires if dep not in REGISTRY]
+        if unknown:
+            raise ValueError(f"analysis {name!r} requires unregistered {unknown}")
+        REGISTRY[name] = Analysis(name, func, title, tuple(columns), tuple(requires), chart)
+        return func
+    return register
+
+
+def resolve(names):
+    """``names`` plus their transitive dependencies, in registration order."""
+    needed = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in REGISTRY:
+            raise KeyError(f"unknown analysis {name!r}; available: {', '.join(REGISTRY)}")
+        if name not in needed:
+            needed.add(name)
+            pending.extend(REGISTRY[name].requires)
+    # Dependencies are always registered before their dependents
+    return [name for name in REGISTRY if name in needed]
+
+
+def required_columns(names):
+    """Every frame column read by ``names`` and their dependencies."""
+    columns = []
+    for name in resolve(names):
+        columns.extend(col for col in REGISTRY[name].columns if col not in columns)
+    return columns
+
+
+def run(df, names=None, results=None, options=None):
+    """Evaluate ``names`` (all analyses by default) and their dependencies.
+
+    ``results`` may hold previously computed results, which are reused
+    rather than recomputed.  ``options`` maps an analysis name to keyword
+    arguments for it, e.g. ``{'correlation': {'resamples': 2000}}``.
+    Returns a dict of every evaluated result.
+    """
+    order = resolve(list(REGISTRY) if names is None else names)
+    missing = [col for col in required_columns(order) if col not in df.columns]
+    if missing:
+        raise KeyError(f"weapons frame is missing columns {missing}")
+
+    results = dict(results or {})
+    for name in order:
+        if name not in results:
+            spec = REGISTRY[name]
+            with profiling.span(name, 'analysis', rows=len(df)):
+                results[name] = spec.func(df, {dep: results[dep] for dep in spec.requires},
+                                          **(options or {}).get(name, {}))
+    return results
+
+
+def prepare_frame(df, lean=False):
+    """Replace the spreadsheet TTK columns with engine-derived values.
+
+    The engine uses the exact fire interval from RPM, so its TTKs are not
+    rounded to whole milliseconds like the spreadsheet's.  The other
+    columns are shared with ``df``, not copied, and each TTK column is
+    computed as its own array so the frame takes it over without a copy.
+    ``lean`` stores the TTKs as float32 instead of float64, and is recorded
+    in ``attrs['lean']`` so analyses take their memory-bounded paths.
+    """
+    dtype = np.float32 if lean else np.float64
+    ttk = {col: ttk_grid(df, distance, dtype=dtype)[:, 0]
+           for col, distance in zip(TTK_COLUMNS, BTK_DISTANCES)}
+    frame = pd.DataFrame({col: ttk.get(col, df[col]) for col in df.columns}, copy=False)
+    frame.attrs['lean'] = lean
+    return frame
+
+
+def _first_n(keys, n):
+    """Positions of the ``n`` smallest ``keys`` (ties to the earliest), unordered."""
+    cutoff = np.partition(keys, n - 1)[n - 1]
+    below = np.flatnonzero(keys < cutoff)
+    tied = np.flatnonzero(keys == cutoff)[:n - len(below)]
+    return np.concatenate([below, tied])
+
+
+def top_rows(values, n=LEADERBOARD_SIZE, largest=False):
+    """Positions of the ``n`` smallest (or largest) non-NaN ``values``, best first.
+
+    Ties keep row order, like ``DataFrame.nsmallest``/``nlargest``.  Each
+    chunk of DERIVED_CHUNK rows contributes at most ``n`` candidates, and
+    only the candidates are sorted.
+    """
+    values = np.asarray(values)
+    candidates = []
+    for lo in range(0, len(values), DERIVED_CHUNK):
+        keys = values[lo:lo + DERIVED_CHUNK].astype(np.float64)
+        if largest:
+            np.negative(keys, out=keys)
+        rows = np.flatnonzero(~np.isnan(keys))
+        if n < len(rows):
+            rows = rows[_first_n(keys[rows], n)]
+        candidates.append(rows + lo)
+    rows = np.sort(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.intp)
+    keys = values[rows].astype(np.float64)
+    return rows[np.argsort(-keys if largest else keys, kind='stable')[:n]]
+
+
+def leaderboard(df, metric, n=LEADERBOARD_SIZE, largest=False, values=None):
+    """The ``n`` best (or worst) rows for ``metric``: identity columns + metric.
+
+    ``values`` ranks by a derived metric that is not a column of ``df``; it
+    is added to the table under the name ``metric``.
+    """
+    if values is None:
+        rows = top_rows(df[metric].to_numpy(), n, largest)
+        return df.iloc[rows][ID_COLUMNS + [metric]]
+    rows = top_rows(values, n, largest)
+    table = df.iloc[rows][ID_COLUMNS].copy()
+    table[metric] = np.asarray(values)[rows]
+    return table
+
+
+def btk_variance(df):
+    """Variance of every weapon's BTK across the breakpoints, computed in row chunks."""
+    return np.concatenate([df[BTK_COLUMNS].iloc[lo:lo + DERIVED_CHUNK].var(axis=1).to_numpy()
+                           for lo in range(0, len(df), DERIVED_CHUNK)] or [np.empty(0)])
+
+
+@analysis('class_index', 'WEAPON CLASS INDEX', ['Weapon Class'])
+def class_index(df, deps):
+    # Shared by every per-class analysis; pass it back to ``run`` (or to
+    # charts.render_charts) to avoid rebuilding it
+    return AnalysisResult('class_index', values={'index': ClassIndex.from_frame(df)})
+
+
+@analysis('ttk', 'ANALYSIS 1: TIME TO KILL (TTK) PERFORMANCE',
+          ID_COLUMNS + TTK_COLUMNS + BTK_COLUMNS + ['RPM', 'fire interval ms', 'Velocity, ms'],
+          chart='1_ttk_analysis.png')
+def ttk_performance(df, deps):
+    tables = {'best_0m': leaderboard(df, 'TTK at 0 m, ms'),
+              'worst_0m': leaderboard(df, 'TTK at 0 m, ms', largest=True)}
+
+    # Distances the spreadsheet does not measure, derived by the TTK engine
+    extra_ttk = ttk_grid(df, EXTRA_DISTANCES)
+    for col, dist in enumerate(EXTRA_DISTANCES):
+        best = top_rows(extra_ttk[:, col])
+        table = df.iloc[best][ID_COLUMNS].copy()
+        table[f'TTK at {dist} m, ms'] = extra_ttk[best, col]
+        tables[f'best_{dist}m'] = table
+    return AnalysisResult('ttk', tables)
+
+
+@analysis('power', 'ANALYSIS 2: POWER SCORES (Accuracy-Adjusted Performance)',
+          ID_COLUMNS + ['20 m Power Score'], chart='2_power_scores.png')
+def power_scores(df, deps):
+    return AnalysisResult('power', {'top_20m': leaderboard(df, '20 m Power Score')})
+
+
+@analysis('rpm', 'ANALYSIS 3: RPM (Rate of Fire) vs TTK RELATIONSHIP',
+          ID_COLUMNS + ['RPM'], chart='3_rpm_vs_ttk.png')
+def rate_of_fire(df, deps):
+    return AnalysisResult('rpm', {'highest': leaderboard(df, 'RPM', largest=True),
+                                  'lowest': leaderboard(df, 'RPM')})
+
+
+@analysis('accuracy', 'ANALYSIS 4: ACCURACY ANALYSIS',
+          ID_COLUMNS + ['Burst Accuracy Coefficient'], chart='4_accuracy_analysis.png')
+def accuracy(df, deps):
+    metric = 'Burst Accuracy Coefficient'
+    return AnalysisResult('accuracy', {'most_accurate': leaderboard(df, metric, largest=True),
+                                       'least_accurate': leaderboard(df, metric)})
+
+
+@analysis('classes', 'ANALYSIS 5: WEAPON CLASS COMPARISON',
+          ['Weapon Class'] + CLASS_METRICS, requires=['class_index'],
+          chart='5_class_comparison.png')
+def class_comparison(df, deps):
+    index = deps['class_index'].values['index']
+    means = np.column_stack([index.mean(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+                             for col in CLASS_METRICS])
+    stats = pd.DataFrame(means, index=index.names,
+                         columns=['Avg RPM', 'Avg TTK@20m', 'Avg 20m Power Score', 'Avg Burst Accuracy'])
+    stats.insert(0, 'Count', index.counts())
+    return AnalysisResult('classes', {'stats': stats})
+
+
+@analysis('falloff', 'ANALYSIS 6: DAMAGE FALLOFF ANALYSIS',
+          ID_COLUMNS + BTK_COLUMNS, chart='6_damage_falloff.png')
+def damage_falloff(df, deps):
+    # "Consistency" - variance in BTK across ranges
+    variance = btk_variance(df)
+    return AnalysisResult('falloff', {
+        'most_consistent': leaderboard(df, 'BTK_Variance', values=variance),
+        'least_consistent': leaderboard(df, 'BTK_Variance', largest=True, values=variance),
+    })
+
+
+@analysis('lethality', 'ANALYSIS 7: PRACTICAL LETHALITY COEFFICIENT',
+          ID_COLUMNS + ['practical lethality coefficient'], chart='7_lethality.png')
+def lethality(df, deps):
+    # Leaderboards skip weapons without a coefficient
+    metric = 'practical lethality coefficient'
+    return AnalysisResult('lethality', {'highest': leaderboard(df, metric, largest=True),
+                                        'lowest': leaderboard(df, metric)})
+
+
+@analysis('velocity', 'ANALYSIS 8: PROJECTILE VELOCITY ANALYSIS',
+          ID_COLUMNS + ['Velocity, ms'], chart='8_velocity.png')
+def velocity(df, deps):
+    return AnalysisResult('velocity', {'fastest': leaderboard(df, 'Velocity, ms', largest=True),
+                                       'slowest': leaderboard(df, 'Velocity, ms')})
+
+
+@analysis('outliers', 'ANALYSIS 9: OUTLIER DETECTION', ID_COLUMNS + OUTLIER_METRICS,
+          requires=['class_index'])
+def outliers(df, deps, threshold=2.0, scope='global', robust=False):
+    table = find_outliers(df, OUTLIER_METRICS, threshold, scope, robust,
+                          classes=deps['class_index'].values['index'],
+                          lean=df.attrs.get('lean', False))
+    return AnalysisResult('outliers', {'outliers': table},
+                          {'threshold': threshold, 'scope': scope, 'robust': robust})
+
+
+@analysis('correlation', 'ANALYSIS 10: CORRELATION ANALYSIS', NUMERIC_COLUMNS,
+          chart='9_correlation_heatmap.png')
+def correlation(df, deps, method='pearson', seed=0, resamples=0, workers=1):
+    # The declared columns rather than every numeric column of ``df``, so
+    # extra columns a caller adds do not go unseen by invalidation.
+    # ``resamples`` bootstrap resamples and permutations give every pair an
+    # interval and p-value; ``workers`` spreads the permutations over
+    # processes (None: one per core), which only pays off for large counts.
+    if len(df) > CORRELATION_RESAMPLE_ROWS:
+        resamples = 0
+    report = correlate(df, NUMERIC_COLUMNS, method, n_boot=resamples, n_perm=resamples,
+                       seed=seed, workers=workers)
+    return AnalysisResult('correlation', {'matrix': report.matrix, 'pairs': report.pairs},
+                          {'method': method, 'confidence': report.confidence,
+                           'resamples': resamples})
+
+
+@analysis('ranges', 'ANALYSIS 11: BEST WEAPON BY DISTANCE (0-150 m)',
+          ID_COLUMNS + BTK_COLUMNS + ['RPM', 'fire interval ms', 'Velocity, ms',
+                                      'Burst Accuracy Coefficient'],
+          requires=['class_index'])
+def ranges(df, deps):
+    # The RangeTable answers "best weapon at d metres" with one searchsorted
+    table = build_range_table(df, classes=deps['class_index'].values['index'])
+    return AnalysisResult('ranges', {'intervals': table.table()}, {'index': table})
+
+
+def composite_components(df, limits=None):
+    """Normalised composite score components, shape (n_weapons, 4).
+
+    Columns follow COMPOSITE_WEIGHTS and are all "higher is better": the
+    power score (lower is better) is min-max normalised and inverted, the
+    rest are divided by their maximum.  The composite score is this matrix
+    times the weight vector.  ``limits`` maps every column to the (min, max)
+    to normalise by, the column's own by default; pass the whole frame's to
+    score a slice of it.
+    """
+    components = np.empty((len(df), len(COMPOSITE_WEIGHTS)))
+    for j, col in enumerate(COMPOSITE_WEIGHTS):
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        low, high = limits[col] if limits else (np.nanmin(values), np.nanmax(values))
+        components[:, j] = composite_component(col, values, low, high)
+    return components
+
+
+def composite_component(col, values, low, high):
+    """The composite component of column ``col``, normalised by its (low, high)."""
+    if col == '20 m Power Score':
+        return 1 - (values - low) / (high - low)
+    return values / high
+
+
+def composite_scores(df):
+    """Composite score of every weapon (higher is better), computed in row chunks."""
+    limits = {col: (float(df[col].min()), float(df[col].max())) for col in COMPOSITE_WEIGHTS}
+    weights = np.array(list(COMPOSITE_WEIGHTS.values()))
+    return np.concatenate([composite_components(df.iloc[lo:lo + DERIVED_CHUNK], limits) @ weights
+                           for lo in range(0, len(df), DERIVED_CHUNK)] or [np.empty(0)])
+
+
+@analysis('composite', 'COMPOSITE SCORE', ID_COLUMNS + list(COMPOSITE_WEIGHTS))
+def composite(df, deps):
+    return AnalysisResult('composite', {'top_10': leaderboard(
+        df, 'composite_score', n=10, largest=True, values=composite_scores(df))})
+
+
+@analysis('summary', 'FINAL SUMMARY STATISTICS', SUMMARY_METRICS, requires=['composite'])
+def summary(df, deps):
+    return AnalysisResult('summary', {'describe': df[SUMMARY_METRICS].describe(),
+                                      'top_10': deps['composite']['top_10']})
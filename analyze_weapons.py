@@ -1,565 +1,340 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-from scipy import stats
+"""Battlefield 6 weapon analysis.
+
+Usage:
+    python analyze_weapons.py                 # every analysis, then the charts
+    python analyze_weapons.py text            # printed analyses only
+    python analyze_weapons.py charts          # charts only
+    python analyze_weapons.py run ttk power   # selected analyses (add --charts for their figures)
+    python analyze_weapons.py --profile text  # also write per-stage timings to profile.json
+
+The analyses themselves live in analyses.py and can be imported on their
+own; this script prints their results and renders the figures.  The
+plotting stack (matplotlib, seaborn) is only imported when a chart
+actually has to be rendered, so text-only runs start fast.
+"""
+import argparse
 import sys
 import io
 
-# Set UTF-8 encoding for console output on Windows
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-
-# Set style for better-looking plots
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 8)
-
-# Load the data
-print("Loading data...")
-df = pd.read_csv('data.csv')
-
-# Clean the data - remove explanation columns and rows
-df = df.iloc[:, :22]  # Keep only the first 22 columns (before explanations)
-df = df.dropna(subset=['Weapon'])  # Remove rows without weapon names
-
-# Convert numeric columns
-numeric_cols = df.columns[2:]  # All columns except Weapon and Weapon Class
-for col in numeric_cols:
-    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-print(f"\nDataset Overview:")
-print(f"Total Weapons: {len(df)}")
-print(f"\nWeapon Classes Distribution:")
-print(df['Weapon Class'].value_counts())
-
-# Create output directory for plots
-import os
-os.makedirs('analysis_output', exist_ok=True)
-
-# ============================================================================
-# ANALYSIS 1: TTK (Time to Kill) Performance
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 1: TIME TO KILL (TTK) PERFORMANCE")
-print("="*80)
-
-fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-fig.suptitle('Time to Kill Analysis Across Distances', fontsize=16, fontweight='bold')
-
-distances = ['TTK at 0 m, ms', 'TTK at 20 m, ms', 'TTK at 35 m, ms', 'TTK at 75 m, ms']
-distance_labels = ['0m', '20m', '35m', '75m']
-
-for idx, (dist, label) in enumerate(zip(distances, distance_labels)):
-    ax = axes[idx // 2, idx % 2]
-    
-    # Sort by TTK
-    sorted_df = df.sort_values(dist)
-    top_5 = sorted_df.head(5)
-    bottom_5 = sorted_df.tail(5)
-    
-    # Plot
-    colors = ['green' if x in top_5['Weapon'].values else 'red' if x in bottom_5['Weapon'].values else 'gray' 
-              for x in df['Weapon']]
-    
-    ax.barh(range(len(df)), df.sort_values(dist)[dist], color=colors, alpha=0.7)
-    ax.set_yticks(range(len(df)))
-    ax.set_yticklabels(df.sort_values(dist)['Weapon'], fontsize=8)
-    ax.set_xlabel('TTK (milliseconds)', fontsize=10)
-    ax.set_title(f'TTK at {label} (Green=Best 5, Red=Worst 5)', fontsize=12, fontweight='bold')
-    ax.invert_yaxis()
-
-plt.tight_layout()
-plt.savefig('analysis_output/1_ttk_analysis.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 1_ttk_analysis.png")
-
-# Best and Worst performers
-print(f"\n🎯 BEST TTK at 0m:")
-for idx, row in df.nsmallest(5, 'TTK at 0 m, ms').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['TTK at 0 m, ms']:.0f}ms")
-
-print(f"\n❌ WORST TTK at 0m:")
-for idx, row in df.nlargest(5, 'TTK at 0 m, ms').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['TTK at 0 m, ms']:.0f}ms")
-
-# ============================================================================
-# ANALYSIS 2: Power Scores Comparison
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 2: POWER SCORES (Accuracy-Adjusted Performance)")
-print("="*80)
-
-fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-fig.suptitle('Power Score Analysis (Lower is Better)', fontsize=16, fontweight='bold')
-
-power_scores = ['20 m Power Score', '21 m Power Score', '35 m Power Score', '75 m Power Score']
-power_labels = ['20m', '21m', '35m', '75m']
-
-for idx, (score, label) in enumerate(zip(power_scores, power_labels)):
-    ax = axes[idx // 2, idx % 2]
-    
-    # Create scatter plot by weapon class
-    for weapon_class in df['Weapon Class'].unique():
-        class_data = df[df['Weapon Class'] == weapon_class]
-        ax.scatter(class_data.index, class_data[score], label=weapon_class, s=100, alpha=0.7)
-    
-    ax.set_xlabel('Weapon Index', fontsize=10)
-    ax.set_ylabel('Power Score', fontsize=10)
-    ax.set_title(f'{label} Power Score by Class', fontsize=12, fontweight='bold')
-    ax.legend()
-    ax.grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('analysis_output/2_power_scores.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 2_power_scores.png")
-
-# Best Power Scores
-print(f"\n🏆 TOP 5 Overall Power Score (20m - Most Important):")
-for idx, row in df.nsmallest(5, '20 m Power Score').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['20 m Power Score']:.0f}")
-
-# ============================================================================
-# ANALYSIS 3: RPM vs TTK Relationship
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 3: RPM (Rate of Fire) vs TTK RELATIONSHIP")
-print("="*80)
-
-fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-fig.suptitle('RPM vs TTK at Different Ranges', fontsize=16, fontweight='bold')
-
-for idx, (dist, label) in enumerate(zip(distances, distance_labels)):
-    ax = axes[idx // 2, idx % 2]
-    
-    for weapon_class in df['Weapon Class'].unique():
-        class_data = df[df['Weapon Class'] == weapon_class]
-        ax.scatter(class_data['RPM'], class_data[dist], label=weapon_class, s=100, alpha=0.7)
-        
-        # Add weapon names for outliers
-        q1 = class_data[dist].quantile(0.25)
-        q3 = class_data[dist].quantile(0.75)
-        iqr = q3 - q1
-        outliers = class_data[(class_data[dist] < q1 - 1.5*iqr) | (class_data[dist] > q3 + 1.5*iqr)]
-        for _, outlier in outliers.iterrows():
-            ax.annotate(outlier['Weapon'], (outlier['RPM'], outlier[dist]), 
-                       fontsize=7, alpha=0.7)
-    
-    ax.set_xlabel('RPM (Rounds Per Minute)', fontsize=10)
-    ax.set_ylabel(f'TTK at {label} (ms)', fontsize=10)
-    ax.set_title(f'RPM vs TTK at {label}', fontsize=12, fontweight='bold')
-    ax.legend()
-    ax.grid(True, alpha=0.3)
-    
-    # Add correlation coefficient
-    corr = df['RPM'].corr(df[dist])
-    ax.text(0.05, 0.95, f'Correlation: {corr:.3f}', transform=ax.transAxes, 
-            verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
-
-plt.tight_layout()
-plt.savefig('analysis_output/3_rpm_vs_ttk.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 3_rpm_vs_ttk.png")
-
-print(f"\n🔥 Highest RPM Weapons:")
-for idx, row in df.nlargest(5, 'RPM').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['RPM']:.0f} RPM")
-
-print(f"\n🐌 Lowest RPM Weapons:")
-for idx, row in df.nsmallest(5, 'RPM').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['RPM']:.0f} RPM")
-
-# ============================================================================
-# ANALYSIS 4: Accuracy Coefficients
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 4: ACCURACY ANALYSIS")
-print("="*80)
-
-fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-fig.suptitle('Accuracy Coefficient Analysis', fontsize=16, fontweight='bold')
-
-# Burst Accuracy
-ax = axes[0, 0]
-df_sorted = df.sort_values('Burst Accuracy Coefficient', ascending=False)
-colors = ['green' if i < 5 else 'red' if i >= len(df)-5 else 'steelblue' 
-          for i in range(len(df))]
-ax.barh(range(len(df)), df_sorted['Burst Accuracy Coefficient'], color=colors, alpha=0.7)
-ax.set_yticks(range(len(df)))
-ax.set_yticklabels(df_sorted['Weapon'], fontsize=8)
-ax.set_xlabel('Burst Accuracy Coefficient', fontsize=10)
-ax.set_title('Burst Accuracy (Higher = Better)', fontsize=12, fontweight='bold')
-ax.invert_yaxis()
-
-# CQB Accuracy
-ax = axes[0, 1]
-df_sorted = df.sort_values('CQB Accuracy Coefficient', ascending=False)
-colors = ['green' if i < 5 else 'red' if i >= len(df)-5 else 'orange' 
-          for i in range(len(df))]
-ax.barh(range(len(df)), df_sorted['CQB Accuracy Coefficient'], color=colors, alpha=0.7)
-ax.set_yticks(range(len(df)))
-ax.set_yticklabels(df_sorted['Weapon'], fontsize=8)
-ax.set_xlabel('CQB Accuracy Coefficient', fontsize=10)
-ax.set_title('CQB Accuracy (Higher = Better)', fontsize=12, fontweight='bold')
-ax.invert_yaxis()
-
-# Long Range Accuracy
-ax = axes[1, 0]
-df_sorted = df.sort_values('Long Range Accuracy Coefficient', ascending=False)
-colors = ['green' if i < 5 else 'red' if i >= len(df)-5 else 'purple' 
-          for i in range(len(df))]
-ax.barh(range(len(df)), df_sorted['Long Range Accuracy Coefficient'], color=colors, alpha=0.7)
-ax.set_yticks(range(len(df)))
-ax.set_yticklabels(df_sorted['Weapon'], fontsize=8)
-ax.set_xlabel('Long Range Accuracy Coefficient', fontsize=10)
-ax.set_title('Long Range Accuracy (Higher = Better)', fontsize=12, fontweight='bold')
-ax.invert_yaxis()
-
-# Burst Hits vs BTK
-ax = axes[1, 1]
-for weapon_class in df['Weapon Class'].unique():
-    class_data = df[df['Weapon Class'] == weapon_class]
-    ax.scatter(class_data['BTK at 20'], class_data['Burst Hits'], 
-              label=weapon_class, s=100, alpha=0.7)
-ax.set_xlabel('BTK at 20m', fontsize=10)
-ax.set_ylabel('Average Burst Hits', fontsize=10)
-ax.set_title('Burst Hits vs BTK (Efficiency)', fontsize=12, fontweight='bold')
-ax.legend()
-ax.grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('analysis_output/4_accuracy_analysis.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 4_accuracy_analysis.png")
-
-print(f"\n🎯 MOST ACCURATE (Burst):")
-for idx, row in df.nlargest(5, 'Burst Accuracy Coefficient').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['Burst Accuracy Coefficient']:.2f}")
-
-print(f"\n🔫 LEAST ACCURATE (Burst):")
-for idx, row in df.nsmallest(5, 'Burst Accuracy Coefficient').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['Burst Accuracy Coefficient']:.2f}")
-
-# ============================================================================
-# ANALYSIS 5: Weapon Class Comparison
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 5: WEAPON CLASS COMPARISON")
-print("="*80)
-
-fig, axes = plt.subplots(2, 3, figsize=(18, 12))
-fig.suptitle('Weapon Class Performance Comparison', fontsize=16, fontweight='bold')
-
-metrics = ['RPM', 'TTK at 20 m, ms', '20 m Power Score', 
-           'Burst Accuracy Coefficient', 'Velocity, ms', 'fire interval ms']
-titles = ['Rate of Fire', 'TTK at 20m', '20m Power Score', 
-          'Burst Accuracy', 'Projectile Velocity', 'Fire Interval']
-
-for idx, (metric, title) in enumerate(zip(metrics, titles)):
-    ax = axes[idx // 3, idx % 3]
-    
-    # Box plot by weapon class
-    weapon_classes = df['Weapon Class'].unique()
-    data_by_class = [df[df['Weapon Class'] == wc][metric].dropna() for wc in weapon_classes]
-    
-    bp = ax.boxplot(data_by_class, labels=weapon_classes, patch_artist=True)
-    
-    # Color the boxes
-    colors = plt.cm.Set3(range(len(weapon_classes)))
-    for patch, color in zip(bp['boxes'], colors):
-        patch.set_facecolor(color)
-    
-    ax.set_ylabel(title, fontsize=10)
-    ax.set_xlabel('Weapon Class', fontsize=10)
-    ax.set_title(f'{title} by Class', fontsize=12, fontweight='bold')
-    ax.grid(True, alpha=0.3, axis='y')
-
-plt.tight_layout()
-plt.savefig('analysis_output/5_class_comparison.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 5_class_comparison.png")
-
-# Class statistics
-print(f"\nWeapon Class Statistics:")
-for weapon_class in df['Weapon Class'].unique():
-    class_data = df[df['Weapon Class'] == weapon_class]
-    print(f"\n{weapon_class}:")
-    print(f"  Count: {len(class_data)}")
-    print(f"  Avg RPM: {class_data['RPM'].mean():.0f}")
-    print(f"  Avg TTK@20m: {class_data['TTK at 20 m, ms'].mean():.0f}ms")
-    print(f"  Avg 20m Power Score: {class_data['20 m Power Score'].mean():.0f}")
-    print(f"  Avg Burst Accuracy: {class_data['Burst Accuracy Coefficient'].mean():.3f}")
-
-# ============================================================================
-# ANALYSIS 6: Damage Falloff Analysis
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 6: DAMAGE FALLOFF ANALYSIS")
-print("="*80)
-
-fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-fig.suptitle('Damage Falloff Characteristics', fontsize=16, fontweight='bold')
-
-# BTK progression across ranges
-ax = axes[0, 0]
-ranges = ['BTK at 0', 'BTK at 20', 'BTK at 35', 'BTK at 75']
-for idx, row in df.iterrows():
-    btk_values = [row['BTK at 0'], row['BTK at 20'], row['BTK at 35'], row['BTK at 75']]
-    ax.plot([0, 20, 35, 75], btk_values, marker='o', alpha=0.5, linewidth=1)
-ax.set_xlabel('Distance (m)', fontsize=10)
-ax.set_ylabel('Bullets To Kill', fontsize=10)
-ax.set_title('BTK Falloff by Distance', fontsize=12, fontweight='bold')
-ax.grid(True, alpha=0.3)
-
-# TTK progression
-ax = axes[0, 1]
-for idx, row in df.iterrows():
-    ttk_values = [row['TTK at 0 m, ms'], row['TTK at 20 m, ms'], 
-                  row['TTK at 35 m, ms'], row['TTK at 75 m, ms']]
-    ax.plot([0, 20, 35, 75], ttk_values, marker='o', alpha=0.5, linewidth=1)
-ax.set_xlabel('Distance (m)', fontsize=10)
-ax.set_ylabel('Time To Kill (ms)', fontsize=10)
-ax.set_title('TTK Progression by Distance', fontsize=12, fontweight='bold')
-ax.grid(True, alpha=0.3)
-
-# Calculate "consistency" - variance in BTK across ranges
-ax = axes[1, 0]
-df['BTK_Variance'] = df[['BTK at 0', 'BTK at 20', 'BTK at 35', 'BTK at 75']].var(axis=1)
-df_sorted = df.sort_values('BTK_Variance')
-colors = ['green' if x < 0.5 else 'yellow' if x < 1.0 else 'red' 
-          for x in df_sorted['BTK_Variance']]
-ax.barh(range(len(df)), df_sorted['BTK_Variance'], color=colors, alpha=0.7)
-ax.set_yticks(range(len(df)))
-ax.set_yticklabels(df_sorted['Weapon'], fontsize=8)
-ax.set_xlabel('BTK Variance', fontsize=10)
-ax.set_title('Damage Consistency (Lower = More Consistent)', fontsize=12, fontweight='bold')
-ax.invert_yaxis()
-
-# Power Score progression
-ax = axes[1, 1]
-power_ranges = [20, 21, 35, 75]
-for idx, row in df.iterrows():
-    power_values = [row['20 m Power Score'], row['21 m Power Score'], 
-                    row['35 m Power Score'], row['75 m Power Score']]
-    ax.plot(power_ranges, power_values, marker='o', alpha=0.5, linewidth=1)
-ax.set_xlabel('Distance (m)', fontsize=10)
-ax.set_ylabel('Power Score', fontsize=10)
-ax.set_title('Power Score Degradation', fontsize=12, fontweight='bold')
-ax.grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('analysis_output/6_damage_falloff.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 6_damage_falloff.png")
-
-print(f"\n🎖️  MOST CONSISTENT Damage (Low BTK Variance):")
-for idx, row in df.nsmallest(5, 'BTK_Variance').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): Variance={row['BTK_Variance']:.3f}")
-
-print(f"\n📉 LEAST CONSISTENT Damage (High BTK Variance):")
-for idx, row in df.nlargest(5, 'BTK_Variance').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): Variance={row['BTK_Variance']:.3f}")
-
-# ============================================================================
-# ANALYSIS 7: Practical Lethality Coefficient
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 7: PRACTICAL LETHALITY COEFFICIENT")
-print("="*80)
-
-fig, axes = plt.subplots(1, 2, figsize=(16, 6))
-fig.suptitle('Practical Lethality Analysis', fontsize=16, fontweight='bold')
-
-# Lethality coefficient ranking
-ax = axes[0]
-df_lethality = df.dropna(subset=['practical lethality coefficient'])
-df_sorted = df_lethality.sort_values('practical lethality coefficient')
-colors = ['green' if i < 5 else 'red' if i >= len(df_sorted)-5 else 'steelblue' 
-          for i in range(len(df_sorted))]
-ax.barh(range(len(df_sorted)), df_sorted['practical lethality coefficient'], 
-        color=colors, alpha=0.7)
-ax.set_yticks(range(len(df_sorted)))
-ax.set_yticklabels(df_sorted['Weapon'], fontsize=8)
-ax.set_xlabel('Practical Lethality Coefficient', fontsize=10)
-ax.set_title('Practical Lethality Ranking', fontsize=12, fontweight='bold')
-ax.invert_yaxis()
-
-# Lethality by class
-ax = axes[1]
-weapon_classes = df_lethality['Weapon Class'].unique()
-lethality_by_class = [df_lethality[df_lethality['Weapon Class'] == wc]['practical lethality coefficient'].dropna() 
-                      for wc in weapon_classes]
-bp = ax.boxplot(lethality_by_class, labels=weapon_classes, patch_artist=True)
-colors = plt.cm.Set3(range(len(weapon_classes)))
-for patch, color in zip(bp['boxes'], colors):
-    patch.set_facecolor(color)
-ax.set_ylabel('Practical Lethality Coefficient', fontsize=10)
-ax.set_xlabel('Weapon Class', fontsize=10)
-ax.set_title('Lethality by Weapon Class', fontsize=12, fontweight='bold')
-ax.grid(True, alpha=0.3, axis='y')
-
-plt.tight_layout()
-plt.savefig('analysis_output/7_lethality.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 7_lethality.png")
-
-print(f"\n💀 HIGHEST Practical Lethality:")
-for idx, row in df_lethality.nlargest(5, 'practical lethality coefficient').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['practical lethality coefficient']:.3f}")
-
-print(f"\n🛡️  LOWEST Practical Lethality:")
-for idx, row in df_lethality.nsmallest(5, 'practical lethality coefficient').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['practical lethality coefficient']:.3f}")
-
-# ============================================================================
-# ANALYSIS 8: Velocity Analysis
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 8: PROJECTILE VELOCITY ANALYSIS")
-print("="*80)
-
-fig, axes = plt.subplots(1, 2, figsize=(16, 6))
-fig.suptitle('Projectile Velocity Analysis', fontsize=16, fontweight='bold')
-
-# Velocity by weapon
-ax = axes[0]
-df_sorted = df.sort_values('Velocity, ms', ascending=False)
-colors_map = {'LMG': 'red', 'AR': 'blue', 'SMG': 'green', 'CRB': 'orange'}
-colors = [colors_map[wc] for wc in df_sorted['Weapon Class']]
-ax.barh(range(len(df)), df_sorted['Velocity, ms'], color=colors, alpha=0.7)
-ax.set_yticks(range(len(df)))
-ax.set_yticklabels(df_sorted['Weapon'], fontsize=8)
-ax.set_xlabel('Velocity (m/s)', fontsize=10)
-ax.set_title('Projectile Velocity by Weapon', fontsize=12, fontweight='bold')
-ax.invert_yaxis()
-
-# Create legend
-from matplotlib.patches import Patch
-legend_elements = [Patch(facecolor=colors_map[wc], alpha=0.7, label=wc) 
-                   for wc in colors_map.keys()]
-ax.legend(handles=legend_elements, loc='lower right')
-
-# Velocity vs TTK at long range
-ax = axes[1]
-for weapon_class in df['Weapon Class'].unique():
-    class_data = df[df['Weapon Class'] == weapon_class]
-    ax.scatter(class_data['Velocity, ms'], class_data['TTK at 75 m, ms'], 
-              label=weapon_class, s=100, alpha=0.7)
-ax.set_xlabel('Velocity (m/s)', fontsize=10)
-ax.set_ylabel('TTK at 75m (ms)', fontsize=10)
-ax.set_title('Velocity vs Long Range TTK', fontsize=12, fontweight='bold')
-ax.legend()
-ax.grid(True, alpha=0.3)
-
-# Correlation
-corr = df['Velocity, ms'].corr(df['TTK at 75 m, ms'])
-ax.text(0.05, 0.95, f'Correlation: {corr:.3f}', transform=ax.transAxes, 
-        verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
-
-plt.tight_layout()
-plt.savefig('analysis_output/8_velocity.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 8_velocity.png")
-
-print(f"\n🚀 FASTEST Projectile Velocity:")
-for idx, row in df.nlargest(5, 'Velocity, ms').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['Velocity, ms']:.0f} m/s")
-
-print(f"\n🐢 SLOWEST Projectile Velocity:")
-for idx, row in df.nsmallest(5, 'Velocity, ms').iterrows():
-    print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {row['Velocity, ms']:.0f} m/s")
-
-# ============================================================================
-# ANALYSIS 9: Outlier Detection
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 9: OUTLIER DETECTION")
-print("="*80)
-
-# Detect outliers using Z-score method
-print("\n🔍 Statistical Outliers (Z-score > 2):\n")
-
-outlier_metrics = ['RPM', 'TTK at 20 m, ms', '20 m Power Score', 
-                   'Burst Accuracy Coefficient', 'Velocity, ms']
-
-for metric in outlier_metrics:
-    z_scores = np.abs(stats.zscore(df[metric].dropna()))
-    outliers = df[z_scores > 2]
-    
-    if len(outliers) > 0:
-        print(f"\n{metric}:")
-        for idx, row in outliers.iterrows():
-            z = z_scores[df.index.get_loc(idx)]
-            print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): "
-                  f"{row[metric]:.2f} (Z-score: {z:.2f})")
-
-# ============================================================================
-# ANALYSIS 10: Correlation Heatmap
-# ============================================================================
-print("\n" + "="*80)
-print("ANALYSIS 10: CORRELATION ANALYSIS")
-print("="*80)
-
-# Select key numeric columns for correlation
-corr_cols = ['RPM', 'fire interval ms', 'Velocity, ms', 'TTK at 0 m, ms', 
-             'TTK at 20 m, ms', 'TTK at 35 m, ms', 'TTK at 75 m, ms',
-             'Burst Accuracy Coefficient', 'CQB Accuracy Coefficient', 
-             'Long Range Accuracy Coefficient', '20 m Power Score']
-
-corr_matrix = df[corr_cols].corr()
-
-fig, ax = plt.subplots(figsize=(14, 12))
-sns.heatmap(corr_matrix, annot=True, fmt='.2f', cmap='coolwarm', center=0,
-            square=True, linewidths=1, cbar_kws={"shrink": 0.8})
-plt.title('Correlation Heatmap of Weapon Metrics', fontsize=16, fontweight='bold', pad=20)
-plt.tight_layout()
-plt.savefig('analysis_output/9_correlation_heatmap.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: 9_correlation_heatmap.png")
-
-# Find strongest correlations
-print("\n📊 Strongest Positive Correlations:")
-corr_pairs = []
-for i in range(len(corr_matrix.columns)):
-    for j in range(i+1, len(corr_matrix.columns)):
-        corr_pairs.append((corr_matrix.columns[i], corr_matrix.columns[j], 
-                          corr_matrix.iloc[i, j]))
-
-corr_pairs_sorted = sorted(corr_pairs, key=lambda x: abs(x[2]), reverse=True)
-for i in range(min(5, len(corr_pairs_sorted))):
-    metric1, metric2, corr_val = corr_pairs_sorted[i]
-    print(f"  {metric1} <-> {metric2}: {corr_val:.3f}")
-
-# ============================================================================
-# SUMMARY STATISTICS
-# ============================================================================
-print("\n" + "="*80)
-print("FINAL SUMMARY STATISTICS")
-print("="*80)
-
-summary_stats = df[['RPM', 'TTK at 20 m, ms', '20 m Power Score', 
-                     'Burst Accuracy Coefficient', 'Velocity, ms']].describe()
-print("\n", summary_stats.to_string())
-
-# Overall weapon recommendations
-print("\n" + "="*80)
-print("🏆 OVERALL BEST WEAPONS (Multi-Metric Analysis)")
-print("="*80)
-
-# Calculate a composite score (normalized)
-df['composite_score'] = (
-    (1 - (df['20 m Power Score'] - df['20 m Power Score'].min()) / 
-     (df['20 m Power Score'].max() - df['20 m Power Score'].min())) * 0.4 +  # 40% weight
-    (df['Burst Accuracy Coefficient'] / df['Burst Accuracy Coefficient'].max()) * 0.3 +  # 30% weight
-    (df['RPM'] / df['RPM'].max()) * 0.15 +  # 15% weight
-    (df['Velocity, ms'] / df['Velocity, ms'].max()) * 0.15  # 15% weight
-)
-
-print("\nTop 10 Overall Weapons (Balanced Performance):")
-for idx, row in df.nlargest(10, 'composite_score').iterrows():
-    print(f"{int(idx)+1:2d}. {row['Weapon']:20s} ({row['Weapon Class']:3s}) - "
-          f"Score: {row['composite_score']:.3f}")
-
-print("\n✅ Analysis complete! All charts saved to 'analysis_output/' directory")
-print("\nGenerated 9 detailed visualizations:")
-print("  1. TTK Analysis across distances")
-print("  2. Power Scores comparison")
-print("  3. RPM vs TTK relationships")
-print("  4. Accuracy coefficients analysis")
-print("  5. Weapon class comparison")
-print("  6. Damage falloff characteristics")
-print("  7. Practical lethality")
-print("  8. Projectile velocity analysis")
-print("  9. Correlation heatmap")
+import profiling
+from analyses import EXTRA_DISTANCES, REGISTRY, btk_variance, prepare_frame, run
+from weapon_data import DATA_FILE, load_weapons
+from charts import OUTPUT_DIR
 
+
+def print_banner(title):
+    print("\n" + "="*80)
+    print(title)
+    print("="*80)
+
+
+def print_weapons(rows, metric, fmt, unit='', label=''):
+    for idx, row in rows.iterrows():
+        print(f"  {row['Weapon']:20s} ({row['Weapon Class']:3s}): {label}{row[metric]:{fmt}}{unit}")
+
+
+def print_overview(df):
+    print(f"\nDataset Overview:")
+    print(f"Total Weapons: {len(df)}")
+    print(f"\nWeapon Classes Distribution:")
+    print(df['Weapon Class'].value_counts())
+
+
+def report_ttk(result):
+    # Best and Worst performers
+    print(f"\n🎯 BEST TTK at 0m:")
+    print_weapons(result['best_0m'], 'TTK at 0 m, ms', '.0f', 'ms')
+
+    print(f"\n❌ WORST TTK at 0m:")
+    print_weapons(result['worst_0m'], 'TTK at 0 m, ms', '.0f', 'ms')
+
+    # Distances the spreadsheet does not measure, derived by the TTK engine
+    for dist in EXTRA_DISTANCES:
+        print(f"\n🎯 BEST TTK at {dist}m:")
+        print_weapons(result[f'best_{dist}m'], f'TTK at {dist} m, ms', '.0f', 'ms')
+
+
+def report_power(result):
+    print(f"\n🏆 TOP 5 Overall Power Score (20m - Most Important):")
+    print_weapons(result['top_20m'], '20 m Power Score', '.0f')
+
+
+def report_rpm(result):
+    print(f"\n🔥 Highest RPM Weapons:")
+    print_weapons(result['highest'], 'RPM', '.0f', ' RPM')
+
+    print(f"\n🐌 Lowest RPM Weapons:")
+    print_weapons(result['lowest'], 'RPM', '.0f', ' RPM')
+
+
+def report_accuracy(result):
+    print(f"\n🎯 MOST ACCURATE (Burst):")
+    print_weapons(result['most_accurate'], 'Burst Accuracy Coefficient', '.2f')
+
+    print(f"\n🔫 LEAST ACCURATE (Burst):")
+    print_weapons(result['least_accurate'], 'Burst Accuracy Coefficient', '.2f')
+
+
+def report_classes(result):
+    print(f"\nWeapon Class Statistics:")
+    for weapon_class, stats in result['stats'].iterrows():
+        print(f"\n{weapon_class}:")
+        print(f"  Count: {stats['Count']:.0f}")
+        print(f"  Avg RPM: {stats['Avg RPM']:.0f}")
+        print(f"  Avg TTK@20m: {stats['Avg TTK@20m']:.0f}ms")
+        print(f"  Avg 20m Power Score: {stats['Avg 20m Power Score']:.0f}")
+        print(f"  Avg Burst Accuracy: {stats['Avg Burst Accuracy']:.3f}")
+
+
+def report_falloff(result):
+    print(f"\n🎖️  MOST CONSISTENT Damage (Low BTK Variance):")
+    print_weapons(result['most_consistent'], 'BTK_Variance', '.3f', label='Variance=')
+
+    print(f"\n📉 LEAST CONSISTENT Damage (High BTK Variance):")
+    print_weapons(result['least_consistent'], 'BTK_Variance', '.3f', label='Variance=')
+
+
+def report_lethality(result):
+    metric = 'practical lethality coefficient'
+    print(f"\n💀 HIGHEST Practical Lethality:")
+    print_weapons(result['highest'], metric, '.3f')
+
+    print(f"\n🛡️  LOWEST Practical Lethality:")
+    print_weapons(result['lowest'], metric, '.3f')
+
+
+def report_velocity(result):
+    print(f"\n🚀 FASTEST Projectile Velocity:")
+    print_weapons(result['fastest'], 'Velocity, ms', '.0f', ' m/s')
+
+    print(f"\n🐢 SLOWEST Projectile Velocity:")
+    print_weapons(result['slowest'], 'Velocity, ms', '.0f', ' m/s')
+
+
+def report_outliers(result):
+    print(f"\n🔍 Statistical Outliers (Z-score > {result.values['threshold']:g}):\n")
+    # The table is ordered by metric, so each metric's outliers are one run
+    table = result['outliers']
+    current = None
+    for metric, weapon, weapon_class, value, z in zip(table['Metric'], table['Weapon'],
+                                                     table['Weapon Class'], table['Value'],
+                                                     table['Z-score']):
+        if metric != current:
+            current = metric
+            print(f"\n{metric}:")
+        print(f"  {weapon:20s} ({weapon_class:3s}): {value:.2f} (Z-score: {abs(z):.2f})")
+
+
+def report_correlation(result):
+    print("\n📊 Strongest Positive Correlations:")
+    for _, row in result['pairs'].head(5).iterrows():
+        line = f"  {row['Metric 1']} <-> {row['Metric 2']}: {row['Correlation']:.3f}"
+        if result.values['resamples']:
+            line += (f" ({result.values['confidence']:.0%} CI {row['CI Low']:.3f} to "
+                     f"{row['CI High']:.3f}, p = {row['P-value']:.4f})")
+        print(line)
+
+
+def report_ranges(result):
+    intervals = result['intervals']
+    for priority, label in [('ttk', 'Lowest TTK'), ('balanced', 'Best balanced score')]:
+        print(f"\n📏 {label} by distance:")
+        for weapon_class, group in intervals[intervals['Priority'] == priority].groupby(
+                'Class', sort=False):
+            print(f"\n{weapon_class}:")
+            for idx, row in group.iterrows():
+                print(f"  {row['Start']:5.1f} - {row['End']:5.1f} m  "
+                      f"{row['Weapon']:20s} ({row['Weapon Class']:3s})")
+
+
+def print_top_overall(result):
+    print("\nTop 10 Overall Weapons (Balanced Performance):")
+    for idx, row in result['top_10'].iterrows():
+        print(f"{int(idx)+1:2d}. {row['Weapon']:20s} ({row['Weapon Class']:3s}) - "
+              f"Score: {row['composite_score']:.3f}")
+
+
+def report_summary(result):
+    print("\n", result['describe'].to_string())
+
+    # Overall weapon recommendations
+    print_banner("🏆 OVERALL BEST WEAPONS (Multi-Metric Analysis)")
+    print_top_overall(result)
+
+
+# How each analysis is printed; analyses without a report are only
+# computed as dependencies of others
+REPORTS = {
+    'ttk': report_ttk,
+    'power': report_power,
+    'rpm': report_rpm,
+    'accuracy': report_accuracy,
+    'classes': report_classes,
+    'falloff': report_falloff,
+    'lethality': report_lethality,
+    'velocity': report_velocity,
+    'outliers': report_outliers,
+    'correlation': report_correlation,
+    'ranges': report_ranges,
+    'summary': report_summary,
+}
+
+
+def report(results, names):
+    for name in names:
+        if name in REPORTS:
+            with profiling.span(name, 'report'):
+                print_banner(REGISTRY[name].title)
+                REPORTS[name](results[name])
+
+
+def chart_frame(df):
+    """``df`` plus the derived columns the figures read, computed on demand."""
+    return df.assign(BTK_Variance=btk_variance(df))
+
+
+def render(df, filenames=None, output_dir=OUTPUT_DIR, workers=None, force=False, results=None):
+    """Render (or reuse) the figures named in ``filenames``, all by default."""
+    # Every figure is an independent job rendered in a worker process, and is
+    # skipped when its input columns and plot parameters are unchanged
+    from charts import analysis_charts, render_charts
+
+    jobs = analysis_charts()
+    if filenames is not None:
+        jobs = [job for job in jobs if job.filename in filenames]
+    if not jobs:
+        return
+
+    print_banner("RENDERING CHARTS")
+    # Reuse the class index the analyses already built, if any
+    classes = results['class_index'].values['index'] if results and 'class_index' in results else None
+    statuses = render_charts(df, jobs, output_dir=output_dir, workers=workers, force=force,
+                             classes=classes)
+    for filename, status in statuses.items():
+        print(f"✓ {'Saved' if status == 'rendered' else 'Cached'}: {filename}")
+
+
+def add_chart_options(parser, suppress=False):
+    """Add the chart options to ``parser``.
+
+    They are accepted both before and after the command.  With ``suppress``
+    (the command's copies) they have no default, so they only override the
+    top-level values when given.
+    """
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    parser.add_argument('--output-dir', default=default(OUTPUT_DIR),
+                        help=f"where figures are written (default: {OUTPUT_DIR})")
+    parser.add_argument('--workers', type=int, default=default(None),
+                        help="render processes (default: one per CPU)")
+    parser.add_argument('--force', action='store_true', default=default(False),
+                        help="re-render figures even when their inputs are unchanged")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Analyze Battlefield 6 weapon statistics.")
+    parser.add_argument('--data', default=DATA_FILE, help="weapon CSV (default: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always parse the CSV instead of using the typed column cache")
+    parser.add_argument('--lean', action='store_true',
+                        help="keep TTKs in float32 and repeated weapon names categorical "
+                             "(names that are mostly unique stay strings), for million-row "
+                             "variant datasets")
+    parser.add_argument('--resamples', type=int, default=0, metavar='N',
+                        help="bootstrap resamples and permutations behind the correlation "
+                             "intervals and p-values, e.g. 2000 (default: 0, off)")
+    parser.add_argument('--profile', nargs='?', const=profiling.TRACE_FILE, metavar='PATH',
+                        help="record time and memory per stage and write them as JSON "
+                             f"(default: {profiling.TRACE_FILE}; also enabled by {profiling.ENV_VAR}=1)")
+    parser.add_argument('--chrome-trace', metavar='PATH',
+                        help="also write the profile in Chrome trace format (implies --profile)")
+
+    add_chart_options(parser)
+
+    commands = parser.add_subparsers(dest='command')
+    every = commands.add_parser('all', help="every analysis followed by the charts (default)")
+    commands.add_parser('text', help="printed analyses only, no plotting")
+    charts = commands.add_parser('charts', help="charts only")
+    selected = commands.add_parser('run', help="run selected analyses")
+    for command in (every, charts, selected):
+        add_chart_options(command, suppress=True)
+    selected.add_argument('analyses', nargs='+', choices=list(REPORTS), metavar='ANALYSIS',
+                          help=f"one or more of: {', '.join(REPORTS)}")
+    selected.add_argument('--charts', action='store_true', help="also render their figures")
+    commands.add_parser('list', help="list the available analyses")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile or args.chrome_trace:
+        profiling.enable()
+    try:
+        return analyze(args)
+    finally:
+        if profiling.enabled():
+            path = profiling.write_trace(args.profile)
+            if args.chrome_trace:
+                profiling.write_chrome_trace(args.chrome_trace)
+            print(f"\n{profiling.summary()}\n\nProfile written to {path}", file=sys.stderr)
+
+
+def analysis_options(args):
+    """Keyword arguments of the analyses, from the command line."""
+    return {'correlation': {'resamples': args.resamples}}
+
+
+def analyze(args):
+    command = args.command or 'all'
+
+    if command == 'list':
+        for name in REPORTS:
+            print(f"{name:12s} {REGISTRY[name].chart or ''}")
+        return 0
+
+    # Load the data (typed columns, cached on disk by CSV content hash)
+    print("Loading data...")
+    with profiling.span('load', 'io'):
+        df = load_weapons(args.data, use_cache=not args.no_cache, lean=args.lean)
+    with profiling.span('prepare'):
+        df = prepare_frame(df, lean=args.lean)
+    chart_args = {'output_dir': args.output_dir, 'workers': args.workers, 'force': args.force}
+
+    if command == 'charts':
+        render(chart_frame(df), **chart_args)
+        return 0
+
+    if command == 'run':
+        results = run(df, args.analyses, options=analysis_options(args))
+        report(results, args.analyses)
+        if args.charts:
+            render(chart_frame(df), [REGISTRY[name].chart for name in args.analyses],
+                   results=results, **chart_args)
+        return 0
+
+    print_overview(df)
+    results = run(df, options=analysis_options(args))
+    report(results, REGISTRY)
+
+    if command == 'all':
+        render(chart_frame(df), results=results, **chart_args)
+        print(f"\n✅ Analysis complete! All charts saved to '{chart_args['output_dir']}/' directory")
+        print("\nGenerated 9 detailed visualizations:")
+        print("  1. TTK Analysis across distances")
+        print("  2. Power Scores comparison")
+        print("  3. RPM vs TTK relationships")
+        print("  4. Accuracy coefficients analysis")
+        print("  5. Weapon class comparison")
+        print("  6. Damage falloff characteristics")
+        print("  7. Practical lethality")
+        print("  8. Projectile velocity analysis")
+        print("  9. Correlation heatmap")
+    return 0
+
+
+if __name__ == '__main__':
+    # Set UTF-8 encoding for console output on Windows
+    if sys.platform == 'win32':
+        sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.exit(main())
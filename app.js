@@ -16,25 +16,13 @@ document.addEventListener('DOMContentLoaded', async () => {
     initializeApp();
 });
 
-// Load CSV data
+// Load the precomputed payload from data.js (built by build_data.py)
 async function loadData() {
     try {
-        // Check if embedded data is available (from data.js)
-        if (typeof WEAPON_DATA_CSV !== 'undefined') {
-            console.log('Using embedded weapon data');
-            weaponsData = parseCSV(WEAPON_DATA_CSV);
-            filteredData = [...weaponsData];
-            console.log('Loaded weapons:', weaponsData.length);
-            return;
+        if (typeof WEAPON_DATA === 'undefined') {
+            throw new Error('WEAPON_DATA is not defined - is data.js loaded?');
         }
-        
-        // Otherwise, try to fetch from CSV file
-        const response = await fetch('data.csv');
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        const csvText = await response.text();
-        weaponsData = parseCSV(csvText);
+        weaponsData = buildWeapons(WEAPON_DATA);
         filteredData = [...weaponsData];
         console.log('Loaded weapons:', weaponsData.length);
     } catch (error) {
@@ -45,67 +33,65 @@ async function loadData() {
     }
 }
 
-// Parse CSV
-function parseCSV(csv) {
-    const lines = csv.split('\n').filter(line => line.trim());
-    const headers = lines[0].split(',');
-    const weapons = [];
+// Build one object per weapon from the payload's typed columns
+function buildWeapons(payload) {
+    const fields = Object.keys(payload.columns);
+    const weapons = new Array(payload.count);
 
-    for (let i = 1; i < lines.length; i++) {
-        const values = parseCSVLine(lines[i]);
-        if (!values[0] || values[0].includes('Explanations')) break; // Stop at explanation rows
-        
+    for (let i = 0; i < payload.count; i++) {
         const weapon = {
-            weapon: values[0],
-            weaponClass: values[1],
-            btk0: parseFloat(values[2]) || 0,
-            btk20: parseFloat(values[3]) || 0,
-            btk35: parseFloat(values[4]) || 0,
-            btk75: parseFloat(values[5]) || 0,
-            rpm: parseFloat(values[6]) || 0,
-            fireInterval: parseFloat(values[7]) || 0,
-            velocity: parseFloat(values[8]) || 0,
-            ttk0: parseFloat(values[9]) || 0,
-            ttk20: parseFloat(values[10]) || 0,
-            ttk35: parseFloat(values[11]) || 0,
-            ttk75: parseFloat(values[12]) || 0,
-            burstHits: parseFloat(values[13]) || 0,
-            burstAccuracy: parseFloat(values[14]) || 0,
-            cqbAccuracy: parseFloat(values[15]) || 0,
-            longRangeAccuracy: parseFloat(values[16]) || 0,
-            power20: parseFloat(values[17]) || 0,
-            power21: parseFloat(values[18]) || 0,
-            power35: parseFloat(values[19]) || 0,
-            power75: parseFloat(values[20]) || 0,
-            lethality: parseFloat(values[21]) || 0
+            index: i,
+            weapon: payload.names[i],
+            weaponClass: payload.classes[payload.classCodes[i]] || ''
         };
-        
-        weapons.push(weapon);
+        fields.forEach(field => {
+            const value = payload.columns[field][i];
+            // Float32 coefficients carry 7 significant digits; round them so
+            // 0.94 reads as 0.94 rather than 0.9399999976158142
+            weapon[field] = payload.columns[field] instanceof Float32Array
+                ? Number(value.toPrecision(7)) : value;
+        });
+        weapons[i] = weapon;
     }
 
     return weapons;
 }
 
-// Parse CSV line handling commas in quotes
-function parseCSVLine(line) {
-    const result = [];
-    let current = '';
-    let inQuotes = false;
-
-    for (let i = 0; i < line.length; i++) {
-        const char = line[i];
-        
-        if (char === '"') {
-            inQuotes = !inQuotes;
-        } else if (char === ',' && !inQuotes) {
-            result.push(current.trim());
-            current = '';
-        } else {
-            current += char;
+const descendingOrders = {};
+
+// Presorted row order of a key.  The payload only stores ascending orders;
+// descending is derived once: reversed, with tied rows back in file order
+function rowOrder(key, descending) {
+    const ascending = WEAPON_DATA.order[key];
+    if (!descending) return ascending;
+    if (!descendingOrders[key]) {
+        const values = key === 'weapon' ? WEAPON_DATA.names
+            : key === 'weaponClass' ? WEAPON_DATA.classCodes : WEAPON_DATA.columns[key];
+        const order = ascending.slice().reverse();
+        for (let lo = 0; lo < order.length;) {
+            let hi = lo + 1;
+            while (hi < order.length && values[order[hi]] === values[order[lo]]) hi++;
+            order.subarray(lo, hi).reverse();
+            lo = hi;
         }
+        descendingOrders[key] = order;
+    }
+    return descendingOrders[key];
+}
+
+// Weapons in data ordered by a presorted key, without sorting
+function sortedBy(data, key, descending = false) {
+    const order = rowOrder(key, descending);
+    if (data === weaponsData) {
+        return Array.from(order, i => weaponsData[i]);
+    }
+
+    const selected = new Uint8Array(weaponsData.length);
+    data.forEach(weapon => { selected[weapon.index] = 1; });
+    const result = [];
+    for (const i of order) {
+        if (selected[i]) result.push(weaponsData[i]);
     }
-    
-    result.push(current.trim());
     return result;
 }
 
@@ -193,26 +179,24 @@ function applyFilters() {
     const searchText = document.getElementById('searchInput').value.toLowerCase();
     const sortBy = document.getElementById('sortBy').value;
 
+    // Sort
+    const sortKeys = {
+        name: ['weapon', false],
+        ttk20: ['ttk20', false],
+        power20: ['power20', false],
+        rpm: ['rpm', true],
+        accuracy: ['burstAccuracy', true],
+        velocity: ['velocity', true]
+    };
+    const sorted = sortKeys[sortBy] ? sortedBy(weaponsData, ...sortKeys[sortBy]) : weaponsData;
+
     // Filter
-    filteredData = weaponsData.filter(weapon => {
+    filteredData = sorted.filter(weapon => {
         const matchesClass = classFilter === 'all' || weapon.weaponClass === classFilter;
         const matchesSearch = weapon.weapon.toLowerCase().includes(searchText);
         return matchesClass && matchesSearch;
     });
 
-    // Sort
-    filteredData.sort((a, b) => {
-        switch (sortBy) {
-            case 'name': return a.weapon.localeCompare(b.weapon);
-            case 'ttk20': return a.ttk20 - b.ttk20;
-            case 'power20': return a.power20 - b.power20;
-            case 'rpm': return b.rpm - a.rpm;
-            case 'accuracy': return b.burstAccuracy - a.burstAccuracy;
-            case 'velocity': return b.velocity - a.velocity;
-            default: return 0;
-        }
-    });
-
     document.getElementById('filteredCount').textContent = filteredData.length;
     renderTable();
 }
@@ -242,27 +226,19 @@ function sortTable(key, headerElement) {
     // Add sort class to current header
     headerElement.classList.add(isAsc ? 'sorted-desc' : 'sorted-asc');
     
-    filteredData.sort((a, b) => {
-        let aVal, bVal;
-        
-        switch(key) {
-            case 'weapon': aVal = a.weapon; bVal = b.weapon; break;
-            case 'class': aVal = a.weaponClass; bVal = b.weaponClass; break;
-            case 'rpm': aVal = a.rpm; bVal = b.rpm; break;
-            case 'ttk0': aVal = a.ttk0; bVal = b.ttk0; break;
-            case 'ttk20': aVal = a.ttk20; bVal = b.ttk20; break;
-            case 'power20': aVal = a.power20; bVal = b.power20; break;
-            case 'accuracy': aVal = a.burstAccuracy; bVal = b.burstAccuracy; break;
-            case 'velocity': aVal = a.velocity; bVal = b.velocity; break;
-            default: return 0;
-        }
-        
-        if (typeof aVal === 'string') {
-            return isAsc ? bVal.localeCompare(aVal) : aVal.localeCompare(bVal);
-        } else {
-            return isAsc ? bVal - aVal : aVal - bVal;
-        }
-    });
+    const sortKeys = {
+        weapon: 'weapon',
+        class: 'weaponClass',
+        rpm: 'rpm',
+        ttk0: 'ttk0',
+        ttk20: 'ttk20',
+        power20: 'power20',
+        accuracy: 'burstAccuracy',
+        velocity: 'velocity'
+    };
+    if (sortKeys[key]) {
+        filteredData = sortedBy(filteredData, sortKeys[key], isAsc);
+    }
     
     renderTable();
 }
@@ -335,9 +311,7 @@ function renderOverview() {
 // Render top performers
 function renderTopPerformers() {
     const container = document.getElementById('topPerformers');
-    const top5 = [...weaponsData]
-        .sort((a, b) => a.power20 - b.power20)
-        .slice(0, 5);
+    const top5 = sortedBy(weaponsData, 'power20').slice(0, 5);
 
     container.innerHTML = top5.map((weapon, index) => `
         <div class="performer">
@@ -573,7 +547,7 @@ function renderMainChart() {
 
 // TTK Chart
 function renderTTKChart(ctx, data) {
-    const sorted = [...data].sort((a, b) => a.ttk20 - b.ttk20).slice(0, 15);
+    const sorted = sortedBy(data, 'ttk20').slice(0, 15);
     
     charts.main = new Chart(ctx, {
         type: 'bar',
@@ -658,7 +632,7 @@ function renderScatterChart(ctx, data) {
 
 // Accuracy Chart
 function renderAccuracyChart(ctx, data) {
-    const sorted = [...data].sort((a, b) => b.burstAccuracy - a.burstAccuracy).slice(0, 15);
+    const sorted = sortedBy(data, 'burstAccuracy', true).slice(0, 15);
     
     charts.main = new Chart(ctx, {
         type: 'bar',
@@ -694,7 +668,7 @@ function renderAccuracyChart(ctx, data) {
 
 // Velocity Chart
 function renderVelocityChart(ctx, data) {
-    const sorted = [...data].sort((a, b) => b.velocity - a.velocity);
+    const sorted = sortedBy(data, 'velocity', true);
     
     charts.main = new Chart(ctx, {
         type: 'bar',
@@ -764,7 +738,7 @@ function renderDamageFalloffChart(ctx, data) {
 
 // Power Scores Chart
 function renderPowerScoresChart(ctx, data) {
-    const sorted = [...data].sort((a, b) => a.power20 - b.power20).slice(0, 15);
+    const sorted = sortedBy(data, 'power20').slice(0, 15);
     
     charts.main = new Chart(ctx, {
         type: 'bar',
@@ -816,9 +790,8 @@ function renderLeaderboards() {
 // Render individual leaderboard
 function renderLeaderboard(elementId, sortKey, descending, formatter) {
     const container = document.getElementById(elementId);
-    const sorted = [...weaponsData]
+    const sorted = sortedBy(weaponsData, sortKey, descending)
         .filter(w => w[sortKey] > 0)
-        .sort((a, b) => descending ? b[sortKey] - a[sortKey] : a[sortKey] - b[sortKey])
         .slice(0, 10);
 
     container.innerHTML = sorted.map(weapon => {
@@ -838,33 +811,18 @@ function calculateBestWeapon() {
     const priority = document.getElementById('calcPriority').value;
     const weaponClass = document.getElementById('calcClass').value;
 
-    let filtered = weaponClass === 'all' ? [...weaponsData] : 
+    const filtered = weaponClass === 'all' ? weaponsData :
         weaponsData.filter(w => w.weaponClass === weaponClass);
 
-    let sorted;
-    switch(priority) {
-        case 'ttk':
-            sorted = filtered.sort((a, b) => a[`ttk${distance}`] - b[`ttk${distance}`]);
-            break;
-        case 'accuracy':
-            sorted = filtered.sort((a, b) => b.burstAccuracy - a.burstAccuracy);
-            break;
-        case 'rpm':
-            sorted = filtered.sort((a, b) => b.rpm - a.rpm);
-            break;
-        case 'velocity':
-            sorted = filtered.sort((a, b) => b.velocity - a.velocity);
-            break;
-        case 'balanced':
-            sorted = filtered.sort((a, b) => {
-                const scoreA = (1 / a.ttk20) * a.burstAccuracy * (a.rpm / 1000);
-                const scoreB = (1 / b.ttk20) * b.burstAccuracy * (b.rpm / 1000);
-                return scoreB - scoreA;
-            });
-            break;
-        default:
-            sorted = filtered;
-    }
+    // The balanced score is (1 / ttk20) * burstAccuracy * (rpm / 1000)
+    const priorities = {
+        ttk: [`ttk${distance}`, false],
+        accuracy: ['burstAccuracy', true],
+        rpm: ['rpm', true],
+        velocity: ['velocity', true],
+        balanced: ['balanced', true]
+    };
+    const sorted = priorities[priority] ? sortedBy(filtered, ...priorities[priority]) : filtered;
 
     const top3 = sorted.slice(0, 3);
     displayCalculatorResults(top3, distance);
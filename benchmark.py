@@ -0,0 +1,321 @@
+"""Benchmarks of the analysis pipeline on synthetic weapon data.
+
+``synthetic_weapons`` builds a seeded data.csv look-alike of any size.
+Every synthetic weapon starts from a real weapon of the same class
+(classes keep their real frequencies) with its RPM, velocity, accuracy
+coefficients, burst hits and lethality jittered.  The fire interval and the
+TTKs are then recomputed with the spreadsheet model, and the power scores
+are scaled with their TTKs, so the columns stay consistent with each other
+and the distributions follow the real data.
+
+``run_benchmarks`` writes one CSV per size and times every stage
+separately:
+
+* ``load.csv``: parsing and cleaning the CSV (``read_weapons_csv``)
+* ``load.cache_cold`` / ``load.cache_warm``: ``load_weapons`` filling and
+  then reading the column cache
+* ``prepare``: engine-derived TTKs (``prepare_frame``)
+* ``analysis.<name>``: each registered analysis on its own, with its
+  dependencies precomputed (``analysis.composite`` is the composite score)
+* ``rankings.build``: a RankIndex of every leaderboard metric, overall and
+  per class (``RANKED_METRICS`` plus BTK variance and the composite score)
+* ``rankings.update``: one weapon changing in every indexed metric, then
+  every leaderboard read again, best and worst, overall and per class
+* ``chart.<file>``: each figure, rendered in-process
+* ``cli.all_warm``: a whole ``analyze_weapons.py all`` run, in a fresh
+  interpreter, with the column cache and every figure already up to date
+  (the interpreter and library imports are about 0.5 s of it)
+
+A stage's time is the best of ``repeat`` runs.  Charts and the warm run
+are only timed up to ``chart_limit`` rows (CHART_LIMIT): rendering every
+figure for a million weapons takes minutes, so pass ``--chart-limit
+1000000`` to include them at that size.
+
+Every run is appended to a JSON-lines history.  A stage is flagged as a
+regression when it is more than ``threshold`` slower than the median of
+the previous runs of the same size on the same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from analyses import (LOWER_IS_BETTER, REGISTRY, btk_variance, composite_scores, prepare_frame,
+                      resolve, run)
+from class_index import ClassIndex
+from rank_index import RankIndex
+from ttk_engine import BTK_COLUMNS, POWER_TTK, TTK_COLUMNS, BTK_DISTANCES, ttk_at
+from weapon_data import DATA_FILE, SCHEMA, load_weapons, read_weapons_csv
+
+SIZES = [100, 10_000, 1_000_000]
+HISTORY_FILE = 'benchmark_history.jsonl'
+REPEAT = 3
+# Largest size whose charts and warm CLI run are timed by default
+CHART_LIMIT = 10_000
+# A stage is a regression when it is this much slower than its baseline...
+THRESHOLD = 0.25
+# ...and slower by at least this many seconds, so timer noise on
+# sub-millisecond stages is not flagged
+MIN_DELTA = 0.002
+# Previous runs the baseline median is taken over
+BASELINE_RUNS = 5
+
+# Log-normal jitter (sigma) applied to each column of the template weapon
+JITTER = {
+    'RPM': 0.08,
+    'Velocity, ms': 0.06,
+    'Burst Hits': 0.05,
+    'Burst Accuracy Coefficient': 0.03,
+    'CQB Accuracy Coefficient': 0.03,
+    'Long Range Accuracy Coefficient': 0.03,
+    'practical lethality coefficient': 0.05,
+}
+ACCURACY_COLUMNS = ['Burst Accuracy Coefficient', 'CQB Accuracy Coefficient',
+                    'Long Range Accuracy Coefficient']
+# Columns the report's leaderboards rank by, indexed by the rankings stages
+RANKED_METRICS = ['TTK at 0 m, ms', '20 m Power Score', 'RPM', 'Burst Accuracy Coefficient',
+                  'practical lethality coefficient', 'Velocity, ms']
+
+
+def synthetic_weapons(n, seed=0, template=None):
+    """A seeded ``n``-row weapons table with the data.csv schema.
+
+    ``template`` is the typed frame the rows are drawn from (data.csv by
+    default).  Weapon names are the template name plus a row number.
+    """
+    if template is None:
+        template = read_weapons_csv(DATA_FILE)
+    rng = np.random.default_rng(seed)
+    classes = ClassIndex.from_frame(template)
+
+    # Class of every row at the template's class frequencies, then a random
+    # template weapon of that class
+    counts = classes.counts()
+    codes = rng.choice(len(classes), size=n, p=counts / counts.sum())
+    picks = classes.order[classes.offsets[codes] + (rng.random(n) * counts[codes]).astype(np.intp)]
+    base = template.iloc[picks].reset_index(drop=True)
+
+    names = base['Weapon'].astype(object) + '-' + pd.Series(np.arange(n)).astype(str)
+    out = pd.DataFrame({'Weapon': names.astype(object),
+                        'Weapon Class': base['Weapon Class'].astype(object)})
+    for col in BTK_COLUMNS:
+        out[col] = base[col].to_numpy()
+    for col, sigma in JITTER.items():
+        out[col] = base[col].to_numpy(dtype=np.float64, na_value=np.nan) * rng.lognormal(0, sigma, n)
+    out['RPM'] = np.round(out['RPM'])
+    out['Velocity, ms'] = np.round(out['Velocity, ms'])
+    out[ACCURACY_COLUMNS] = out[ACCURACY_COLUMNS].clip(upper=1.0).round(2)
+    out['Burst Hits'] = out['Burst Hits'].round(2)
+    out['practical lethality coefficient'] = out['practical lethality coefficient'].round(3)
+
+    fire_interval = 60000.0 / out['RPM'].to_numpy()
+    out['fire interval ms'] = np.round(fire_interval)
+    ttk = ttk_at(out[BTK_COLUMNS].to_numpy(dtype=np.float64), fire_interval,
+                 out['Velocity, ms'].to_numpy(), BTK_DISTANCES, dtype=np.float64)
+    out[TTK_COLUMNS] = np.round(ttk)
+    for power, ttk_col in POWER_TTK.items():
+        ratio = out[ttk_col].to_numpy() / base[ttk_col].to_numpy(dtype=np.float64)
+        out[power] = np.round(base[power].to_numpy(dtype=np.float64) * ratio)
+    return out[list(SCHEMA)]
+
+
+def _best_of(func, repeat):
+    """Best wall time of ``repeat`` calls of ``func`` and its last result."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def time_stages(csv_path, work_dir, repeat=REPEAT, charts=True):
+    """Seconds per stage of the pipeline on ``csv_path``."""
+    timings = {}
+    timings['load.csv'], raw = _best_of(lambda: read_weapons_csv(csv_path), repeat)
+
+    cache_dir = os.path.join(work_dir, 'cache')
+
+    def cold_load():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return load_weapons(csv_path, cache_dir=cache_dir)
+    timings['load.cache_cold'], _ = _best_of(cold_load, repeat)
+    timings['load.cache_warm'], _ = _best_of(lambda: load_weapons(csv_path, cache_dir=cache_dir),
+                                             repeat)
+    timings['prepare'], df = _best_of(lambda: prepare_frame(raw), repeat)
+
+    # Each analysis alone, its dependencies taken from a full run
+    results = run(df)
+    for name in REGISTRY:
+        deps = {dep: results[dep] for dep in resolve([name]) if dep != name}
+        timings[f'analysis.{name}'], _ = _best_of(lambda: run(df, [name], results=dict(deps)),
+                                                  repeat)
+
+    timings.update(time_rankings(df, results['class_index'].values['index'], repeat))
+
+    if charts:
+        from analyze_weapons import chart_frame
+        from charts import analysis_charts, render_charts
+
+        chart_df = chart_frame(df)
+        classes = results['class_index'].values['index']
+        output_dir = os.path.join(work_dir, 'charts')
+        for job in analysis_charts():
+            timings[f'chart.{job.filename}'], _ = _best_of(
+                lambda: render_charts(chart_df, [job], output_dir=output_dir, workers=1,
+                                      force=True, classes=classes), repeat)
+        timings['cli.all_warm'] = time_warm_run(csv_path, work_dir, repeat)
+    return timings
+
+
+def time_warm_run(csv_path, work_dir, repeat=REPEAT):
+    """Seconds of an ``analyze_weapons.py all`` run with nothing left to cache or render."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analyze_weapons.py')
+    command = [sys.executable, script, '--data', csv_path, 'all',
+               '--output-dir', os.path.join(work_dir, 'cli_charts')]
+
+    def analyze():
+        # The column cache goes to the working directory's .weapon_cache
+        subprocess.run(command, cwd=work_dir, check=True, stdout=subprocess.DEVNULL)
+    analyze()  # fills the cache and renders every figure
+    return _best_of(analyze, repeat)[0]
+
+
+def time_rankings(df, classes, repeat=REPEAT):
+    """Seconds to build a RankIndex of the leaderboard metrics and to update one weapon."""
+    values = {col: df[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in RANKED_METRICS}
+    values['BTK_Variance'] = btk_variance(df)
+    values['composite_score'] = composite_scores(df)
+    # Most consistent (lowest BTK variance) ranks first
+    descending = set(values) - LOWER_IS_BETTER - {'BTK_Variance'}
+    timings = {}
+    timings['rankings.build'], index = _best_of(lambda: RankIndex(values, descending, classes),
+                                                repeat)
+
+    # The middle weapon alternates between 10% better and its own values
+    row = len(df) // 2
+    changes = [{metric: v[row:row + 1] * scale for metric, v in values.items()}
+               for scale in (1.1, 1.0)]
+
+    def update():
+        index.update([row], changes[0])
+        changes.reverse()
+        for metric in values:
+            for worst in (False, True):
+                index.top(metric, 10, worst)
+                for name in classes.names:
+                    index.top(metric, 10, worst, name)
+    timings['rankings.update'], _ = _best_of(update, repeat)
+    return timings
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=SIZES, seed=0, repeat=REPEAT, chart_limit=CHART_LIMIT, log=print):
+    """Benchmark record of every size: environment plus per-stage seconds."""
+    record = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'machine': platform.node(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'seed': seed,
+        'repeat': repeat,
+        'results': {},
+    }
+    template = read_weapons_csv(DATA_FILE)
+    with tempfile.TemporaryDirectory(prefix='bf6_bench_') as work_dir:
+        for n in sizes:
+            csv_path = os.path.join(work_dir, f'weapons_{n}.csv')
+            synthetic_weapons(n, seed, template).to_csv(csv_path, index=False)
+            log(f"Timing {n:,} weapons...")
+            record['results'][str(n)] = time_stages(csv_path, work_dir, repeat,
+                                                    charts=n <= chart_limit)
+    return record
+
+
+def load_history(path=HISTORY_FILE):
+    """Every benchmark record in ``path``, oldest first."""
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def append_history(record, path=HISTORY_FILE):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def compare(record, history, threshold=THRESHOLD, min_delta=MIN_DELTA, baseline_runs=BASELINE_RUNS):
+    """Stage timings of ``record`` against the median of earlier runs.
+
+    Only runs on the same machine count.  Returns one row per (size, stage)
+    with Seconds, Baseline, Change and a Regression flag; Baseline is NaN
+    for stages without history.
+    """
+    previous = [r for r in history if r.get('machine') == record['machine']][-baseline_runs:]
+    rows = []
+    for size, timings in record['results'].items():
+        for stage, seconds in timings.items():
+            past = [r['results'][size][stage] for r in previous
+                    if stage in r['results'].get(size, {})]
+            baseline = float(np.median(past)) if past else np.nan
+            regression = bool(past) and seconds > baseline * (1 + threshold) \
+                and seconds - baseline > min_delta
+            rows.append((int(size), stage, seconds, baseline, seconds / baseline - 1, regression))
+    return pd.DataFrame(rows, columns=['Size', 'Stage', 'Seconds', 'Baseline', 'Change', 'Regression'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help="weapon counts to benchmark (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help="runs per stage, best one kept (default: %(default)s)")
+    parser.add_argument('--chart-limit', type=int, default=CHART_LIMIT,
+                        help="largest size whose charts are timed; 1000000 covers every "
+                             "default size (default: %(default)s)")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="slowdown flagged as a regression (default: %(default)s)")
+    parser.add_argument('--history', default=HISTORY_FILE, help="history file (default: %(default)s)")
+    parser.add_argument('--no-save', action='store_true', help="do not append this run to the history")
+    args = parser.parse_args(argv)
+
+    history = load_history(args.history)
+    record = run_benchmarks(args.sizes, args.seed, args.repeat, args.chart_limit)
+    table = compare(record, history, args.threshold)
+    if not args.no_save:
+        append_history(record, args.history)
+
+    with pd.option_context('display.max_rows', None, 'display.width', 120):
+        print(table.to_string(index=False, formatters={
+            'Seconds': '{:.4f}'.format, 'Baseline': '{:.4f}'.format, 'Change': '{:+.1%}'.format,
+            'Regression': lambda flag: 'REGRESSION' if flag else ''}))
+    regressions = table[table['Regression']]
+    if len(regressions):
+        print(f"\n{len(regressions)} stage(s) more than {args.threshold:.0%} slower than baseline")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
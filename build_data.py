@@ -0,0 +1,212 @@
+"""Build data.js, the dashboard's precomputed weapon payload.
+
+The dashboard used to embed data.csv as a string and parse, rename and
+re-sort it on every page load.  This step does that work once, from the
+same typed frame ``load_weapons`` gives the Python analyses:
+
+* every numeric column becomes a typed array at its schema width (Int8Array
+  for bullets to kill, Int16Array for RPM and TTKs, Float32Array for the
+  coefficients), stored as base64 little-endian bytes that the page decodes
+  with one bulk copy per column.  The page rounds float32 values to 7
+  significant digits, so 0.94 reads as 0.94 and not 0.9399999976158142;
+* derived metrics the page ranks by (the calculator's balanced score) are
+  computed here in float64, from the rounded values the page shows; and
+* for every sort key the page uses, the ascending row order is precomputed,
+  so leaderboards, charts and table sorts only walk an index.  The page
+  derives the descending order once per key, in one pass: the ascending
+  order reversed, with each run of equal keys put back in file order.
+
+Missing values (and a balanced score without a TTK or accuracy) are written
+as 0, which is what the page's CSV parser used to do.  Ties keep file
+order, like the page's stable ``Array.sort``.
+
+data.js records the content hash of the CSV it was built from, and the
+build is skipped when the CSV has not changed.
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+
+import numpy as np
+
+from weapon_data import DATA_FILE, file_digest, load_weapons
+
+OUTPUT_FILE = 'data.js'
+# Bump when the payload layout changes, so existing data.js files are rebuilt
+PAYLOAD_VERSION = 2
+HEADER = '// Generated by build_data.py from {source} - do not edit by hand.\n'
+STAMP = '// source {digest} payload v{version}\n'
+
+# Dashboard field name -> data.csv column
+FIELDS = {
+    'btk0': 'BTK at 0',
+    'btk20': 'BTK at 20',
+    'btk35': 'BTK at 35',
+    'btk75': 'BTK at 75',
+    'rpm': 'RPM',
+    'fireInterval': 'fire interval ms',
+    'velocity': 'Velocity, ms',
+    'ttk0': 'TTK at 0 m, ms',
+    'ttk20': 'TTK at 20 m, ms',
+    'ttk35': 'TTK at 35 m, ms',
+    'ttk75': 'TTK at 75 m, ms',
+    'burstHits': 'Burst Hits',
+    'burstAccuracy': 'Burst Accuracy Coefficient',
+    'cqbAccuracy': 'CQB Accuracy Coefficient',
+    'longRangeAccuracy': 'Long Range Accuracy Coefficient',
+    'power20': '20 m Power Score',
+    'power21': '21 m Power Score',
+    'power35': '35 m Power Score',
+    'power75': '75 m Power Score',
+    'lethality': 'practical lethality coefficient',
+}
+
+# Keys the dashboard sorts by, each with an ascending row order
+SORT_KEYS = ['weapon', 'weaponClass', 'rpm', 'velocity', 'ttk0', 'ttk20', 'ttk35', 'ttk75',
+             'power20', 'burstAccuracy', 'lethality', 'balanced']
+
+TYPED_ARRAYS = {
+    np.dtype('int8'): 'Int8Array',
+    np.dtype('uint8'): 'Uint8Array',
+    np.dtype('int16'): 'Int16Array',
+    np.dtype('uint16'): 'Uint16Array',
+    np.dtype('int32'): 'Int32Array',
+    np.dtype('uint32'): 'Uint32Array',
+    np.dtype('float32'): 'Float32Array',
+    np.dtype('float64'): 'Float64Array',
+}
+
+DECODER = """\
+function decodeColumn(base64, TypedArray) {
+    const bytes = atob(base64);
+    const buffer = new Uint8Array(bytes.length);
+    for (let i = 0; i < bytes.length; i++) buffer[i] = bytes.charCodeAt(i);
+    return new TypedArray(buffer.buffer);
+}
+"""
+
+
+def _typed_values(series):
+    """A column as an array a JS typed array can hold, missing values as 0."""
+    values = series.to_numpy()
+    if values.dtype.kind == 'f':
+        return np.nan_to_num(values, nan=0.0)
+    return values
+
+
+def _page_decimals(values):
+    """Float32 ``values`` rounded to 7 significant digits, as the page reads them."""
+    return np.array([float(f'{v:.7g}') for v in values], dtype=np.float64)
+
+
+def _index_dtype(n):
+    return np.min_scalar_type(max(n - 1, 0))
+
+
+def _row_order(keys, n):
+    """Stable ascending row order of one sort key."""
+    dtype = _index_dtype(n)
+    if keys.dtype == object:
+        # Case-insensitive, close to the page's localeCompare
+        ranks = {value: rank for rank, value in
+                 enumerate(sorted(set(keys), key=lambda s: (s.casefold(), s)))}
+        keys = np.array([ranks[value] for value in keys], dtype=np.int64)
+    return np.argsort(keys, kind='stable').astype(dtype)
+
+
+def build_payload(df):
+    """Names, columns and row orders of a typed weapons frame, as numpy arrays."""
+    n = len(df)
+    columns = {field: _typed_values(df[column]) for field, column in FIELDS.items()}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balanced = (1 / columns['ttk20'].astype(np.float64)) \
+            * _page_decimals(columns['burstAccuracy']) * (columns['rpm'] / 1000)
+    columns['balanced'] = np.nan_to_num(balanced, nan=0.0)
+
+    classes = df['Weapon Class'].cat
+    sort_values = dict(columns, weapon=df['Weapon'].to_numpy(dtype=object),
+                       weaponClass=df['Weapon Class'].astype(object).to_numpy())
+    orders = {key: _row_order(sort_values[key], n) for key in SORT_KEYS}
+
+    return {
+        'count': n,
+        'names': df['Weapon'].tolist(),
+        'classes': [str(c) for c in classes.categories],
+        # -1 marks a weapon without a class
+        'classCodes': classes.codes.to_numpy().astype(np.min_scalar_type(-len(classes.categories))),
+        'columns': columns,
+        'order': orders,
+    }
+
+
+def _js_array(values):
+    values = np.ascontiguousarray(values)
+    values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+    encoded = base64.b64encode(values.tobytes()).decode('ascii')
+    return f"decodeColumn('{encoded}', {TYPED_ARRAYS[values.dtype.newbyteorder('=')]})"
+
+
+def _js_object(arrays, indent):
+    pad = ' ' * indent
+    lines = [f"{pad}{json.dumps(key)}: {_js_array(values)}," for key, values in arrays.items()]
+    return '{\n' + '\n'.join(lines) + '\n' + ' ' * (indent - 4) + '}'
+
+
+def render_payload(payload, source, digest):
+    """The text of data.js for ``payload``."""
+    return (
+        HEADER.format(source=os.path.basename(source))
+        + STAMP.format(digest=digest, version=PAYLOAD_VERSION)
+        + DECODER
+        + '\nconst WEAPON_DATA = {\n'
+        + f"    count: {payload['count']},\n"
+        + f"    names: {json.dumps(payload['names'])},\n"
+        + f"    classes: {json.dumps(payload['classes'])},\n"
+        + f"    classCodes: {_js_array(payload['classCodes'])},\n"
+        + f"    columns: {_js_object(payload['columns'], 8)},\n"
+        + f"    order: {_js_object(payload['order'], 8)}\n"
+        + '};\n'
+    )
+
+
+def _built_from(path):
+    """The stamp line of an existing data.js, or None."""
+    try:
+        with open(path) as f:
+            f.readline()
+            return f.readline()
+    except OSError:
+        return None
+
+
+def build(source=DATA_FILE, output=OUTPUT_FILE, force=False, use_cache=True):
+    """Write ``output`` from ``source``; return False if it was already up to date."""
+    digest = file_digest(source)
+    if not force and _built_from(output) == STAMP.format(digest=digest, version=PAYLOAD_VERSION):
+        return False
+    text = render_payload(build_payload(load_weapons(source, use_cache=use_cache)), source, digest)
+    with open(output + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(output + '.tmp', output)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the dashboard's data.js from data.csv.")
+    parser.add_argument('--data', default=DATA_FILE, help="weapon CSV (default: %(default)s)")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="payload file (default: %(default)s)")
+    parser.add_argument('--force', action='store_true', help="rebuild even if the CSV is unchanged")
+    parser.add_argument('--no-cache', action='store_true', help="parse the CSV, bypassing the load cache")
+    args = parser.parse_args(argv)
+
+    if build(args.data, args.output, args.force, use_cache=not args.no_cache):
+        print(f"Wrote {args.output} from {args.data}")
+    else:
+        print(f"{args.output} is up to date with {args.data}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
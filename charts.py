@@ -0,0 +1,596 @@
+"""Parallel, cache-aware rendering of the analysis figures.
+
+Every figure is an independent ChartJob: a render function, the columns of
+the weapons frame it reads and its plot parameters.  A job's cache key is a
+hash of exactly those inputs (plus the source of this module and of
+class_index, which hold every render function and the helpers they call,
+and the output settings), so a figure whose key is unchanged is skipped and the PNG
+already in the output directory is reused.  Stale figures are rendered in a
+process pool on the Agg backend.
+
+matplotlib and seaborn are only imported inside the render workers, so a
+run where every figure is cached never pays for the plotting stack.
+
+Frames with more than LARGE_DATA_ROWS weapons are drawn in a large-data
+mode whose cost stays roughly flat as the row count grows:
+
+* ranked bar charts show the top and bottom SUMMARY_BARS weapons, with
+  every weapon in between folded into one bar (median, min-max whiskers);
+* scatters become log-scaled hexagonal density rasters, with each class's
+  median marked;
+* per-weapon lines are drawn as one LineCollection per axis, over a seeded
+  sample of LINE_SAMPLE weapons, under the median and 5-95% band; and
+* box plots leave out individual fliers.
+"""
+import hashlib
+import inspect
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from importlib import metadata
+
+import numpy as np
+import pandas as pd
+
+import class_index
+import profiling
+from class_index import ClassIndex
+from ttk_engine import BTK_COLUMNS, TTK_COLUMNS
+
+OUTPUT_DIR = 'analysis_output'
+CACHE_FILE = '.chart_cache.json'
+DPI = 300
+# Above this many rows the figures switch to the large-data mode
+LARGE_DATA_ROWS = 200
+SUMMARY_BARS = 15
+LINE_SAMPLE = 2000
+DENSITY_GRID = 60
+
+POWER_COLUMNS = ['20 m Power Score', '21 m Power Score', '35 m Power Score', '75 m Power Score']
+DISTANCE_LABELS = ['0m', '20m', '35m', '75m']
+CLASS_COLORS = {'LMG': 'red', 'AR': 'blue', 'SMG': 'green', 'CRB': 'orange'}
+CORRELATION_COLUMNS = ['RPM', 'fire interval ms', 'Velocity, ms', 'TTK at 0 m, ms',
+                       'TTK at 20 m, ms', 'TTK at 35 m, ms', 'TTK at 75 m, ms',
+                       'Burst Accuracy Coefficient', 'CQB Accuracy Coefficient',
+                       'Long Range Accuracy Coefficient', '20 m Power Score']
+
+
+@dataclass
+class ChartJob:
+    """One figure: ``render(data, path, **params)`` over ``columns`` of the frame.
+
+    ``by_class`` jobs also receive the frame's ClassIndex as ``classes``.
+    """
+    filename: str
+    render: object
+    columns: list
+    params: dict = field(default_factory=dict)
+    by_class: bool = False
+
+
+def _init_worker():
+    """Configure the plotting stack for headless rendering."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.set_style("whitegrid")
+    plt.rcParams['figure.figsize'] = (12, 8)
+
+
+def _save(fig, path):
+    import matplotlib.pyplot as plt
+
+    with profiling.span('tight_layout', 'chart'):
+        fig.tight_layout()
+    with profiling.span('savefig', 'chart', dpi=DPI):
+        fig.savefig(path, dpi=DPI, bbox_inches='tight')
+    plt.close(fig)
+
+
+def _ranked_barh(ax, values, labels, colors):
+    """Horizontal bar chart, first value at the top."""
+    ax.barh(range(len(values)), values, color=colors, alpha=0.7)
+    ax.set_yticks(range(len(values)))
+    ax.set_yticklabels(labels, fontsize=8)
+    ax.invert_yaxis()
+
+
+def _extremes_colors(n, middle, best='green', worst='red', count=5, positions=None):
+    """Colour the first and last ``count`` bars of a ranked chart of ``n``.
+
+    ``positions`` restricts the result to those ranks (all by default).
+    """
+    if positions is None:
+        positions = range(n)
+    return [best if i < count else worst if i >= n - count else middle for i in positions]
+
+
+def _is_large(data):
+    return len(data) > LARGE_DATA_ROWS
+
+
+def _ranked_barh_summary(ax, values, labels, colors, n=SUMMARY_BARS):
+    """Large-data ranked chart: the first and last ``n`` of ``values``.
+
+    The ranks in between are folded into one bar at their median, with
+    whiskers to their min and max.  ``labels`` and ``colors`` map an array
+    of ranks to bar labels and colours.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    head = np.arange(n)
+    tail = np.arange(len(values) - n, len(values))
+    rest = values[n:len(values) - n]
+    median, low, high = np.median(rest), rest.min(), rest.max()
+
+    bar_values = np.concatenate([values[head], [median], values[tail]])
+    bar_labels = list(labels(head)) + [f'{len(rest):,} others (median)'] + list(labels(tail))
+    bar_colors = list(colors(head)) + ['lightgray'] + list(colors(tail))
+    ax.barh(range(len(bar_values)), bar_values, color=bar_colors, alpha=0.7)
+    ax.errorbar(median, n, xerr=[[median - low], [high - median]], color='black', capsize=4)
+    ax.set_yticks(range(len(bar_values)))
+    ax.set_yticklabels(bar_labels, fontsize=8)
+    ax.invert_yaxis()
+
+
+def _sort_order(values, ascending=True):
+    """Row positions of ``values`` in sorted order, NaNs last.
+
+    The same order ``DataFrame.sort_values`` gives, without copying the
+    frame.
+    """
+    return pd.Series(np.asarray(values)).sort_values(ascending=ascending).index.to_numpy()
+
+
+def _ranked(ax, values, labels, colors, order):
+    """Ranked bar chart of every row, or its summary for large frames.
+
+    ``order`` lists the rows of ``values``/``labels`` (Series) to draw, in
+    rank order; only the labels actually drawn are gathered.  ``colors``
+    maps an array of ranks to bar colours.
+    """
+    values = np.asarray(values)[order]
+    label_of = lambda ranks: labels.iloc[order[ranks]].to_numpy(dtype=object)
+    if len(values) > LARGE_DATA_ROWS:
+        _ranked_barh_summary(ax, values, label_of, colors)
+    else:
+        ranks = np.arange(len(values))
+        _ranked_barh(ax, values, label_of(ranks), colors(ranks))
+
+
+def _density(ax, x, y, classes=None):
+    """Log-scaled hexbin density of (x, y) with each class's median marked."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.isfinite(x) & np.isfinite(y)
+    cells = ax.hexbin(x[valid], y[valid], gridsize=DENSITY_GRID, bins='log', cmap='Greys',
+                      mincnt=1)
+    ax.figure.colorbar(cells, ax=ax, label='Weapons')
+    if classes is not None:
+        for weapon_class, rows in classes:
+            rows = rows[valid[rows]]
+            ax.scatter(np.median(x[rows]), np.median(y[rows]), label=f'{weapon_class} median',
+                       s=150, marker='X', edgecolors='black')
+        ax.legend()
+
+
+def _line_bundle(ax, xs, values):
+    """Every row of ``values`` as a line over ``xs``, in one collection.
+
+    At most LINE_SAMPLE rows (a seeded sample) are drawn, under the median
+    line and the 5-95% band of all rows.
+    """
+    from matplotlib.collections import LineCollection
+
+    values = np.asarray(values, dtype=np.float64)
+    rows = values[np.isfinite(values).all(axis=1)]
+    if len(rows) > LINE_SAMPLE:
+        rows = rows[np.random.default_rng(0).choice(len(rows), LINE_SAMPLE, replace=False)]
+    xs = np.asarray(xs, dtype=np.float64)
+    segments = np.stack([np.broadcast_to(xs, rows.shape), rows], axis=-1)
+    ax.add_collection(LineCollection(segments, colors='steelblue', linewidths=0.5,
+                                     alpha=min(0.5, max(0.02, 50 / max(len(rows), 1)))))
+    low, median, high = np.nanpercentile(values, [5, 50, 95], axis=0)
+    ax.fill_between(xs, low, high, color='orange', alpha=0.25, label='5-95% of weapons')
+    ax.plot(xs, median, color='darkred', marker='o', linewidth=2, label='Median')
+    ax.autoscale_view()
+    ax.legend()
+
+
+def _class_boxplot(ax, classes, values):
+    import matplotlib.pyplot as plt
+
+    values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    groups = classes.split(values, dropna=True)
+    # Order classes by their first row with a value and leave out classes
+    # without any, as grouping the dropna()'d rows would
+    first = classes.split(np.where(np.isnan(values), len(values), np.arange(len(values))))
+    present = sorted((rows.min(), i) for i, rows in enumerate(first) if len(groups[i]))
+    weapon_classes = [classes.names[i] for _, i in present]
+    data_by_class = [groups[i] for _, i in present]
+    bp = ax.boxplot(data_by_class, patch_artist=True, showfliers=len(values) <= LARGE_DATA_ROWS)
+    ax.set_xticks(range(1, len(weapon_classes) + 1), weapon_classes)
+    colors = plt.cm.Set3(range(len(weapon_classes)))
+    for patch, color in zip(bp['boxes'], colors):
+        patch.set_facecolor(color)
+
+
+def _correlation_label(ax, corr):
+    ax.text(0.05, 0.95, f'Correlation: {corr:.3f}', transform=ax.transAxes,
+            verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
+
+
+def render_ttk(data, path, distances, labels):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('Time to Kill Analysis Across Distances', fontsize=16, fontweight='bold')
+    for idx, (dist, label) in enumerate(zip(distances, labels)):
+        ax = axes[idx // 2, idx % 2]
+        _ranked(ax, data[dist], data['Weapon'],
+                lambda ranks: _extremes_colors(len(data), 'gray', positions=ranks),
+                _sort_order(data[dist]))
+        ax.set_xlabel('TTK (milliseconds)', fontsize=10)
+        ax.set_title(f'TTK at {label} (Green=Best 5, Red=Worst 5)', fontsize=12, fontweight='bold')
+    _save(fig, path)
+
+
+def render_power_scores(data, path, classes, scores, labels):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('Power Score Analysis (Lower is Better)', fontsize=16, fontweight='bold')
+    for idx, (score, label) in enumerate(zip(scores, labels)):
+        ax = axes[idx // 2, idx % 2]
+        if _is_large(data):
+            _density(ax, data.index, data[score], classes)
+        else:
+            for weapon_class, class_data in classes.frames(data):
+                ax.scatter(class_data.index, class_data[score], label=weapon_class, s=100, alpha=0.7)
+            ax.legend()
+        ax.set_xlabel('Weapon Index', fontsize=10)
+        ax.set_ylabel('Power Score', fontsize=10)
+        ax.set_title(f'{label} Power Score by Class', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+    _save(fig, path)
+
+
+def _rpm_scatter(ax, class_frames, dist):
+    for weapon_class, class_data in class_frames:
+        ax.scatter(class_data['RPM'], class_data[dist], label=weapon_class, s=100, alpha=0.7)
+
+        # Add weapon names for outliers
+        q1 = class_data[dist].quantile(0.25)
+        q3 = class_data[dist].quantile(0.75)
+        iqr = q3 - q1
+        outliers = class_data[(class_data[dist] < q1 - 1.5*iqr) | (class_data[dist] > q3 + 1.5*iqr)]
+        for _, outlier in outliers.iterrows():
+            ax.annotate(outlier['Weapon'], (outlier['RPM'], outlier[dist]),
+                        fontsize=7, alpha=0.7)
+    ax.legend()
+
+
+def render_rpm_vs_ttk(data, path, classes, distances, labels):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('RPM vs TTK at Different Ranges', fontsize=16, fontweight='bold')
+    for idx, (dist, label) in enumerate(zip(distances, labels)):
+        ax = axes[idx // 2, idx % 2]
+        if _is_large(data):
+            # Outlier names are left out: there would be thousands
+            _density(ax, data['RPM'], data[dist], classes)
+        else:
+            _rpm_scatter(ax, classes.frames(data), dist)
+        ax.set_xlabel('RPM (Rounds Per Minute)', fontsize=10)
+        ax.set_ylabel(f'TTK at {label} (ms)', fontsize=10)
+        ax.set_title(f'RPM vs TTK at {label}', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        _correlation_label(ax, data['RPM'].corr(data[dist]))
+    _save(fig, path)
+
+
+def render_accuracy(data, path, classes):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('Accuracy Coefficient Analysis', fontsize=16, fontweight='bold')
+
+    panels = [(axes[0, 0], 'Burst Accuracy Coefficient', 'Burst Accuracy', 'steelblue'),
+              (axes[0, 1], 'CQB Accuracy Coefficient', 'CQB Accuracy', 'orange'),
+              (axes[1, 0], 'Long Range Accuracy Coefficient', 'Long Range Accuracy', 'purple')]
+    for ax, metric, title, middle in panels:
+        _ranked(ax, data[metric], data['Weapon'],
+                lambda ranks: _extremes_colors(len(data), middle, positions=ranks),
+                _sort_order(data[metric], ascending=False))
+        ax.set_xlabel(metric, fontsize=10)
+        ax.set_title(f'{title} (Higher = Better)', fontsize=12, fontweight='bold')
+
+    # Burst Hits vs BTK
+    ax = axes[1, 1]
+    if _is_large(data):
+        _density(ax, data['BTK at 20'], data['Burst Hits'], classes)
+    else:
+        for weapon_class, class_data in classes.frames(data):
+            ax.scatter(class_data['BTK at 20'], class_data['Burst Hits'],
+                       label=weapon_class, s=100, alpha=0.7)
+        ax.legend()
+    ax.set_xlabel('BTK at 20m', fontsize=10)
+    ax.set_ylabel('Average Burst Hits', fontsize=10)
+    ax.set_title('Burst Hits vs BTK (Efficiency)', fontsize=12, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    _save(fig, path)
+
+
+def render_class_comparison(data, path, classes, metrics, titles):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 3, figsize=(18, 12))
+    fig.suptitle('Weapon Class Performance Comparison', fontsize=16, fontweight='bold')
+    for idx, (metric, title) in enumerate(zip(metrics, titles)):
+        ax = axes[idx // 3, idx % 3]
+        _class_boxplot(ax, classes, data[metric])
+        ax.set_ylabel(title, fontsize=10)
+        ax.set_xlabel('Weapon Class', fontsize=10)
+        ax.set_title(f'{title} by Class', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3, axis='y')
+    _save(fig, path)
+
+
+def render_damage_falloff(data, path):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('Damage Falloff Characteristics', fontsize=16, fontweight='bold')
+
+    panels = [(axes[0, 0], BTK_COLUMNS, [0, 20, 35, 75], 'Bullets To Kill', 'BTK Falloff by Distance'),
+              (axes[0, 1], TTK_COLUMNS, [0, 20, 35, 75], 'Time To Kill (ms)', 'TTK Progression by Distance'),
+              (axes[1, 1], POWER_COLUMNS, [20, 21, 35, 75], 'Power Score', 'Power Score Degradation')]
+    for ax, columns, ranges, ylabel, title in panels:
+        if _is_large(data):
+            _line_bundle(ax, ranges, data[columns].to_numpy(dtype=np.float64, na_value=np.nan))
+        else:
+            for values in data[columns].to_numpy():
+                ax.plot(ranges, values, marker='o', alpha=0.5, linewidth=1)
+        ax.set_xlabel('Distance (m)', fontsize=10)
+        ax.set_ylabel(ylabel, fontsize=10)
+        ax.set_title(title, fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+
+    # "Consistency" - variance in BTK across ranges
+    ax = axes[1, 0]
+    order = _sort_order(data['BTK_Variance'])
+    variance = data['BTK_Variance'].to_numpy()[order]
+    _ranked(ax, data['BTK_Variance'], data['Weapon'],
+            lambda ranks: ['green' if x < 0.5 else 'yellow' if x < 1.0 else 'red'
+                           for x in variance[ranks]], order)
+    ax.set_xlabel('BTK Variance', fontsize=10)
+    ax.set_title('Damage Consistency (Lower = More Consistent)', fontsize=12, fontweight='bold')
+    _save(fig, path)
+
+
+def render_lethality(data, path, classes):
+    import matplotlib.pyplot as plt
+
+    metric = 'practical lethality coefficient'
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+    fig.suptitle('Practical Lethality Analysis', fontsize=16, fontweight='bold')
+
+    # Lethality coefficient ranking
+    ax = axes[0]
+    # Weapons without a coefficient sort last and are left out
+    order = _sort_order(data[metric])[:data[metric].count()]
+    _ranked(ax, data[metric], data['Weapon'],
+            lambda ranks: _extremes_colors(len(order), 'steelblue', positions=ranks), order)
+    ax.set_xlabel('Practical Lethality Coefficient', fontsize=10)
+    ax.set_title('Practical Lethality Ranking', fontsize=12, fontweight='bold')
+
+    # Lethality by class
+    ax = axes[1]
+    _class_boxplot(ax, classes, data[metric])
+    ax.set_ylabel('Practical Lethality Coefficient', fontsize=10)
+    ax.set_xlabel('Weapon Class', fontsize=10)
+    ax.set_title('Lethality by Weapon Class', fontsize=12, fontweight='bold')
+    ax.grid(True, alpha=0.3, axis='y')
+    _save(fig, path)
+
+
+def render_velocity(data, path, classes):
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+    fig.suptitle('Projectile Velocity Analysis', fontsize=16, fontweight='bold')
+
+    # Velocity by weapon
+    ax = axes[0]
+    order = _sort_order(data['Velocity, ms'], ascending=False)
+    _ranked(ax, data['Velocity, ms'], data['Weapon'],
+            lambda ranks: [CLASS_COLORS.get(wc, 'gray')
+                           for wc in data['Weapon Class'].iloc[order[ranks]]], order)
+    ax.set_xlabel('Velocity (m/s)', fontsize=10)
+    ax.set_title('Projectile Velocity by Weapon', fontsize=12, fontweight='bold')
+    legend_elements = [Patch(facecolor=CLASS_COLORS[wc], alpha=0.7, label=wc)
+                       for wc in CLASS_COLORS.keys()]
+    ax.legend(handles=legend_elements, loc='lower right')
+
+    # Velocity vs TTK at long range
+    ax = axes[1]
+    if _is_large(data):
+        _density(ax, data['Velocity, ms'], data['TTK at 75 m, ms'], classes)
+    else:
+        for weapon_class, class_data in classes.frames(data):
+            ax.scatter(class_data['Velocity, ms'], class_data['TTK at 75 m, ms'],
+                       label=weapon_class, s=100, alpha=0.7)
+        ax.legend()
+    ax.set_xlabel('Velocity (m/s)', fontsize=10)
+    ax.set_ylabel('TTK at 75m (ms)', fontsize=10)
+    ax.set_title('Velocity vs Long Range TTK', fontsize=12, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    _correlation_label(ax, data['Velocity, ms'].corr(data['TTK at 75 m, ms']))
+    _save(fig, path)
+
+
+def render_correlation_heatmap(data, path):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(14, 12))
+    sns.heatmap(data.corr(), annot=True, fmt='.2f', cmap='coolwarm', center=0,
+                square=True, linewidths=1, cbar_kws={"shrink": 0.8}, ax=ax)
+    ax.set_title('Correlation Heatmap of Weapon Metrics', fontsize=16, fontweight='bold', pad=20)
+    _save(fig, path)
+
+
+def analysis_charts():
+    """The nine figures produced by analyze_weapons.py."""
+    class_metrics = ['RPM', 'TTK at 20 m, ms', '20 m Power Score',
+                     'Burst Accuracy Coefficient', 'Velocity, ms', 'fire interval ms']
+    class_titles = ['Rate of Fire', 'TTK at 20m', '20m Power Score',
+                    'Burst Accuracy', 'Projectile Velocity', 'Fire Interval']
+    return [
+        ChartJob('1_ttk_analysis.png', render_ttk, ['Weapon'] + TTK_COLUMNS,
+                 {'distances': TTK_COLUMNS, 'labels': DISTANCE_LABELS}),
+        ChartJob('2_power_scores.png', render_power_scores, ['Weapon Class'] + POWER_COLUMNS,
+                 {'scores': POWER_COLUMNS, 'labels': ['20m', '21m', '35m', '75m']}, by_class=True),
+        ChartJob('3_rpm_vs_ttk.png', render_rpm_vs_ttk,
+                 ['Weapon', 'Weapon Class', 'RPM'] + TTK_COLUMNS,
+                 {'distances': TTK_COLUMNS, 'labels': DISTANCE_LABELS}, by_class=True),
+        ChartJob('4_accuracy_analysis.png', render_accuracy,
+                 ['Weapon', 'Weapon Class', 'Burst Accuracy Coefficient', 'CQB Accuracy Coefficient',
+                  'Long Range Accuracy Coefficient', 'BTK at 20', 'Burst Hits'], by_class=True),
+        ChartJob('5_class_comparison.png', render_class_comparison,
+                 ['Weapon Class'] + class_metrics,
+                 {'metrics': class_metrics, 'titles': class_titles}, by_class=True),
+        ChartJob('6_damage_falloff.png', render_damage_falloff,
+                 ['Weapon', 'BTK_Variance'] + BTK_COLUMNS + TTK_COLUMNS + POWER_COLUMNS),
+        ChartJob('7_lethality.png', render_lethality,
+                 ['Weapon', 'Weapon Class', 'practical lethality coefficient'], by_class=True),
+        ChartJob('8_velocity.png', render_velocity,
+                 ['Weapon', 'Weapon Class', 'Velocity, ms', 'TTK at 75 m, ms'], by_class=True),
+        ChartJob('9_correlation_heatmap.png', render_correlation_heatmap, CORRELATION_COLUMNS),
+    ]
+
+
+def _renderer_version():
+    try:
+        return metadata.version('matplotlib')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+_SOURCE_DIGEST = None
+
+
+def _source_digest():
+    """Hash of the rendering code: this module and class_index, whose grouping it draws."""
+    global _SOURCE_DIGEST
+    if _SOURCE_DIGEST is None:
+        h = hashlib.sha256()
+        for module in (sys.modules[__name__], class_index):
+            h.update(inspect.getsource(module).encode())
+        _SOURCE_DIGEST = h.hexdigest()
+    return _SOURCE_DIGEST
+
+
+def job_key(job, df, renderer=None):
+    """Hash of everything that can change a job's output image."""
+    h = hashlib.sha256()
+    h.update(json.dumps({'file': job.filename, 'columns': list(job.columns),
+                         'params': job.params, 'dpi': DPI, 'matplotlib': renderer,
+                         'large_data': [LARGE_DATA_ROWS, SUMMARY_BARS, LINE_SAMPLE,
+                                        DENSITY_GRID]},
+                        sort_keys=True, default=str).encode())
+    # Any edit to a render function or a helper it calls changes every key
+    h.update(_source_digest().encode())
+    h.update(pd.util.hash_pandas_object(df.index, index=False).to_numpy().tobytes())
+    for col in job.columns:
+        h.update(str(df[col].dtype).encode())
+        h.update(pd.util.hash_pandas_object(df[col], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _render_job(job, data, path, classes):
+    # Spans are returned so a pool worker can hand them to the parent
+    mark = profiling.mark()
+    with profiling.span('plotting_setup', 'chart'):
+        _init_worker()
+    with profiling.span(job.filename, 'chart', rows=len(data)):
+        if job.by_class:
+            job.render(data, path, classes, **job.params)
+        else:
+            job.render(data, path, **job.params)
+    return job.filename, profiling.events(mark)
+
+
+def render_png(job, data, classes=None):
+    """Render one job into PNG bytes, bypassing the output directory and its manifest.
+
+    ``data`` holds the job's columns; ``classes`` is its ClassIndex for
+    ``by_class`` jobs.
+    """
+    buffer = io.BytesIO()
+    _render_job(job, data, buffer, classes)
+    return buffer.getvalue()
+
+
+def render_charts(df, jobs=None, output_dir=OUTPUT_DIR, workers=None, force=False, classes=None):
+    """Render every stale figure in ``jobs`` and report what happened.
+
+    ``classes`` is the ClassIndex of ``df``; it is built here when not given.
+    Returns a dict mapping each filename to ``'rendered'`` or ``'cached'``.
+    """
+    if jobs is None:
+        jobs = analysis_charts()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, CACHE_FILE)
+    manifest = _load_manifest(manifest_path)
+
+    renderer = _renderer_version()
+    status, stale = {}, []
+    for job in jobs:
+        key = job_key(job, df, renderer)
+        path = os.path.join(output_dir, job.filename)
+        if not force and manifest.get(job.filename) == key and os.path.exists(path):
+            status[job.filename] = 'cached'
+        else:
+            stale.append((job, key, path))
+
+    if stale:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(stale))
+        if classes is None and any(job.by_class for job, _, _ in stale):
+            classes = ClassIndex.from_frame(df)
+        # Copy-on-write makes the column selections safe to hand out uncopied
+        args = [(job, df[job.columns], path, classes if job.by_class else None)
+                for job, _, path in stale]
+        if workers <= 1:
+            for a in args:
+                _render_job(*a)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for _, spans in pool.map(_render_job, *zip(*args)):
+                    profiling.add_events(spans)
+        for job, key, _ in stale:
+            manifest[job.filename] = key
+            status[job.filename] = 'rendered'
+
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+
+    return {job.filename: status[job.filename] for job in jobs}
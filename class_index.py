@@ -0,0 +1,90 @@
+"""Row partitions of the weapons frame by weapon class.
+
+Masking the frame once per class (``df[df['Weapon Class'] == wc]``) scans
+every row for every class.  A ClassIndex is built once with a single
+factorize + stable argsort.  It stores the rows of each class as one
+contiguous slice of ``order``, so per-class views, aggregates and plots
+only touch each row once.
+
+Classes are numbered in order of first appearance, the same order as
+``df['Weapon Class'].unique()``.  Rows within a class stay in frame order.
+Rows without a class belong to no partition.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+CLASS_COLUMN = 'Weapon Class'
+
+
+@dataclass
+class ClassIndex:
+    """Class ``i`` occupies rows ``order[offsets[i]:offsets[i+1]]``."""
+    names: list
+    codes: np.ndarray    # class number of each row, -1 where missing
+    order: np.ndarray    # row positions grouped by class
+    offsets: np.ndarray  # len(names) + 1 boundaries into ``order``
+
+    @classmethod
+    def from_labels(cls, labels):
+        codes, uniques = pd.factorize(labels)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        offsets = np.zeros(len(uniques) + 1, dtype=np.intp)
+        np.cumsum(counts, out=offsets[1:])
+        # A stable sort of small integers is a radix sort, so sort the codes
+        # at their narrowest width, which is also how they are kept.  Missing
+        # labels (-1) sort first and are dropped from the partitions.
+        codes = codes.astype(np.min_scalar_type(-max(len(uniques), 1)), copy=False)
+        order = np.argsort(codes, kind='stable')[len(codes) - offsets[-1]:]
+        return cls(list(uniques), codes, order, offsets)
+
+    @classmethod
+    def from_frame(cls, df, column=CLASS_COLUMN):
+        return cls.from_labels(df[column])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        """Yield ``(name, row positions)`` for every class."""
+        for i, name in enumerate(self.names):
+            yield name, self.positions(i)
+
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def positions(self, i):
+        return self.order[self.offsets[i]:self.offsets[i + 1]]
+
+    def frames(self, df):
+        """Yield ``(name, rows of df)`` for every class."""
+        for name, rows in self:
+            yield name, df.iloc[rows]
+
+    def split(self, values, dropna=False):
+        """Per-class arrays of ``values`` (aligned with the frame's rows)."""
+        values = np.asarray(values)[self.order]
+        groups = np.split(values, self.offsets[1:-1])
+        if dropna:
+            groups = [g[~np.isnan(g)] for g in groups]
+        return groups
+
+    def mean(self, values):
+        """NaN-skipping per-class means of a 1-D or (rows, metrics) array."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            return self.mean(values[:, None])[:, 0]
+        codes = self.codes
+        if self.offsets[-1] < len(codes):
+            member = codes >= 0
+            codes, values = codes[member], values[member]
+        means = np.empty((len(self.names), values.shape[1]))
+        for j in range(values.shape[1]):
+            column = values[:, j]
+            valid = ~np.isnan(column)
+            total = np.bincount(codes, weights=np.where(valid, column, 0), minlength=len(self.names))
+            count = np.bincount(codes, weights=valid, minlength=len(self.names))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means[:, j] = total / count
+        return means
@@ -0,0 +1,346 @@
+"""Correlations between weapon metrics, with resampling uncertainty.
+
+With 31 weapons a correlation is a noisy estimate, so besides the matrix
+this module reports, for every pair of columns,
+
+* a percentile bootstrap confidence interval, and
+* a two-sided permutation p-value for "no association".
+
+Both use one kernel: the pairwise-complete Pearson correlation of every
+column of ``x`` with every column of ``y``, written as six matrix products
+of the zero-filled values and their validity masks.  A batch of resamples
+is a leading array axis, so thousands of correlation matrices come out of
+a few BLAS calls:
+
+* a bootstrap resample is a row of multinomial counts that weights the
+  rows, so the data is never copied per resample; and
+* a permutation shuffles the rows of the ``y`` side only, which gives the
+  permuted statistic of every pair at once.
+
+Spearman correlations are Pearson correlations of ranks, each column
+ranked over its own values (pandas would re-rank every pair over the rows
+both columns have, which only differs when values are missing).  Bootstrap
+resamples re-rank the data from the resample's weights, with ties
+averaged.  Permutations leave ranks unchanged, so the ranks are permuted
+directly.
+
+Permutations are split into fixed, separately seeded blocks, which a
+process pool spreads over the cores.  The p-values therefore do not depend
+on the number of workers.
+
+Frames with more than CHUNK_ROWS rows (million-row variant datasets) get
+their matrix from the same six sums, accumulated over row chunks, so no
+full-length float64 copy of the columns is ever made.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+METHODS = ('pearson', 'spearman')
+BOOTSTRAP_SAMPLES = 5000
+PERMUTATIONS = 5000
+CONFIDENCE = 0.95
+# Permutations per separately seeded block (the unit of parallel work)
+PERMUTATION_BLOCK = 1000
+# Floats in the (resamples x rows x columns) intermediates of one batch
+WORK_BUDGET = 4_000_000
+# Larger frames get their matrix from sums accumulated over row chunks
+CHUNK_ROWS = 131_072
+
+
+@dataclass
+class CorrelationReport:
+    """Correlation matrix and ranked pairs of a set of columns.
+
+    ``pairs`` has one row per pair of columns, strongest absolute
+    correlation first.  The columns are Metric 1, Metric 2, Correlation and
+    N (rows where both columns have values), then CI Low, CI High and
+    P-value when resampling was requested.
+    """
+    method: str
+    matrix: pd.DataFrame
+    pairs: pd.DataFrame
+    confidence: float
+    n_boot: int
+    n_perm: int
+
+
+def numeric_columns(df):
+    """Every numeric (non-boolean) column of ``df``."""
+    return [col for col in df.columns
+            if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+
+
+def correlation_matrix(df, columns=None, method='pearson'):
+    """Pairwise-complete correlation matrix of ``columns`` (all numeric by default)."""
+    return _matrix_and_counts(df, columns, method, counts=False)[0]
+
+
+def _matrix_and_counts(df, columns, method, counts=True):
+    """Correlation matrix of ``columns`` and the number of rows behind every entry.
+
+    Frames up to CHUNK_ROWS rows use ``DataFrame.corr``, with the counts
+    (when wanted) from one product of the validity mask; larger frames get
+    both from ``_chunked_corr``.  Without ``counts`` the second item is None.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+    columns = numeric_columns(df) if columns is None else list(columns)
+    frame = df[columns].rank() if method == 'spearman' else df[columns]
+    if len(frame) > CHUNK_ROWS:
+        r, n = _chunked_corr(frame)
+    else:
+        r, n = frame.corr().to_numpy(), None
+        if counts:
+            mask = frame.notna().to_numpy(dtype=np.float64)
+            n = mask.T @ mask
+    matrix = pd.DataFrame(r, index=columns, columns=columns)
+    return matrix, n.astype(np.int64) if counts else None
+
+
+def _chunked_corr(frame):
+    """Pairwise-complete Pearson matrix and pair counts of ``frame``, CHUNK_ROWS at a time.
+
+    Values are shifted by the first chunk's column means before summing,
+    which keeps the sums' cancellation error small.
+    """
+    shift, sums = None, None
+    for lo in range(0, max(len(frame), 1), CHUNK_ROWS):
+        values = frame.iloc[lo:lo + CHUNK_ROWS].to_numpy(dtype=np.float64, na_value=np.nan)
+        if shift is None:
+            with np.errstate(invalid='ignore'):
+                shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else 0.0
+        mask = ~np.isnan(values)
+        x = np.where(mask, values - shift, 0.0)
+        mask = mask.astype(np.float64)
+        chunk = _pair_sums(x, mask, x, mask)
+        sums = chunk if sums is None else [a + b for a, b in zip(sums, chunk)]
+    r = _corr_from_sums(*sums)
+    diagonal = np.einsum('ii->i', r)
+    diagonal[np.isfinite(diagonal)] = 1.0
+    return r, sums[0]
+
+
+def rank_pairs(matrix, extra=None):
+    """Upper-triangle pairs of a correlation matrix, strongest first.
+
+    Ties keep the row-major pair order and pairs without a correlation go
+    last.  ``extra`` maps column names to per-pair values in
+    ``np.triu_indices`` order, which are carried into the table.
+    """
+    names = np.asarray(matrix.columns, dtype=object)
+    i, j = np.triu_indices(len(names), k=1)
+    values = matrix.to_numpy(dtype=np.float64)[i, j]
+    strength = np.abs(values)
+    order = np.argsort(np.where(np.isnan(strength), np.inf, -strength), kind='stable')
+    table = {'Metric 1': names[i[order]], 'Metric 2': names[j[order]],
+             'Correlation': values[order]}
+    table.update({name: np.asarray(column)[order] for name, column in (extra or {}).items()})
+    return pd.DataFrame(table)
+
+
+def _prepare(values):
+    """Column-centred values with NaNs as 0, and the validity mask."""
+    mask = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(mask, values, 0).sum(axis=0) / mask.sum(axis=0)
+    return np.where(mask, values - np.nan_to_num(means), 0.0), mask.astype(np.float64)
+
+
+def _cross_corr(x, mx, y, my, weights=None):
+    """Pairwise-complete correlation of every column of ``x`` with every column of ``y``.
+
+    ``x``/``y`` are (..., rows, columns) zero-filled values with masks
+    ``mx``/``my``; leading batch axes broadcast.  ``weights`` (..., rows)
+    weight the rows.  Returns (..., columns_x, columns_y).
+    """
+    return _corr_from_sums(*_pair_sums(x, mx, y, my, weights))
+
+
+def _pair_sums(x, mx, y, my, weights=None):
+    """The six sums behind ``_cross_corr``: n, sx, sy, sxx, syy and sxy."""
+    if weights is not None:
+        w = weights[..., :, None]
+        wx, wm = x * w, mx * w
+    else:
+        wx, wm = x, mx
+    wx_t, wm_t = np.swapaxes(wx, -1, -2), np.swapaxes(wm, -1, -2)
+    n = wm_t @ my
+    sx = wx_t @ my
+    sy = wm_t @ y
+    sxx = (wx_t * np.swapaxes(x, -1, -2)) @ my
+    syy = wm_t @ (y * y)
+    sxy = wx_t @ y
+    return n, sx, sy, sxx, syy, sxy
+
+
+def _corr_from_sums(n, sx, sy, sxx, syy, sxy):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+    return np.clip(r, -1.0, 1.0)
+
+
+def _ranks(values):
+    """Average ranks of each column's values, NaN where missing."""
+    return pd.DataFrame(values).rank().to_numpy(dtype=np.float64)
+
+
+def _weighted_ranks(values, weights):
+    """Average ranks of every row in weighted resamples, shape (b, rows, columns).
+
+    A row's rank counts the resample weight of every smaller value, plus
+    the midpoint of its tie group's weight.  Missing values rank as NaN.
+    """
+    ranks = np.full(weights.shape + values.shape[1:], np.nan)
+    for j in range(values.shape[1]):
+        valid = np.flatnonzero(~np.isnan(values[:, j]))
+        uniques, group = np.unique(values[valid, j], return_inverse=True)
+        # Weight of every tie group in every resample
+        group_weight = np.zeros((len(weights), len(uniques)))
+        np.add.at(group_weight.T, group, weights[:, valid].T)
+        below = np.cumsum(group_weight, axis=1) - group_weight
+        ranks[:, valid, j] = (below + (group_weight + 1) / 2)[:, group]
+    return ranks
+
+
+def _batch_size(n_rows, n_columns):
+    return max(1, WORK_BUDGET // max(1, n_rows * n_columns))
+
+
+def bootstrap_intervals(values, method='pearson', n_boot=BOOTSTRAP_SAMPLES,
+                        confidence=CONFIDENCE, seed=0):
+    """Percentile bootstrap interval of every upper-triangle pair of columns.
+
+    ``values`` is a (rows, columns) array.  Returns (low, high) arrays in
+    ``np.triu_indices`` pair order; pairs whose resampled correlations are
+    all undefined get NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_rows, n_columns = values.shape
+    i, j = np.triu_indices(n_columns, k=1)
+    rng = np.random.default_rng(seed)
+    uniform = np.full(n_rows, 1.0 / n_rows)
+    if method == 'pearson':
+        x, mx = _prepare(values)
+
+    samples = np.empty((n_boot, len(i)))
+    step = _batch_size(n_rows, n_columns)
+    for lo in range(0, n_boot, step):
+        weights = rng.multinomial(n_rows, uniform, size=min(step, n_boot - lo)).astype(np.float64)
+        if method == 'spearman':
+            x, mx = _prepare_batch(_weighted_ranks(values, weights))
+        r = _cross_corr(x, mx, x, mx, weights)
+        samples[lo:lo + len(weights)] = r[:, i, j]
+
+    tail = (1 - confidence) / 2 * 100
+    with np.errstate(invalid='ignore'):
+        low, high = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+    return low, high
+
+
+def _prepare_batch(values):
+    """``_prepare`` for a (b, rows, columns) batch (missing values already NaN)."""
+    mask = ~np.isnan(values)
+    return np.where(mask, values - (values.shape[1] + 1) / 2, 0.0), mask.astype(np.float64)
+
+
+def _permutation_block(values, observed, n_perm, seed):
+    """How often ``n_perm`` permutations reach each pair's observed |r|."""
+    x, mx = _prepare(values)
+    n_rows, n_columns = values.shape
+    i, j = np.triu_indices(n_columns, k=1)
+    rng = np.random.default_rng(seed)
+    threshold = np.abs(observed) - 1e-12
+    hits = np.zeros(len(i), dtype=np.int64)
+    step = _batch_size(n_rows, n_columns)
+    for lo in range(0, n_perm, step):
+        count = min(step, n_perm - lo)
+        perms = rng.permuted(np.tile(np.arange(n_rows), (count, 1)), axis=1)
+        r = _cross_corr(x, mx, x[perms], mx[perms])
+        hits += (np.abs(r[:, i, j]) >= threshold).sum(axis=0)
+    return hits
+
+
+def permutation_pvalues(values, observed, method='pearson', n_perm=PERMUTATIONS, seed=0,
+                        workers=None):
+    """Two-sided permutation p-value of every upper-triangle pair of columns.
+
+    ``observed`` holds the pairs' correlations in ``np.triu_indices`` order.
+    A p-value is (1 + permutations with |r| >= |observed|) / (1 + n_perm).
+    ``workers=None`` uses every core and ``workers=1`` runs in-process.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if method == 'spearman':
+        values = _ranks(values)
+    observed = np.asarray(observed, dtype=np.float64)
+
+    sizes = [min(PERMUTATION_BLOCK, n_perm - lo) for lo in range(0, n_perm, PERMUTATION_BLOCK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(sizes))
+    args = [(values, observed, size, block_seed) for size, block_seed in zip(sizes, seeds)]
+    if workers <= 1:
+        blocks = [_permutation_block(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            blocks = list(pool.map(_permutation_block, *zip(*args)))
+
+    hits = np.sum(blocks, axis=0) if blocks else np.zeros(len(observed))
+    pvalues = (1 + hits) / (1 + n_perm)
+    return np.where(np.isnan(observed), np.nan, pvalues)
+
+
+def correlate(df, columns=None, method='pearson', n_boot=BOOTSTRAP_SAMPLES, n_perm=PERMUTATIONS,
+              confidence=CONFIDENCE, seed=0, workers=None):
+    """CorrelationReport of ``columns`` of ``df`` (all numeric columns by default).
+
+    ``n_boot=0`` / ``n_perm=0`` skip the confidence intervals / p-values.
+    """
+    matrix, counts = _matrix_and_counts(df, columns, method)
+    columns = list(matrix.columns)
+    i, j = np.triu_indices(len(columns), k=1)
+    observed = matrix.to_numpy(dtype=np.float64)[i, j]
+
+    extra = {'N': counts[i, j]}
+    if n_boot or n_perm:
+        values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    if n_boot:
+        extra['CI Low'], extra['CI High'] = bootstrap_intervals(values, method, n_boot,
+                                                                confidence, seed)
+    if n_perm:
+        extra['P-value'] = permutation_pvalues(values, observed, method, n_perm, seed, workers)
+    return CorrelationReport(method=method, matrix=matrix, pairs=rank_pairs(matrix, extra),
+                             confidence=confidence, n_boot=n_boot, n_perm=n_perm)
+
+
+def main(argv=None):
+    from weapon_data import DATA_FILE, load_weapons
+
+    parser = argparse.ArgumentParser(description="Ranked correlations between weapon metrics.")
+    parser.add_argument('--data', default=DATA_FILE, help="weapon CSV (default: %(default)s)")
+    parser.add_argument('--method', choices=METHODS, default='pearson')
+    parser.add_argument('--boot', type=int, default=BOOTSTRAP_SAMPLES,
+                        help="bootstrap resamples (default: %(default)s)")
+    parser.add_argument('--perm', type=int, default=PERMUTATIONS,
+                        help="permutations (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="permutation processes (default: one per CPU)")
+    parser.add_argument('--top', type=int, default=15, help="pairs to print (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    report = correlate(load_weapons(args.data), method=args.method, n_boot=args.boot,
+                       n_perm=args.perm, workers=args.workers)
+    print(f"{report.method.title()} correlations, {report.confidence:.0%} bootstrap intervals "
+          f"({report.n_boot:,} resamples), permutation p-values ({report.n_perm:,}):\n")
+    print(report.pairs.head(args.top).to_string(index=False, float_format='{:.3f}'.format))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,34 +1,52 @@
-// Embedded weapon data - no server required!
-const WEAPON_DATA_CSV = `Weapon,Weapon Class,BTK at 0,BTK at 20,BTK at 35,BTK at 75,RPM,fire interval ms,Velocity ms,TTK at 0 m ms,TTK at 20 m ms,TTK at 35 m ms,TTK at 75 m ms,Burst Hits,Burst Accuracy Coefficient,CQB Accuracy Coefficient,Long Range Accuracy Coefficient,20 m Power Score,21 m Power Score,35 m Power Score,75 m Power Score,practical lethality coefficient
-M240L,LMG,3,3,4,4,600,100,630,200,232,356,419,2.82,0.94,0.97,0.91,238,365,378,460,
-TR-7,AR,3,3,4,4,720,83,648,167,198,304,366,1.81,0.60,0.78,0.47,253,389,504,780,0.327
-M123K,LMG,4,4,5,5,830,72,670,217,247,341,401,3.54,0.89,0.95,0.83,261,361,386,482,0.279
-M/60,LMG,3,3,4,4,514,117,720,233,261,399,454,3.00,1.00,1.00,1.00,261,399,399,454,0.261
-DRS-IAR,LMG,4,4,5,5,771,78,720,233,261,360,415,3.63,0.91,0.96,0.86,273,376,397,481,0.288
-AK4D,AR,3,3,4,4,514,117,720,233,261,399,454,2.63,0.88,0.94,0.82,277,423,455,554,0.298
-L110,LMG,4,4,5,5,720,83,780,250,276,378,429,3.72,0.93,0.97,0.90,285,391,407,479,0.296
-B36A4,AR,4,4,5,5,720,83,780,250,276,378,429,3.63,0.91,0.96,0.86,288,395,417,497,0.304
-SCW-10,SMG,3,4,5,6,800,75,428,150,272,382,550,3.36,0.84,0.92,0.77,294,413,454,715,0.323
-KV9,SMG,4,5,6,7,1080,56,348,167,280,378,549,4.27,0.85,0.93,0.79,300,406,443,695,0.328
-M250,LMG,4,4,4,4,675,89,760,267,293,313,365,3.54,0.89,0.95,0.83,309,330,353,439,0.331
-L85A3,AR,4,4,5,5,635,94,814,283,308,421,470,3.63,0.91,0.96,0.86,322,439,464,544,0.339
-NVO-228E,AR,3,4,5,5,654,92,671,183,305,419,479,3.54,0.89,0.95,0.83,322,443,474,575,0.345
-M433,AR,4,4,5,5,830,72,670,217,247,341,401,2.27,0.57,0.75,0.43,327,453,602,938,0.435
-SG 53R,CRB,3,4,5,6,720,83,519,167,289,401,561,3.00,0.75,0.88,0.65,330,458,534,864,0.385
-SOR-556 MK2,AR,4,4,5,5,568,106,800,317,342,466,516,4.00,1.00,1.00,1.00,342,466,466,516,0.342
-KORD 6P67,AR,5,5,6,6,900,67,760,267,293,379,432,3.54,0.71,0.85,0.60,345,446,536,725,0.414
-SGX,SMG,4,5,6,7,830,72,402,217,339,449,620,4.72,0.94,0.97,0.92,348,460,475,676,0.359
-RPKM,LMG,3,4,5,5,553,108,670,217,355,486,546,4.00,1.00,1.00,1.00,355,486,486,546,0.355
-PW7A2,SMG,6,6,7,7,947,63,600,317,350,438,505,5.72,0.95,0.98,0.93,358,448,460,543,0.367
-PW5A3,SMG,4,5,6,7,771,78,432,233,358,470,641,4.72,0.94,0.97,0.92,367,482,498,698,0.379
-KTS100 MK8,LMG,4,4,5,5,514,117,840,350,374,509,556,4.00,1.00,1.00,1.00,374,509,509,556,
-M4A1,CRB,4,5,6,6,900,67,630,200,298,389,452,3.00,0.60,0.78,0.46,383,500,648,973,0.497
-M417 A2,CRB,3,4,5,5,654,92,600,183,309,425,492,2.54,0.64,0.80,0.51,384,530,670,972,0.486
-GRT-BC,CRB,4,5,6,6,830,72,624,217,321,418,482,3.27,0.65,0.82,0.53,394,512,638,911,0.491
-M277,CRB,4,4,4,4,720,83,599,250,283,308,375,2.09,0.52,0.72,0.38,395,430,590,993,0.542
-SL9,SMG,4,5,6,7,675,89,510,267,395,513,680,5.00,1.00,1.00,1.00,395,513,513,680,0.395
-USG-90,SMG,5,6,7,7,900,67,570,267,368,461,532,5.10,0.85,0.93,0.78,396,496,543,678,0.433
-QBZ,CRB,4,5,6,6,771,78,644,233,342,443,506,3.26,0.65,0.81,0.53,420,545,680,960,0.525
-UMG-40,SMG,4,5,6,6,635,94,488,283,419,544,626,4.72,0.94,0.97,0.92,430,558,576,683,0.444
-AK-205,CRB,5,6,7,7,720,83,737,333,444,547,602,6.00,1.00,1.00,1.00,444,547,547,602,0.444`;
+// Generated by build_data.py from data.csv - do not edit by hand.
+// source b1913145b13657638976aac4d721c687 payload v2
+function decodeColumn(base64, TypedArray) {
+    const bytes = atob(base64);
+    const buffer = new Uint8Array(bytes.length);
+    for (let i = 0; i < bytes.length; i++) buffer[i] = bytes.charCodeAt(i);
+    return new TypedArray(buffer.buffer);
+}
 
+const WEAPON_DATA = {
+    count: 31,
+    names: ["M240L", "TR-7", "M123K", "M/60", "DRS-IAR", "AK4D", "L110", "B36A4", "SCW-10", "KV9", "M250", "L85A3", "NVO-228E", "M433", "SG 53R", "SOR-556 MK2", "KORD 6P67", "SGX", "RPKM", "PW7A2", "PW5A3", "KTS100 MK8", "M4A1", "M417 A2", "GRT-BC", "M277", "SL9", "USG-90", "QBZ", "UMG-40", "AK-205"],
+    classes: ["AR", "CRB", "LMG", "SMG"],
+    classCodes: decodeColumn('AgACAgIAAgADAwIAAAABAAADAgMDAgEBAQEDAwEDAQ==', Int8Array),
+    columns: {
+        "btk0": decodeColumn('AwMEAwQDBAQDBAQEAwQDBAUEAwYEBAQDBAQEBQQEBQ==', Int8Array),
+        "btk20": decodeColumn('AwMEAwQDBAQEBQQEBAQEBAUFBAYFBAUEBQQFBgUFBg==', Int8Array),
+        "btk35": decodeColumn('BAQFBAUEBQUFBgQFBQUFBQYGBQcGBQYFBgQGBwYGBw==', Int8Array),
+        "btk75": decodeColumn('BAQFBAUEBQUGBwQFBQUGBQYHBQcHBQYFBgQHBwYGBw==', Int8Array),
+        "rpm": decodeColumn('WALQAj4DAgIDAwIC0ALQAiADOASjAnsCjgI+A9ACOAKEAz4DKQKzAwMDAgKEA44CPgPQAqMChAMDA3sC0AI=', Int16Array),
+        "fireInterval": decodeColumn('ZABTAEgAdQBOAHUAUwBTAEsAOABZAF4AXABIAFMAagBDAEgAbAA/AE4AdQBDAFwASABTAFkAQwBOAF4AUwA=', Int16Array),
+        "velocity": decodeColumn('dgKIAp4C0ALQAtACDAMMA6wBXAH4Ai4DnwKeAgcCIAP4ApIBngJYArABSAN2AlgCcAJXAv4BOgKEAugB4QI=', Int16Array),
+        "ttk0": decodeColumn('yACnANkA6QDpAOkA+gD6AJYApwALARsBtwDZAKcAPQELAdkA2QA9AekAXgHIALcA2QD6AAsBCwHpABsBTQE=', Int16Array),
+        "ttk20": decodeColumn('6ADGAPcABQEFAQUBFAEUARABGAElATQBMQH3ACEBVgElAVMBYwFeAWYBdgEqATUBQQEbAYsBcAFWAaMBvAE=', Int16Array),
+        "ttk35": decodeColumn('ZAEwAVUBjwFoAY8BegF6AX4BegE5AaUBowFVAZEB0gF7AcEB5gG2AdYB/QGFAakBogE0AQECzQG7ASACIwI=', Int16Array),
+        "ttk75": decodeColumn('owFuAZEBxgGfAcYBrQGtASYCJQJtAdYB3wGRATECBAKwAWwCIgL5AYECLALEAewB4gF3AagCFAL6AXICWgI=', Int16Array),
+        "burstHits": decodeColumn('4Xo0QBSu5z9cj2JAAABAQOxRaEDsUShAexRuQOxRaEA9CldA16OIQFyPYkDsUWhAXI9iQK5HEUAAAEBAAACAQFyPYkA9CpdAAACAQD0Kt0A9CpdAAACAQAAAQEBcjyJArkdRQI/CBUAAAKBAMzOjQNejUEA9CpdAAADAQA==', Float32Array),
+        "burstAccuracy": decodeColumn('16NwP5qZGT8K12M/AACAP8P1aD+uR2E/exRuP8P1aD89Clc/mplZPwrXYz/D9Wg/CtdjP4XrET8AAEA/AACAP4/CNT/Xo3A/AACAPzMzcz/Xo3A/AACAP5qZGT8K1yM/ZmYmP7geBT8AAIA/mplZP2ZmJj/Xo3A/AACAPw==', Float32Array),
+        "cqbAccuracy": decodeColumn('7FF4PxSuRz8zM3M/AACAP4/CdT/Xo3A/7FF4P4/CdT8fhWs/exRuPzMzcz+PwnU/MzNzPwAAQD+uR2E/AACAP5qZWT/sUXg/AACAP0jhej/sUXg/AACAPxSuRz/NzEw/hetRP+xROD8AAIA/exRuPylcTz/sUXg/AACAPw==', Float32Array),
+        "longRangeAccuracy": decodeColumn('w/VoP9ej8D7helQ/AACAP/YoXD+F61E/ZmZmP/YoXD+4HkU/cT1KP+F6VD/2KFw/4XpUP/Yo3D5mZiY/AACAP5qZGT8fhWs/AACAP3sUbj8fhWs/AACAPx+F6z5cjwI/FK4HP1yPwj4AAIA/FK5HPxSuBz8fhWs/AACAPw==', Float32Array),
+        "power20": decodeColumn('7gD9AAUBBQERARUBHQEgASYBLAE1AUIBQgFHAUoBVgFZAVwBYwFmAW8BdgF/AYABigGLAYsBjAGkAa4BvAE=', Int16Array),
+        "power21": decodeColumn('bQGFAWkBjwF4AacBhwGLAZ0BlgFKAbcBuwHFAcoB0gG+AcwB5gHAAeIB/QH0ARICAAKuAQEC8AEhAi4CIwI=', Int16Array),
+        "power35": decodeColumn('egH4AYIBjwGNAccBlwGhAcYBuwFhAdAB2gFaAhYC0gEYAtsB5gHMAfIB/QGIAp4CfgJOAgECHwKoAkACIwI=', Int16Array),
+        "power75": decodeColumn('zAEMA+IBxgHhASoC3wHxAcsCtwK3ASACPwKqA2ADBALVAqQCIgIfAroCLALNA8wDjwPhA6gCpgLAA6sCWgI=', Int16Array),
+        "lethality": decodeColumn('AAAAAItspz4X2Y4+y6GFPrx0kz51k5g+UI2XPuOlmz5CYKU+nu+nPtV4qT5oka0+16OwPlK43j64HsU+oBqvPs/30z7Zzrc+j8K1Pm3nuz5KDMI+AAAAAMl2/j7+1Pg+WmT7PoPACj9xPco+LbLdPmZmBj/4U+M++FPjPg==', Float32Array),
+        "balanced": decodeColumn('GSkqsz/qYz8TRZO3mt9hPwc0fojtf2g/ewi3AgYiYD+fwotnewVmP+Q38GDXZFw/dB9WhN/fYz9QRVTcdHJjPwrhhPUyPWQ/r6sGoqnbaj+EORya4MtgP90jxxQWvV4/FEQi22FEXz9V1RGStGFfPxWXGJobnV4/u0LEg/o1Wz9owwz+pt1hP0ptTvGK2mI/5nypi6mFWT9h6NRUlA5lPwxnKqyAlWA/HrAhRF2EVj9iVjOparBdP0Cjng9zMVY/NDmCKU6JWz/+yi9J7qxVPwoP1ER7/1s/dssJlpEHYT9itQ+GIAJYPzc5lqMhV1c/TNw09ZKRWj8=', Float64Array),
+    },
+    order: {
+        "weapon": decodeColumn('HgUHBBgQFQkGCwMCAAoZFw0WDBQTHBIIDhEaDwEdGw==', Uint8Array),
+        "weaponClass": decodeColumn('AQUHCwwNDxAOFhcYGRweAAIDBAYKEhUICRETFBobHQ==', Uint8Array),
+        "rpm": decodeColumn('AwUVEg8ACx0MFwoaAQYHDhkeBBQcCAINERgQFhsTCQ==', Uint8Array),
+        "velocity": decodeColumn('CREIFB0aDhsZExcYABYcAQINEgwDBAUeChAGBw8LFQ==', Uint8Array),
+        "ttk0": decodeColumn('CAEJDgwXABYCDRESGAMEBRQcBgcZChAaGwsdDxMeFQ==', Uint8Array),
+        "ttk20": decodeColumn('AQACDQMEBQgGBwkZDgoQFgwLFxgRDxwTEhQbFRodHg==', Uint8Array),
+        "ttk35": decodeColumn('ARkKAg0ABAYHCRAIFgMFDhgMCxcTHBEbDxQSFRodHg==', Uint8Array),
+        "ttk75": decodeColumn('CgEZAg0EAAYHEBYDBQsMGBcTHA8bEgkIFQ4eER0UGg==', Uint8Array),
+        "power20": decodeColumn('AAECAwQFBgcICQoLDA0ODxAREhMUFRYXGBkaGxwdHg==', Uint8Array),
+        "burstAccuracy": decodeColumn('GQ0BFhcYHBAOCAkbBQIKDAQHCwYAERQdEwMPEhUaHg==', Uint8Array),
+        "lethality": decodeColumn('ABUDAgQGBQcIAQkKCw8MEhETFA4aEBsNHR4XGBYcGQ==', Uint8Array),
+        "balanced": decodeColumn('GRcVHRwSHg8YGgUWDgsMDQMUChsQAREHBgAIEwQCCQ==', Uint8Array),
+    }
+};
@@ -0,0 +1,314 @@
+"""Head-to-head duel simulator: who wins between any two weapons, at any distance.
+
+Two players spot each other at distance ``d`` and open fire.  Each player's
+time to the killing hit is
+
+    reaction + d / velocity * 1000 + (shots - 1) * fire_interval
+
+where ``shots`` is the number of shots until ``BTK(d)`` of them have hit,
+with every shot hitting independently with probability
+``Burst Accuracy Coefficient``.  Misses before the last hit are negative
+binomial, so each weapon's kill time has an exact lattice distribution.
+The distributions are put on a ``time_step`` grid, and kills that land in
+the same grid step count as half a win each.
+
+Both players draw their reaction time from the same sampled distribution.
+Only its difference matters, so the histogram of the samples is correlated
+with itself once.  Every weapon's kill-time distribution is then convolved
+with that difference in one batched FFT.  The probability that weapon i
+beats weapon j is a dot product:
+
+    W[i, j] = sum_t X_i(t) * (P(T_j > t) + P(T_j = t) / 2)
+
+where X_i is the convolved distribution of weapon i, and a kill before
+any opponent's earliest one always wins.  A whole distance is therefore
+one matrix product.  It is tiled over blocks of rows, and
+``W[j, i] = 1 - W[i, j]`` fills the lower triangle, so only half of the
+products are computed.
+
+The matrix is stored distance-major as (distances, weapons, weapons).  It
+can be a ``.npy`` memory map, and is memory-mapped to a temporary file when
+it is too big to hold in memory, so each distance's tiles go to contiguous
+storage and the whole matrix never has to fit in RAM.
+``DuelMatrix.probabilities`` is a (weapons, weapons, distances) view of
+the same storage.  Each weapon's expected wins are summed while the tiles
+are written.  They are all the Bradley-Terry ratings need, because every
+pair meets once per distance.
+"""
+import argparse
+import sys
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from ttk_engine import btk_at, weapon_primitives
+
+DISTANCES = np.arange(0, 151, 5, dtype=np.float64)
+# Width of a kill-time grid step, ms
+TIME_STEP = 1.0
+# Lognormal reaction-time distribution both players draw from
+REACTION_MEDIAN = 250.0
+REACTION_SIGMA = 0.25
+REACTION_SAMPLES = 100_000
+# Probability of needing more misses than the distribution keeps (the rest
+# is renormalised), and a hard cap for very inaccurate weapons
+TAIL = 1e-7
+MAX_MISSES = 512
+# Rows of the win matrix computed per matrix product
+ROW_BLOCK = 1024
+# Largest matrix, in bytes, kept in memory when no ``out`` is given; bigger
+# ones are memory-mapped to a temporary file
+IN_MEMORY_BYTES = 1 << 30
+# Bradley-Terry fit: pseudo-games against an average opponent (keeps
+# weapons that never win finite), iteration limit and tolerance
+BT_PRIOR = 1.0
+BT_ITERATIONS = 1000
+BT_TOL = 1e-6
+# Floats per (rows x weapons) block of the Bradley-Terry update
+BT_BUDGET = 8_000_000
+ELO_BASE = 1500.0
+
+
+def sample_reactions(n=REACTION_SAMPLES, median=REACTION_MEDIAN, sigma=REACTION_SIGMA, seed=0):
+    """``n`` seeded reaction times in ms, lognormally distributed."""
+    return np.random.default_rng(seed).lognormal(np.log(median), sigma, n)
+
+
+def reaction_difference(samples, time_step=TIME_STEP):
+    """Distribution of the difference of two independent reaction times.
+
+    Returns ``(pmf, centre)`` on the ``time_step`` grid, where ``pmf[centre]``
+    is the probability that both players react in the same step.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    bins = np.rint((samples - samples.min()) / time_step).astype(np.intp)
+    pmf = np.bincount(bins) / len(bins)
+    return np.convolve(pmf, pmf[::-1]), len(pmf) - 1
+
+
+def kill_time_pmfs(btk, fire_interval, travel, accuracy, time_step=TIME_STEP):
+    """Distribution of every weapon's time to the killing hit, without reaction.
+
+    Inputs are per weapon for one distance.  Returns an (n_weapons, steps)
+    float64 array whose column t is the probability of the kill landing in
+    grid step t.
+    """
+    hits = btk[:, None]
+    miss = 1 - accuracy
+    # Negative binomial probabilities of 0, 1, 2, ... misses before the last hit
+    columns = [accuracy ** btk]
+    kept = columns[0].copy()
+    while (kept < 1 - TAIL).any() and len(columns) <= MAX_MISSES:
+        m = len(columns)
+        columns.append(columns[-1] * (btk + m - 1) / m * miss)
+        kept += columns[-1]
+    pmf = np.stack(columns, axis=1) / kept[:, None]
+
+    times = travel[:, None] + (hits - 1 + np.arange(len(columns))) * fire_interval[:, None]
+    steps = np.rint(times / time_step).astype(np.intp)
+    n, width = len(btk), int(steps.max()) + 1
+    flat = (np.arange(n)[:, None] * width + steps).ravel()
+    return np.bincount(flat, weights=pmf.ravel(), minlength=n * width).reshape(n, width)
+
+
+def _duel_operands(pmf, difference, centre):
+    """Operands of one distance's win-probability product.
+
+    ``rows`` are the kill-time distributions convolved with the reaction
+    difference (an FFT per block of weapons).  ``early`` is each row's
+    probability of a kill before step 0, which beats any opponent.
+    ``columns`` are P(T > t) + P(T = t) / 2.  Steps past the slowest kill
+    beat nobody and are dropped, so
+    ``W = rows @ columns.T + early[:, None]``.
+    """
+    n, width = pmf.shape
+    span = width + len(difference) - 1
+    size = 1 << (span - 1).bit_length()
+    kernel = np.fft.rfft(difference, size)
+    rows = np.empty((n, width), dtype=np.float32)
+    early = np.empty(n)
+    for lo in range(0, n, ROW_BLOCK):
+        convolved = np.fft.irfft(np.fft.rfft(pmf[lo:lo + ROW_BLOCK], size, axis=1) * kernel,
+                                 size, axis=1)
+        np.maximum(convolved, 0, out=convolved)
+        early[lo:lo + ROW_BLOCK] = convolved[:, :centre].sum(axis=1)
+        rows[lo:lo + ROW_BLOCK] = convolved[:, centre:centre + width]
+
+    survival = np.clip(1.0 - np.cumsum(pmf, axis=1), 0, None)
+    return rows, early, (survival + pmf / 2).astype(np.float32)
+
+
+@dataclass
+class DuelMatrix:
+    """Win probabilities of every weapon pair at every distance.
+
+    ``probabilities[i, j, k]`` is the chance that weapon ``i`` beats weapon
+    ``j`` at ``distances[k]``.  It is a view of distance-major storage.
+    ``wins[i, k]`` is weapon ``i``'s expected number of wins against every
+    other weapon at that distance.
+    """
+    probabilities: np.ndarray
+    wins: np.ndarray
+    distances: np.ndarray
+    weapons: np.ndarray
+    classes: np.ndarray
+
+    def _position(self, weapon):
+        matches = np.flatnonzero(self.weapons == weapon)
+        if not len(matches):
+            raise KeyError(f"no duel data for weapon {weapon!r}")
+        return matches[0]
+
+    def _distance(self, distance):
+        matches = np.flatnonzero(self.distances == distance)
+        if not len(matches):
+            raise KeyError(f"distance {distance!r} is not in the matrix")
+        return matches[0]
+
+    def win_probability(self, weapon, opponent, distance=None):
+        """Chance that ``weapon`` beats ``opponent``, at one distance or all of them."""
+        row = self.probabilities[self._position(weapon), self._position(opponent)]
+        return row if distance is None else float(row[self._distance(distance)])
+
+    def ratings(self, distance=None):
+        """Bradley-Terry ratings on the Elo scale, best first.
+
+        ``distance=None`` rates the duels at every distance together.
+        """
+        if distance is None:
+            wins, games = self.wins.sum(axis=1), len(self.distances)
+        else:
+            wins, games = self.wins[:, self._distance(distance)], 1
+        strength = bradley_terry(wins, games)
+        table = pd.DataFrame({'Weapon': self.weapons, 'Weapon Class': self.classes,
+                              'Elo': elo(strength),
+                              'Win Rate': wins / (games * max(len(self.weapons) - 1, 1))})
+        return table.sort_values('Elo', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def duel_matrix(df, distances=DISTANCES, reactions=None, time_step=TIME_STEP, out=None,
+                dtype=np.float32):
+    """DuelMatrix of the weapons in ``df``.
+
+    ``reactions`` are reaction-time samples in ms (``sample_reactions()`` by
+    default; pass ``[0]`` for none).  ``out`` is an array or ``.npy`` path of
+    shape (distances, weapons, weapons) to fill.  A path becomes a memory
+    map.  Weapons missing BTK, fire rate, velocity or accuracy are left out.
+
+    The matrix takes distances x weapons x weapons x ``dtype`` bytes: 31
+    distances of 5,000 weapons are 3.1 GB in float32.  Without ``out`` it is
+    held in memory up to IN_MEMORY_BYTES and memory-mapped to an unnamed
+    temporary file (in ``tempfile.gettempdir()``) beyond that; the file is
+    removed once the matrix is no longer referenced.
+    """
+    distances = np.atleast_1d(np.asarray(distances, dtype=np.float64))
+    btk, fire_interval, velocity = weapon_primitives(df)
+    accuracy = df['Burst Accuracy Coefficient'].to_numpy(dtype=np.float64, na_value=np.nan)
+    usable = (np.isfinite(btk).all(axis=1) & (btk >= 1).all(axis=1) & np.isfinite(fire_interval)
+              & (velocity > 0) & (accuracy > 0) & (accuracy <= 1))
+    btk, fire_interval, velocity, accuracy = (btk[usable], fire_interval[usable],
+                                              velocity[usable], accuracy[usable])
+    n = len(btk)
+
+    shape = (len(distances), n, n)
+    if out is None and np.prod(shape) * np.dtype(dtype).itemsize > IN_MEMORY_BYTES:
+        storage = np.memmap(tempfile.TemporaryFile(), dtype=dtype, mode='w+', shape=shape)
+    elif out is None:
+        storage = np.empty(shape, dtype=dtype)
+    elif isinstance(out, str):
+        storage = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+    else:
+        storage = out
+        if storage.shape != shape:
+            raise ValueError(f"out must have shape {shape}, got {storage.shape}")
+
+    if reactions is None:
+        reactions = sample_reactions()
+    difference, centre = reaction_difference(reactions, time_step)
+    btk_grid = btk_at(btk, distances)
+    wins = np.zeros((n, len(distances)))
+    for k, distance in enumerate(distances):
+        pmf = kill_time_pmfs(btk_grid[:, k], fire_interval, distance * 1000.0 / velocity,
+                             accuracy, time_step)
+        rows, early, columns = _duel_operands(pmf, difference, centre)
+        for lo in range(0, n, ROW_BLOCK):
+            hi = min(lo + ROW_BLOCK, n)
+            block = rows[lo:hi] @ columns[lo:].T
+            block += early[lo:hi, None].astype(np.float32)
+            np.clip(block, 0, 1, out=block)
+            block[:, :hi - lo][np.diag_indices(hi - lo)] = 0.5
+            storage[k, lo:hi, lo:] = block
+            storage[k, hi:, lo:hi] = 1 - block[:, hi - lo:].T
+            wins[lo:hi, k] += block.sum(axis=1, dtype=np.float64) - 0.5
+            wins[hi:, k] += (1 - block[:, hi - lo:]).sum(axis=0, dtype=np.float64)
+    if isinstance(storage, np.memmap):
+        storage.flush()
+
+    return DuelMatrix(probabilities=np.moveaxis(storage, 0, -1), wins=wins, distances=distances,
+                      weapons=df['Weapon'].to_numpy(dtype=object)[usable],
+                      classes=df['Weapon Class'].astype(object).to_numpy()[usable])
+
+
+def bradley_terry(wins, games=1, prior=BT_PRIOR, iterations=BT_ITERATIONS, tol=BT_TOL):
+    """Bradley-Terry strengths from each player's expected wins in a round robin.
+
+    Every pair meets ``games`` times.  With that design the likelihood only
+    depends on each player's total wins, so no matrix is needed.  The
+    minorise-maximise update is used, with ``prior`` extra games split
+    evenly against an opponent of strength 1.  Strengths are normalised to
+    a geometric mean of 1.
+    """
+    wins = np.asarray(wins, dtype=np.float64)
+    n = len(wins)
+    strength = np.ones(n)
+    block = max(1, BT_BUDGET // max(n, 1))
+    for _ in range(iterations):
+        denominator = prior / (strength + 1)
+        for lo in range(0, n, block):
+            pair = 1 / (strength[lo:lo + block, None] + strength[None, :])
+            denominator[lo:lo + block] += games * (pair.sum(axis=1) - pair[
+                np.arange(len(pair)), np.arange(lo, lo + len(pair))])
+        updated = (wins + prior / 2) / denominator
+        updated /= np.exp(np.log(updated).mean())
+        converged = np.max(np.abs(np.log(updated / strength))) < tol
+        strength = updated
+        if converged:
+            break
+    return strength
+
+
+def elo(strength, base=ELO_BASE):
+    """Bradley-Terry strengths on the Elo scale (400 points = 10:1 odds)."""
+    return base + 400 * np.log10(strength)
+
+
+def main(argv=None):
+    from weapon_data import DATA_FILE, load_weapons
+
+    parser = argparse.ArgumentParser(description="Head-to-head win probabilities of every weapon pair.")
+    parser.add_argument('--data', default=DATA_FILE, help="weapon CSV (default: %(default)s)")
+    parser.add_argument('--distances', type=float, nargs='+', default=list(DISTANCES),
+                        help="distances in metres (default: 0 to 150 every 5)")
+    parser.add_argument('--time-step', type=float, default=TIME_STEP,
+                        help="kill-time grid step in ms (default: %(default)s)")
+    parser.add_argument('--no-reaction', action='store_true', help="both players react instantly")
+    parser.add_argument('--output', metavar='PATH',
+                        help="save the (distances, weapons, weapons) matrix as .npy; without "
+                             "it, matrices over 1 GiB go to a temporary file")
+    parser.add_argument('--top', type=int, default=15, help="ratings to print (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    matrix = duel_matrix(load_weapons(args.data), args.distances,
+                         reactions=[0.0] if args.no_reaction else None,
+                         time_step=args.time_step, out=args.output)
+    print(f"Duel ratings over {len(matrix.distances)} distances "
+          f"({matrix.distances[0]:g}-{matrix.distances[-1]:g} m):\n")
+    print(matrix.ratings().head(args.top).to_string(
+        index=False, formatters={'Elo': '{:.0f}'.format, 'Win Rate': '{:.1%}'.format}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
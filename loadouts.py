@@ -0,0 +1,443 @@
+"""Loadout optimizer: Pareto search over weapon x attachment configurations.
+
+A loadout is a weapon plus one option from every attachment slot.
+Attachments scale RPM, muzzle velocity and recoil (spread and climb), and
+move the damage drop-off breakpoints by some metres.  Configurations are
+numbered in mixed radix (weapon, slot 1, slot 2, ...), so any range of
+configuration ids decodes to weapons and options with one
+``np.unravel_index``.  Nothing proportional to the whole search space is
+ever held in memory.
+
+``optimize`` streams the space in chunks.  Each chunk's TTK grid comes from
+the TTK engine with per-row breakpoints.  Its burst accuracy is
+interpolated from a per-weapon table of the analytic hit fraction over
+recoil scales.  The chunk is then reduced to its non-dominated set.
+Chunk fronts are merged into a running frontier, so memory is bounded by
+the chunk size plus the size of the frontier.
+
+DEFAULT_CATALOGUE is illustrative: its deltas are plausible placeholders,
+not measured values.  Pass a measured catalogue (see ``load_catalogue``)
+for real recommendations.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from burst_sim import REFERENCE_DISTANCE, RecoilModel, calibrate, expected_accuracy
+from ttk_engine import BTK_DISTANCES, ttk_at, ttk_column, weapon_primitives
+
+# Configurations evaluated per task; tasks are the unit of parallelism
+CHUNK_SIZE = 1_000_000
+# Points compared per dominance block in the k-objective front (bounds the
+# (frontier x block x objectives) comparison arrays to ~this many bytes)
+DOMINANCE_BUDGET = 16_000_000
+BLOCK_SIZE = 16384
+# Largest set of block survivors checked against each other in one step
+SELF_BLOCK_SIZE = 1024
+# Longest combined factor table of a group of consecutive slots
+GROUP_TABLE_LIMIT = 100_000
+# Recoil scales tabulated per weapon for the accuracy interpolation
+ACCURACY_GRID = 129
+
+METRICS = {'rpm': 'max', 'velocity': 'max', 'accuracy': 'max'}  # plus 'ttk_<metres>': 'min'
+
+
+@dataclass(frozen=True)
+class Attachment:
+    """One option of a slot; factors multiply, ``range`` adds (metres)."""
+    name: str
+    rpm: float = 1.0
+    velocity: float = 1.0
+    recoil: float = 1.0
+    range: float = 0.0
+
+
+DEFAULT_CATALOGUE = {
+    'Barrel': [
+        Attachment('Standard Barrel'),
+        Attachment('Extended Barrel', velocity=1.15, recoil=1.05, range=5.0),
+        Attachment('Heavy Barrel', velocity=1.08, recoil=0.92, rpm=0.97),
+        Attachment('Short Barrel', velocity=0.88, recoil=1.06, range=-3.0),
+        Attachment('Fluted Barrel', velocity=1.04, recoil=0.97),
+        Attachment('Carbine Barrel', velocity=0.94, recoil=0.95, range=-2.0),
+    ],
+    'Muzzle': [
+        Attachment('No Muzzle'),
+        Attachment('Compensator', recoil=0.85),
+        Attachment('Flash Hider', recoil=0.95),
+        Attachment('Suppressor', velocity=0.93, recoil=0.92, range=-3.0),
+        Attachment('Muzzle Brake', recoil=0.88, velocity=0.98),
+        Attachment('Long Suppressor', velocity=0.97, recoil=0.9, range=-1.0),
+    ],
+    'Underbarrel': [
+        Attachment('No Grip'),
+        Attachment('Vertical Grip', recoil=0.9),
+        Attachment('Angled Grip', recoil=0.95),
+        Attachment('Stubby Grip', recoil=0.93),
+        Attachment('Bipod', recoil=0.97),
+    ],
+    'Ammunition': [
+        Attachment('Standard Rounds'),
+        Attachment('High Velocity Rounds', velocity=1.2, range=-2.0),
+        Attachment('Match Grade Rounds', recoil=0.96, velocity=1.05),
+        Attachment('Heavy Rounds', velocity=0.9, range=6.0, recoil=1.05),
+    ],
+    'Trigger': [
+        Attachment('Standard Trigger'),
+        Attachment('Rapid Fire Trigger', rpm=1.08, recoil=1.08),
+        Attachment('Match Trigger', rpm=0.95, recoil=0.94),
+    ],
+}
+
+
+def load_catalogue(path):
+    """Read a catalogue from JSON: ``{slot: [{"name": ..., "rpm": ...}, ...]}``.
+
+    Omitted fields default to no change.  The first option of each slot is
+    the one a stock weapon has fitted.
+    """
+    with open(path) as f:
+        raw = json.load(f)
+    return {slot: [Attachment(**option) for option in options] for slot, options in raw.items()}
+
+
+@dataclass
+class LoadoutSpace:
+    """Every weapon x attachment configuration, addressed by integer id.
+
+    Runs of consecutive slots are merged into groups whose combined
+    factors are tabulated over every option combination.  Evaluating a
+    configuration then costs one lookup per group rather than per slot,
+    and the mixed-radix ids are the same either way.
+    """
+    btk: np.ndarray
+    rpm: np.ndarray
+    velocity: np.ndarray
+    slots: list
+    options: list
+    groups: list  # per group: {'size': n, 'rpm', 'velocity', 'recoil', 'range': arrays}
+    recoil_grid: np.ndarray
+    accuracy_table: np.ndarray  # (n_weapons, len(recoil_grid))
+
+    @property
+    def radix(self):
+        return (len(self.btk),) + tuple(len(opts) for opts in self.options)
+
+    @property
+    def size(self):
+        return int(np.prod(self.radix, dtype=np.int64))
+
+    def decode(self, ids):
+        """(weapon index, (n, n_slots) option numbers) of configuration ``ids``."""
+        digits = np.unravel_index(np.asarray(ids, dtype=np.int64), self.radix)
+        return digits[0], np.stack(digits[1:], axis=1)
+
+    def evaluate(self, ids, ttk_distances=()):
+        """Derived metrics of configurations ``ids`` as a dict of arrays."""
+        digits = np.unravel_index(np.asarray(ids, dtype=np.int64),
+                                  (len(self.btk),) + tuple(g['size'] for g in self.groups))
+        weapon = digits[0]
+        rpm = self.rpm[weapon]
+        velocity = self.velocity[weapon]
+        recoil = np.ones(len(weapon))
+        shift = np.zeros(len(weapon))
+        for group, choice in zip(self.groups, digits[1:]):
+            rpm *= group['rpm'][choice]
+            velocity *= group['velocity'][choice]
+            recoil *= group['recoil'][choice]
+            shift += group['range'][choice]
+
+        metrics = {'rpm': rpm, 'velocity': velocity, 'recoil': recoil, 'range': shift,
+                   'accuracy': self._accuracy(weapon, recoil)}
+        if len(ttk_distances):
+            # Drop-off breakpoints move with the range shift; 0 m stays put
+            breakpoints = np.empty((len(weapon), len(BTK_DISTANCES)))
+            breakpoints[:, 0] = BTK_DISTANCES[0]
+            np.maximum(BTK_DISTANCES[1:] + shift[:, None], 0.0, out=breakpoints[:, 1:])
+            grid = ttk_at(self.btk[weapon], 60000.0 / rpm, velocity, ttk_distances,
+                          breakpoints, dtype=np.float64)
+            for j, dist in enumerate(ttk_distances):
+                metrics[f'ttk_{dist:g}'] = grid[:, j]
+        return metrics
+
+    def _accuracy(self, weapon, recoil):
+        """Linear interpolation of the accuracy table in log recoil."""
+        log_grid = np.log(self.recoil_grid)
+        if len(log_grid) == 1:
+            return self.accuracy_table[weapon, 0]
+        pos = (np.log(recoil) - log_grid[0]) / (log_grid[1] - log_grid[0])
+        lo = np.clip(pos.astype(np.intp), 0, len(log_grid) - 2)
+        frac = np.clip(pos - lo, 0.0, 1.0)
+        table = self.accuracy_table
+        return table[weapon, lo] * (1 - frac) + table[weapon, lo + 1] * frac
+
+
+def _slot_groups(options, limit=GROUP_TABLE_LIMIT):
+    """Combined factor tables of consecutive slots, each at most ``limit`` long."""
+    runs, sizes = [], []
+    for opts in options:
+        if runs and sizes[-1] * len(opts) <= limit:
+            runs[-1].append(opts)
+            sizes[-1] *= len(opts)
+        else:
+            runs.append([opts])
+            sizes.append(len(opts))
+    groups = []
+    for run, size in zip(runs, sizes):
+        group = {'size': size}
+        for field, combine in [('rpm', np.multiply), ('velocity', np.multiply),
+                               ('recoil', np.multiply), ('range', np.add)]:
+            table = np.array([getattr(opt, field) for opt in run[0]], dtype=np.float64)
+            for opts in run[1:]:
+                values = np.array([getattr(opt, field) for opt in opts], dtype=np.float64)
+                # Row-major outer product keeps mixed-radix order within the group
+                table = combine.outer(table, values).ravel()
+            group[field] = table
+        groups.append(group)
+    return groups
+
+
+def build_space(df, catalogue=None, model=None):
+    """LoadoutSpace of the weapons in ``df`` and ``catalogue``.
+
+    ``model`` is the weapons' RecoilModel; one is calibrated from ``df``
+    when not given.
+    """
+    if catalogue is None:
+        catalogue = DEFAULT_CATALOGUE
+    if model is None:
+        model = calibrate(df)
+    btk, fire_interval, velocity = weapon_primitives(df)
+    slots = list(catalogue)
+    options = [list(catalogue[slot]) for slot in slots]
+
+    recoil = [np.array([opt.recoil for opt in opts]) for opts in options]
+    low = np.prod([f.min() for f in recoil])
+    high = np.prod([f.max() for f in recoil])
+    grid = np.geomspace(low, high, ACCURACY_GRID) if high > low else np.array([low])
+    # Weapons down the rows, recoil scales across the columns
+    column_model = RecoilModel(spread=np.asarray(model.spread)[:, None],
+                               bloom=np.asarray(model.bloom)[:, None],
+                               climb=np.asarray(model.climb)[:, None],
+                               burst_length=np.asarray(model.burst_length)[:, None])
+    table = expected_accuracy(column_model, grid[None, :], REFERENCE_DISTANCE)
+
+    return LoadoutSpace(btk=btk, rpm=60000.0 / fire_interval, velocity=velocity, slots=slots,
+                        options=options, groups=_slot_groups(options), recoil_grid=grid,
+                        accuracy_table=table)
+
+
+def parse_objectives(objectives):
+    """``['ttk_20', 'accuracy']`` -> [(metric, sense)], with senses 'min'/'max'.
+
+    An entry may also be a ``(metric, sense)`` pair to override the default
+    sense.
+    """
+    parsed = []
+    for entry in objectives:
+        metric, sense = entry if isinstance(entry, tuple) else (entry, None)
+        if metric.startswith('ttk_'):
+            metric = f'ttk_{float(metric[4:]):g}'
+            default = 'min'
+        elif metric in METRICS:
+            default = METRICS[metric]
+        else:
+            raise ValueError(f"unknown objective {metric!r}; use ttk_<metres> or one of {list(METRICS)}")
+        sense = sense or default
+        if sense not in ('min', 'max'):
+            raise ValueError(f"objective sense must be 'min' or 'max', got {sense!r}")
+        parsed.append((metric, sense))
+    if not parsed:
+        raise ValueError("at least one objective is required")
+    return parsed
+
+
+def _front_2d(points):
+    """Non-dominated rows of an (n, 2) minimisation problem, by a sweep."""
+    order = np.lexsort((points[:, 1], points[:, 0]))
+    x, y = points[order, 0], points[order, 1]
+    best = np.minimum.accumulate(y)
+    # Best y among points with a strictly smaller x
+    group_start = np.flatnonzero(np.r_[True, x[1:] != x[:-1]])
+    starts = np.repeat(group_start, np.diff(np.r_[group_start, len(x)]))
+    before = np.where(starts > 0, best[np.maximum(starts - 1, 0)], np.inf)
+    # Within an equal-x group the first point has the smallest y
+    keep = (before > y) & (y[starts] >= y)
+    return np.sort(order[keep])
+
+
+def _dominated_by(candidates, block):
+    """Mask of the ``block`` rows dominated by any of ``candidates``."""
+    # One (candidates, block) plane per objective; reducing over a short
+    # trailing objectives axis instead is several times slower
+    le = candidates[:, None, 0] <= block[None, :, 0]
+    lt = candidates[:, None, 0] < block[None, :, 0]
+    for j in range(1, block.shape[1]):
+        a, b = candidates[:, None, j], block[None, :, j]
+        le &= a <= b
+        lt |= a < b
+    return (le & lt).any(axis=0)
+
+
+def _sweep(ordered, block_size, budget):
+    """Positions of the non-dominated rows of lexicographically sorted points."""
+    n, k = ordered.shape
+    frontier = np.empty((0, k))
+    kept = []
+    for lo in range(0, n, block_size):
+        block = ordered[lo:lo + block_size]
+        alive = np.ones(len(block), dtype=bool)
+        step = max(1, budget // (len(block) * k))
+        for start in range(0, len(frontier), step):
+            idx = np.flatnonzero(alive)
+            if not len(idx):
+                break
+            alive[idx[_dominated_by(frontier[start:start + step], block[idx])]] = False
+
+        idx = np.flatnonzero(alive)
+        if len(idx) <= SELF_BLOCK_SIZE:
+            alive[idx[_dominated_by(block[idx], block[idx])]] = False
+        else:
+            survivors = _sweep(block[idx], SELF_BLOCK_SIZE, budget)
+            alive[:] = False
+            alive[idx[survivors]] = True
+        kept.append(lo + np.flatnonzero(alive))
+        frontier = np.concatenate([frontier, block[alive]])
+    return np.concatenate(kept) if kept else np.empty(0, dtype=np.intp)
+
+
+def _front_kd(points, block_size=BLOCK_SIZE, budget=DOMINANCE_BUDGET):
+    """Non-dominated rows of an (n, k) minimisation problem.
+
+    After a vectorized pass against a few pivot points, the remaining
+    points are visited in lexicographic order.  A point can only be
+    dominated by one before it in that order.  Each block is checked
+    against the frontier found so far, a slice at a time, which usually
+    eliminates most of it.  The survivors are then checked against each
+    other, in smaller blocks if there are many; dominance is transitive,
+    so this is enough.  Survivors can never be dominated later, so they
+    join the frontier for good.
+    """
+    # Cheap first pass: the best point on each objective and on the sum of
+    # the range-normalised objectives usually dominate most of the rest
+    span = np.ptp(points, axis=0)
+    scaled_sum = ((points - points.min(axis=0)) / np.where(span > 0, span, 1)).sum(axis=1)
+    pivots = points[np.r_[points.argmin(axis=0), scaled_sum.argmin()]]
+    step = max(1, budget // (len(pivots) * points.shape[1]))
+    candidates = np.concatenate([lo + np.flatnonzero(~_dominated_by(pivots, points[lo:lo + step]))
+                                 for lo in range(0, len(points), step)])
+
+    order = candidates[np.lexsort(points[candidates].T[::-1])]
+    return np.sort(order[_sweep(points[order], block_size, budget)])
+
+
+def pareto_front(points):
+    """Indices of the non-dominated rows of ``points`` (every column minimised).
+
+    Exact duplicates do not dominate each other and are all kept.  Rows
+    with NaN objectives are never part of the front.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if points.ndim == 1:
+        points = points[:, None]
+    valid = np.flatnonzero(~np.isnan(points).any(axis=1))
+    points = points[valid]
+    if not len(points):
+        return valid
+    if points.shape[1] == 1:
+        front = np.flatnonzero(points[:, 0] == points[:, 0].min())
+    elif points.shape[1] == 2:
+        front = _front_2d(points)
+    else:
+        front = _front_kd(points)
+    return valid[front]
+
+
+def _objective_matrix(metrics, objectives):
+    """Objective values as an (n, k) minimisation matrix."""
+    return np.column_stack([metrics[m] if sense == 'min' else -metrics[m]
+                            for m, sense in objectives])
+
+
+def _ttk_distances(objectives):
+    return [float(m[4:]) for m, _ in objectives if m.startswith('ttk_')]
+
+
+def _chunk_front(space, objectives, start, stop):
+    """Configuration ids and objective values of one chunk's front."""
+    ids = np.arange(start, stop, dtype=np.int64)
+    values = _objective_matrix(space.evaluate(ids, _ttk_distances(objectives)), objectives)
+    front = pareto_front(values)
+    return ids[front], values[front]
+
+
+def optimize(df, objectives=('ttk_20', 'accuracy'), catalogue=None, model=None,
+             chunk_size=CHUNK_SIZE, workers=None, space=None):
+    """Pareto-optimal loadouts of the weapons in ``df``.
+
+    ``objectives`` are metric names (see ``parse_objectives``).  The space
+    is streamed in chunks of ``chunk_size`` configurations; chunks run in a
+    process pool and ``workers=1`` runs them in-process.  Returns one row
+    per frontier loadout, best first objective first.
+    """
+    objectives = parse_objectives(objectives)
+    if space is None:
+        space = build_space(df, catalogue, model)
+    bounds = [(lo, min(lo + chunk_size, space.size)) for lo in range(0, space.size, chunk_size)]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(bounds))
+    if workers <= 1:
+        fronts = (_chunk_front(space, objectives, lo, hi) for lo, hi in bounds)
+        ids, values = _merge_fronts(fronts)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fronts = pool.map(_chunk_front, *zip(*[(space, objectives, lo, hi)
+                                                    for lo, hi in bounds]))
+            ids, values = _merge_fronts(fronts)
+
+    order = np.lexsort(values.T[::-1])
+    return loadout_table(df, space, ids[order], _ttk_distances(objectives))
+
+
+def _merge_fronts(fronts):
+    ids = np.empty(0, dtype=np.int64)
+    values = None
+    for chunk_ids, chunk_values in fronts:
+        ids = np.concatenate([ids, chunk_ids])
+        values = chunk_values if values is None else np.concatenate([values, chunk_values])
+        keep = pareto_front(values)
+        ids, values = ids[keep], values[keep]
+    return ids, values
+
+
+def loadout_table(df, space, ids, ttk_distances=()):
+    """Describe configurations ``ids``: weapon, attachments and metrics."""
+    weapon, options = space.decode(ids)
+    metrics = space.evaluate(ids, ttk_distances)
+    table = pd.DataFrame({'Config': ids,
+                          'Weapon': df['Weapon'].to_numpy()[weapon],
+                          'Weapon Class': df['Weapon Class'].to_numpy()[weapon]})
+    for s, slot in enumerate(space.slots):
+        names = np.array([opt.name for opt in space.options[s]], dtype=object)
+        table[slot] = names[options[:, s]]
+    table['RPM'] = metrics['rpm']
+    table['Velocity, ms'] = metrics['velocity']
+    table['Range Shift, m'] = metrics['range']
+    table['Burst Accuracy Coefficient'] = metrics['accuracy']
+    for dist in ttk_distances:
+        table[ttk_column(dist)] = metrics[f'ttk_{dist:g}']
+    return table
+
+
+if __name__ == '__main__':
+    from weapon_data import load_weapons
+
+    df = load_weapons()
+    front = optimize(df, ['ttk_20', 'accuracy'])
+    print(front.drop(columns='Config').to_string(index=False, float_format='{:.3f}'.format))
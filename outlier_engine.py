@@ -0,0 +1,121 @@
+"""Vectorized z-score outlier detection over many metrics at once.
+
+All metric columns are scored together as one (rows, metrics) float64
+array, so NaNs stay in place and every score lines up with its frame row.
+A score is NaN wherever its value is missing or its group has no spread.
+
+The centre and scale of each metric are either
+
+* ``robust=False``: mean and population standard deviation (ddof=0, as
+  ``scipy.stats.zscore`` computes them), or
+* ``robust=True``: median and MAD, scaled by 1.4826 so it estimates the
+  standard deviation of normally distributed data,
+
+computed over the whole frame (``scope='global'``) or within each weapon
+class (``scope='class'``).
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from class_index import ClassIndex
+
+SCOPES = ('global', 'class')
+MAD_SCALE = 1.4826
+
+
+def _center_scale(block, robust):
+    """Per-column NaN-skipping (centre, scale) of a 2-D block."""
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        # All-NaN columns give NaN statistics, which is what we want
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if robust:
+            center = np.nanmedian(block, axis=0)
+            scale = MAD_SCALE * np.nanmedian(np.abs(block - center), axis=0)
+        else:
+            # np.nanmean/np.nanstd each rebuild the NaN mask and a filled
+            # copy; build them once and reuse the buffer for the deviations
+            valid = ~np.isnan(block)
+            count = valid.sum(axis=0)
+            dev = np.where(valid, block, 0.0)
+            center = dev.sum(axis=0) / count
+            np.subtract(block, center, out=dev)
+            dev[~valid] = 0.0
+            scale = np.sqrt(np.einsum('ij,ij->j', dev, dev) / count)
+    return center, scale
+
+
+def zscores(values, scope='global', robust=False, classes=None):
+    """Signed z-scores of a (rows, metrics) array.
+
+    ``classes`` is the ClassIndex of the rows and is required for
+    ``scope='class'``; rows without a class then score NaN.
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"scope must be one of {SCOPES}, got {scope!r}")
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        return zscores(values[:, None], scope, robust, classes)[:, 0]
+
+    if scope == 'global':
+        center, scale = _center_scale(values, robust)
+    else:
+        if classes is None:
+            raise ValueError("scope='class' needs the rows' ClassIndex")
+        # One gather puts every class in a contiguous block
+        grouped = values[classes.order]
+        stats = [_center_scale(grouped[start:stop], robust)
+                 for start, stop in zip(classes.offsets[:-1], classes.offsets[1:])]
+        nan_row = np.full((1, values.shape[1]), np.nan)
+        # Row -1 (appended last) is the NaN statistics of rows without a class
+        center = np.vstack([s[0] for s in stats] + [nan_row])[classes.codes]
+        scale = np.vstack([s[1] for s in stats] + [nan_row])[classes.codes]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = values - center
+        z /= scale
+    z[np.isinf(z)] = np.nan
+    return z
+
+
+def _flag_per_metric(df, metrics, threshold, scope, robust, classes):
+    """(metric index, row, value, z-score) of every outlier, one metric at a time."""
+    parts = [(np.empty(0, dtype=np.intp),) * 2 + (np.empty(0),) * 2]
+    for j, metric in enumerate(metrics):
+        values = df[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+        z = zscores(values, scope, robust, classes)
+        rows = np.flatnonzero(np.abs(z) > threshold)  # NaN compares False
+        parts.append((np.full(len(rows), j), rows, values[rows], z[rows]))
+    return [np.concatenate(column) for column in zip(*parts)]
+
+
+def find_outliers(df, metrics, threshold=2.0, scope='global', robust=False, classes=None,
+                  id_columns=('Weapon', 'Weapon Class'), lean=False):
+    """Rows of ``df`` whose absolute z-score exceeds ``threshold``.
+
+    Returns one tidy table with a row per (metric, weapon) outlier, ordered
+    by metric and then frame order: the metric, ``id_columns``, the value
+    and its signed z-score.  ``lean`` scores the metrics one at a time
+    instead of in one (rows, metrics) pass, so only one column's float64
+    values and scores exist at once.
+    """
+    if scope == 'class' and classes is None:
+        classes = ClassIndex.from_frame(df)
+    metrics = list(metrics)
+    if lean:
+        metric_idx, rows, values, z = _flag_per_metric(df, metrics, threshold, scope, robust, classes)
+    else:
+        block = df[metrics].to_numpy(dtype=np.float64, na_value=np.nan)
+        scores = zscores(block, scope, robust, classes)
+        flagged = np.abs(scores) > threshold  # NaN compares False
+        metric_idx, rows = np.nonzero(flagged.T)
+        values, z = block[rows, metric_idx], scores[rows, metric_idx]
+
+    table = pd.DataFrame({'Metric': np.asarray(metrics, dtype=object)[metric_idx]})
+    for col in id_columns:
+        table[col] = df[col].iloc[rows].to_numpy()
+    table['Value'] = values
+    table['Z-score'] = z
+    table.index = df.index[rows]
+    return table
@@ -0,0 +1,218 @@
+"""Opt-in wall time, CPU time and memory profiling of pipeline stages.
+
+Stages are marked with ``span``::
+
+    with profiling.span('ttk', 'analysis'):
+        ...
+
+Profiling is off unless the BF6_PROFILE environment variable is set (to
+anything but ``0``; a ``.json`` value also names the trace file) or
+``enable`` is called.  While it is off, ``span`` returns one shared no-op
+context manager, so an instrumented stage costs a function call.
+
+While it is on, every span records:
+
+* ``wall_ms`` and ``cpu_ms``: elapsed and process CPU time;
+* ``peak_kib``: the peak of traced memory above the span's starting point
+  (tracemalloc, which also slows allocation-heavy code down); and
+* ``blocks_delta``: the change in the number of allocated memory blocks,
+  i.e. the objects the stage left behind.  This is a net figure, not a
+  count of allocations: CPython keeps no running count, and blocks freed
+  within the span cancel blocks allocated in it.
+
+Spans nest per thread, and a span's peak includes its children's.  Traced
+memory is process-wide, so spans running at the same time in other threads
+share their peaks.  Chart workers record their own spans and send them back
+with their result (see charts.render_charts), so a trace covers every
+process.  A process keeps its last MAX_EVENTS spans, so a long-running
+server with profiling on does not grow without bound.
+
+``write_trace`` saves the spans as JSON and ``write_chrome_trace`` in the
+Chrome trace event format, which chrome://tracing and Perfetto open.
+"""
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+ENV_VAR = 'BF6_PROFILE'
+TRACE_FILE = 'profile.json'
+# Spans kept per process; older ones are dropped first
+MAX_EVENTS = 100_000
+
+_enabled = False
+_events = collections.deque(maxlen=MAX_EVENTS)
+_recorded = 0  # spans ever recorded, including dropped ones
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack():
+    """The calling thread's open spans, innermost last."""
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _record(recorded):
+    global _recorded
+    with _lock:
+        _events.extend(recorded)
+        _recorded += len(recorded)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'category', 'args', 'start_ns', 'cpu_ns', 'memory', 'peak', 'blocks')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        stack = _stack()
+        self.memory = self.peak = 0
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # Hand the peak so far to the enclosing span before restarting it
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.memory = self.peak = current
+        self.blocks = sys.getallocatedblocks()
+        stack.append(self)
+        self.cpu_ns = time.process_time_ns()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end_ns = time.perf_counter_ns()
+        cpu_ns = time.process_time_ns()
+        if tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        stack = _stack()
+        stack.pop()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, self.peak)
+        _record([{
+            'name': self.name,
+            'category': self.category,
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+            'depth': len(stack),
+            'start_ns': self.start_ns,
+            'wall_ms': (end_ns - self.start_ns) / 1e6,
+            'cpu_ms': (cpu_ns - self.cpu_ns) / 1e6,
+            'peak_kib': (self.peak - self.memory) / 1024,
+            'blocks_delta': sys.getallocatedblocks() - self.blocks,
+            'args': self.args,
+        }])
+        return False
+
+
+def enabled():
+    return _enabled
+
+
+def enable(trace_memory=True):
+    """Start recording spans, in this process and in workers it starts."""
+    global _enabled
+    _enabled = True
+    os.environ.setdefault(ENV_VAR, '1')
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def span(name, category='stage', **args):
+    """Context manager timing one stage; ``args`` are stored with the span."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def mark():
+    """Number of spans recorded so far, to pass to ``events`` later."""
+    return _recorded
+
+
+def events(since=0):
+    """The spans still kept, from the ``since``-th one recorded on."""
+    with _lock:
+        dropped = _recorded - len(_events)
+        return list(_events)[max(since - dropped, 0):]
+
+
+def add_events(recorded):
+    """Merge spans recorded by another process."""
+    _record(recorded)
+
+
+def trace_path():
+    """Where the JSON trace goes: BF6_PROFILE if it names a file, else TRACE_FILE."""
+    value = os.environ.get(ENV_VAR, '')
+    return value if value.endswith('.json') else TRACE_FILE
+
+
+def _write(path, payload):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(payload, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def write_trace(path=None):
+    """Save every span, in start order, as JSON; returns the path."""
+    path = path or trace_path()
+    spans = sorted(events(), key=lambda e: e['start_ns'])
+    origin = spans[0]['start_ns'] if spans else 0
+    _write(path, {'spans': [dict({k: v for k, v in e.items() if k != 'start_ns'},
+                                 start_ms=(e['start_ns'] - origin) / 1e6) for e in spans]})
+    return path
+
+
+def write_chrome_trace(path):
+    """Save every span as Chrome trace "complete" events; returns the path."""
+    spans = events()
+    origin = min((e['start_ns'] for e in spans), default=0)
+    _write(path, {'traceEvents': [{
+        'name': e['name'], 'cat': e['category'], 'ph': 'X',
+        'ts': (e['start_ns'] - origin) / 1e3, 'dur': e['wall_ms'] * 1e3,
+        'pid': e['pid'], 'tid': e['tid'],
+        'args': dict(e['args'], cpu_ms=e['cpu_ms'], peak_kib=e['peak_kib'],
+                     blocks_delta=e['blocks_delta']),
+    } for e in spans], 'displayTimeUnit': 'ms'})
+    return path
+
+
+def summary(limit=15):
+    """Text table of the slowest spans."""
+    lines = [f"{'span':40s} {'category':10s} {'wall ms':>9s} {'cpu ms':>9s} {'peak KiB':>10s}"]
+    for e in sorted(events(), key=lambda e: e['wall_ms'], reverse=True)[:limit]:
+        lines.append(f"{e['name'][:40]:40s} {e['category'][:10]:10s} {e['wall_ms']:9.1f} "
+                     f"{e['cpu_ms']:9.1f} {e['peak_kib']:10.0f}")
+    return '\n'.join(lines)
+
+
+if os.environ.get(ENV_VAR, '0') != '0':
+    enable()
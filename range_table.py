@@ -0,0 +1,263 @@
+"""Best weapon at every distance, as a searchable interval index.
+
+Between two BTK breakpoints the TTK engine's model is a straight line in
+distance for every weapon:
+
+    TTK(d) = (BTK_k - 1) * fire_interval + d * 1000 / velocity
+
+so the leader over a segment is the lower envelope of one line per weapon,
+and the crossover points are where envelope lines intersect.  As in the
+engine, a breakpoint's BTK column covers the band up to and including its
+distance: the segments are the point 0 m (``BTK at 0``), then (0, 20],
+(20, 35] and (35, max_range] with the 20, 35 and 75 m columns.  A leader
+change at a breakpoint therefore takes effect just past it.  The envelope
+is traced exactly rather than sampled: starting from the best weapon at
+the segment start, the next leader is the slower-growing line that
+overtakes the current one first.  Each step is one vectorized pass over the
+weapons, and the slope strictly falls at every step, so a segment costs
+O(weapons x leaders).
+
+A priority scales each weapon's line by a positive per-weapon factor and
+keeps the ordering "lower is better":
+
+* ``'ttk'``: the TTK itself;
+* ``'balanced'``: TTK / (burst accuracy x RPM / 1000), i.e. the dashboard
+  calculator's balanced score ``(1 / TTK) * accuracy * (RPM / 1000)`` with
+  the TTK taken at the distance instead of fixed at 20 m.
+
+The intervals of every (weapon class, priority) group are stored flat,
+group after group, with offsets (like ClassIndex), so the leader at any
+distance is one ``searchsorted`` over the group's interval starts.
+Intervals are closed on the right, (start, end], to match the bands; the
+first one also holds 0 m, and is empty (0 to 0 m) when the 0 m leader
+differs from the leader just past it.
+
+Groups are traced in two passes.  Every chunk of ENVELOPE_CHUNK rows has
+its own envelope, and only the rows on it can lead the whole group, so the
+group's envelope is then traced over those candidates.  Ties are broken
+the same way in both passes, so the result is the same as a single pass,
+while the temporaries stay chunk-sized on million-row variant datasets.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from class_index import ClassIndex
+from ttk_engine import BTK_DISTANCES, weapon_primitives
+
+MAX_RANGE = 150.0
+PRIORITIES = ('ttk', 'balanced')
+# Group key of the weapons of every class together
+ALL_CLASSES = 'All'
+# Rows per chunk in the first pass over the weapons (see the module docstring)
+ENVELOPE_CHUNK = 131_072
+
+
+def priority_factors(df, priority):
+    """Per-weapon factor the TTK is multiplied by for ``priority``."""
+    if priority == 'ttk':
+        return np.ones(len(df))
+    if priority == 'balanced':
+        accuracy = df['Burst Accuracy Coefficient'].to_numpy(dtype=np.float64, na_value=np.nan)
+        rpm = df['RPM'].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 1000.0 / (accuracy * rpm)
+    raise ValueError(f"priority must be one of {PRIORITIES}, got {priority!r}")
+
+
+def _segment_envelope(intercept, slope, lo, hi):
+    """Leaders of ``min(intercept + slope * d)`` just past ``lo`` and up to ``hi``.
+
+    Returns (starts, leaders) with leaders as positions into the inputs.
+    Ties go to the line that grows slowest (it stays best afterwards), then
+    to the earliest position; with ``lo == hi`` that is the leader at ``lo``.
+    """
+    value = intercept + slope * lo
+    best = np.nanmin(value)
+    tied = np.flatnonzero(value == best)
+    leader = tied[np.argmin(slope[tied])]
+    starts, leaders = [lo], [leader]
+    while True:
+        # Only lines that grow slower than the leader can overtake it
+        slower = np.flatnonzero(slope < slope[leader])
+        if not len(slower):
+            break
+        cross = (intercept[slower] - intercept[leader]) / (slope[leader] - slope[slower])
+        ahead = (cross >= starts[-1]) & (cross < hi)
+        if not ahead.any():
+            break
+        slower, cross = slower[ahead], cross[ahead]
+        first = cross == cross.min()
+        leader = slower[first][np.argmin(slope[slower[first]])]
+        if cross.min() == starts[-1]:
+            leaders[-1] = leader
+        else:
+            starts.append(cross.min())
+            leaders.append(leader)
+    return starts, leaders
+
+
+def _segments(max_range):
+    """(lo, hi, BTK column) of every segment of [0, max_range].
+
+    The first is the point 0 m; segment k then covers (breakpoint k - 1,
+    breakpoint k], and the last one extends to ``max_range``.
+    """
+    segments = [(0.0, 0.0, 0)]
+    for k in range(1, len(BTK_DISTANCES)):
+        lo = BTK_DISTANCES[k - 1]
+        hi = max_range if k == len(BTK_DISTANCES) - 1 else min(BTK_DISTANCES[k], max_range)
+        if lo < max_range:
+            segments.append((float(lo), float(hi), k))
+    return segments
+
+
+def _envelope(shot_time, ms_per_metre, factor, segments):
+    """Merged leader intervals of one group over ``segments`` (see ``_segments``)."""
+    slope = ms_per_metre * factor
+    starts, leaders = [], []
+    for lo, hi, k in segments:
+        intercept = shot_time[:, k] * factor
+        seg_starts, seg_leaders = _segment_envelope(intercept, slope, lo, hi)
+        for start, leader in zip(seg_starts, seg_leaders):
+            if not leaders or leaders[-1] != leader:
+                starts.append(start)
+                leaders.append(leader)
+    return starts, leaders
+
+
+def _envelope_candidates(shot_time, ms_per_metre, factor, segments):
+    """Positions of the lines that lead some segment, in ascending order."""
+    slope = ms_per_metre * factor
+    candidates = set()
+    for lo, hi, k in segments:
+        candidates.update(_segment_envelope(shot_time[:, k] * factor, slope, lo, hi)[1])
+    return np.array(sorted(candidates), dtype=np.intp)
+
+
+@dataclass
+class RangeTable:
+    """Leader intervals of every (weapon class, priority) group.
+
+    Group ``g`` owns intervals ``offsets[g]:offsets[g+1]``.  Interval ``i``
+    covers (starts[i], starts[i+1]], the first one of each group also holds
+    0 m and the last one ends at ``max_range``.  ``leaders`` are row
+    positions in the weapons frame.
+    """
+    keys: list           # (weapon class, priority) of every group
+    starts: np.ndarray
+    leaders: np.ndarray
+    offsets: np.ndarray
+    max_range: float
+    weapons: np.ndarray  # weapon name of every interval's leader
+    classes: np.ndarray  # weapon class of every interval's leader
+
+    def group(self, weapon_class=None, priority='ttk'):
+        key = (weapon_class or ALL_CLASSES, priority)
+        try:
+            return self.keys.index(key)
+        except ValueError:
+            raise KeyError(f"no range table for class {key[0]!r} and priority {priority!r}") from None
+
+    def best(self, distances, weapon_class=None, priority='ttk'):
+        """Row positions of the leaders at ``distances``, -1 outside [0, max_range]."""
+        g = self.group(weapon_class, priority)
+        lo, hi = self.offsets[g], self.offsets[g + 1]
+        distances = np.asarray(distances, dtype=np.float64)
+        if lo == hi:
+            return np.full(distances.shape, -1, dtype=np.intp)
+        slot = np.searchsorted(self.starts[lo:hi], distances, side='left') - 1
+        rows = self.leaders[lo + np.maximum(slot, 0)]
+        inside = (distances >= 0) & (distances <= self.max_range)
+        return np.where(inside, rows, -1)
+
+    def intervals(self, weapon_class=None, priority='ttk'):
+        """The leader intervals of one group: Start, End, Weapon and Weapon Class."""
+        g = self.group(weapon_class, priority)
+        lo, hi = self.offsets[g], self.offsets[g + 1]
+        starts = self.starts[lo:hi]
+        rows = self.leaders[lo:hi]
+        return pd.DataFrame({'Start': starts, 'End': np.append(starts[1:], self.max_range),
+                             'Weapon': self.weapons[lo:hi], 'Weapon Class': self.classes[lo:hi]})
+
+    def crossovers(self, weapon_class=None, priority='ttk'):
+        """Distances where the leader of one group changes: Distance, Before, After."""
+        table = self.intervals(weapon_class, priority)
+        return pd.DataFrame({'Distance': table['Start'].to_numpy()[1:],
+                             'Before': table['Weapon'].to_numpy()[:-1],
+                             'After': table['Weapon'].to_numpy()[1:]})
+
+    def table(self):
+        """Every group's intervals in one tidy frame, keyed by Class and Priority."""
+        frames = []
+        for weapon_class, priority in self.keys:
+            intervals = self.intervals(weapon_class, priority)
+            intervals.insert(0, 'Priority', priority)
+            intervals.insert(0, 'Class', weapon_class)
+            frames.append(intervals)
+        return pd.concat(frames, ignore_index=True)
+
+
+def _lines(df, priority, segments):
+    """Every weapon's line over the first ``segments`` segments, and which weapons are usable.
+
+    Returns (shot_time, ms_per_metre, factor, usable): a line's intercept in
+    segment k is ``shot_time[:, k] * factor`` and its slope is
+    ``ms_per_metre * factor``.
+    """
+    btk, fire_interval, velocity = weapon_primitives(df)
+    shot_time = ((btk - 1) * fire_interval[:, None])[:, :segments]
+    with np.errstate(divide='ignore'):
+        ms_per_metre = 1000.0 / velocity
+    factor = priority_factors(df, priority)
+    usable = (np.isfinite(shot_time).all(axis=1) & np.isfinite(ms_per_metre) & (velocity > 0)
+              & np.isfinite(factor) & (factor > 0))
+    return shot_time, ms_per_metre, factor, usable
+
+
+def build_range_table(df, max_range=MAX_RANGE, priorities=PRIORITIES, classes=None):
+    """RangeTable of the weapons in ``df`` over [0, max_range] metres.
+
+    Groups cover all weapons together and each weapon class, for every
+    priority.  Weapons with a missing primitive are left out.  ``classes``
+    is the frame's ClassIndex, built if not given.
+    """
+    if classes is None:
+        classes = ClassIndex.from_frame(df)
+    segments = _segments(max_range)
+    columns = segments[-1][2] + 1
+    names = [ALL_CLASSES] + list(classes.names)
+
+    keys, starts, leaders, offsets = [], [], [], [0]
+    for priority in priorities:
+        # First pass: the rows leading their chunk's envelope, per group
+        # (group 0 is every class, group i + 1 is class i)
+        candidates = [[] for _ in names]
+        for lo in range(0, len(df), ENVELOPE_CHUNK):
+            shot_time, ms_per_metre, factor, usable = _lines(df.iloc[lo:lo + ENVELOPE_CHUNK],
+                                                              priority, columns)
+            codes = classes.codes[lo:lo + ENVELOPE_CHUNK]
+            groups = [usable] + [usable & (codes == i) for i in range(len(classes))]
+            for group, member in zip(candidates, groups):
+                rows = np.flatnonzero(member)
+                if len(rows):
+                    group.append(lo + rows[_envelope_candidates(
+                        shot_time[rows], ms_per_metre[rows], factor[rows], segments)])
+
+        # Second pass: each group's envelope over its candidates
+        for name, group in zip(names, candidates):
+            rows = np.concatenate(group) if group else np.empty(0, dtype=np.intp)
+            if len(rows):
+                shot_time, ms_per_metre, factor, _ = _lines(df.iloc[rows], priority, columns)
+                group_starts, group_leaders = _envelope(shot_time, ms_per_metre, factor, segments)
+                starts.extend(group_starts)
+                leaders.extend(rows[group_leaders])
+            keys.append((name, priority))
+            offsets.append(len(starts))
+
+    leaders = np.asarray(leaders, dtype=np.intp)
+    return RangeTable(keys=keys, starts=np.asarray(starts, dtype=np.float64), leaders=leaders,
+                      offsets=np.asarray(offsets, dtype=np.intp), max_range=float(max_range),
+                      weapons=df['Weapon'].iloc[leaders].to_numpy(dtype=object),
+                      classes=df['Weapon Class'].iloc[leaders].astype(object).to_numpy())
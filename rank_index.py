@@ -0,0 +1,254 @@
+"""Leaderboard order of several metrics, kept sorted as rows change.
+
+A one-off leaderboard is a partial sort of one column (``analyses.top_rows``).
+A service that answers many leaderboard and rank queries, and sees a few
+weapons change at a time, keeps a RankIndex instead.  It sorts each metric
+once, overall and within each weapon class, and then answers:
+
+* ``top(metric, n)``: the best (or worst) ``n`` rows, overall or in one
+  class, by reading ``n`` entries of the sorted order;
+* ``rank(metric, rows)``: 1-based ranks, one binary search per row; and
+* ``update(rows, values)``: new values for a few rows.  Each changed row is
+  moved to its new place by shifting the entries in between, so nothing is
+  re-sorted.
+
+Rows are ordered by (key, row).  The key is the value, negated for metrics
+that rank their highest values first, so ties keep row order as in
+``DataFrame.nsmallest``/``nlargest`` and ``top_rows``.  Rows without a value
+come last and are not ranked.
+
+Metrics added together are sorted in one batched argsort of a (metrics,
+rows) key matrix.  The per-class orders come from a stable sort of the
+class codes along each overall order, which is a radix sort of small
+integers, so the floats are only sorted once.  Every indexed metric holds
+32 bytes per row: row keys, plus positions and sorted keys overall and per
+class.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# With more changed rows than this, ``update`` re-sorts a metric instead of
+# moving its rows one at a time
+UPDATE_ROWS = 64
+
+
+@dataclass
+class _Ranking:
+    """One indexed metric.  Keys are the value times ``sign``; NaN is missing."""
+    sign: float
+    row_keys: np.ndarray     # key of every row, in row order
+    order: np.ndarray        # row positions by (key, row), missing rows last
+    keys: np.ndarray         # row_keys[order]
+    n_valid: int
+    class_order: np.ndarray = None  # ``order`` grouped by class, at ClassIndex.offsets
+    class_keys: np.ndarray = None
+    class_valid: np.ndarray = None  # rows with a value in each class
+
+
+def _locate(order, keys, n_valid, key, row):
+    """Position of (key, row) in a sorted run: where it is or would be inserted."""
+    if np.isnan(key):
+        lo, hi = n_valid, len(order)
+    else:
+        lo = np.searchsorted(keys[:n_valid], key, side='left')
+        hi = np.searchsorted(keys[:n_valid], key, side='right')
+    # Tied rows (and the missing rows) are in row order
+    return int(lo + np.searchsorted(order[lo:hi], row))
+
+
+def _move(order, keys, n_valid, row, old, new):
+    """Move ``row`` from key ``old`` to key ``new`` in place; returns the new valid count."""
+    start = _locate(order, keys, n_valid, old, row)
+    end = _locate(order, keys, n_valid, new, row)
+    if end > start:
+        # ``end`` counted the row itself at its old place
+        end -= 1
+        order[start:end] = order[start + 1:end + 1]
+        keys[start:end] = keys[start + 1:end + 1]
+    elif end < start:
+        order[end + 1:start + 1] = order[end:start]
+        keys[end + 1:start + 1] = keys[end:start]
+    order[end], keys[end] = row, new
+    return n_valid + int(np.isnan(old)) - int(np.isnan(new))
+
+
+class RankIndex:
+    """Sorted order of every added metric, overall and per class.
+
+    ``classes`` is the frame's ClassIndex; without it only overall
+    leaderboards and ranks are available.
+    """
+
+    def __init__(self, values=None, descending=(), classes=None):
+        self.classes = classes
+        self.n_rows = None if classes is None else len(classes.codes)
+        self._rankings = {}
+        if values:
+            self.add(values, descending)
+
+    def __contains__(self, metric):
+        return metric in self._rankings
+
+    @property
+    def metrics(self):
+        return list(self._rankings)
+
+    def add(self, values, descending=()):
+        """Index ``values`` (metric -> one value per row), all in one sort.
+
+        Metrics in ``descending`` rank their highest values first.  A metric
+        that is already indexed is replaced.
+        """
+        metrics = list(values)
+        if not metrics:
+            return
+        keys = np.array([np.asarray(values[metric], dtype=np.float64) for metric in metrics])
+        if self.n_rows is None:
+            self.n_rows = keys.shape[1]
+        if keys.shape[1] != self.n_rows:
+            raise ValueError(f"index has {self.n_rows} rows, got {keys.shape[1]} values")
+        signs = np.array([-1.0 if metric in descending else 1.0 for metric in metrics])
+        keys *= signs[:, None]
+        self._index(metrics, keys, signs)
+
+    def merge(self, other):
+        """Take over every metric of ``other``, an index of the same rows and classes."""
+        if other.n_rows != self.n_rows:
+            raise ValueError(f"index has {self.n_rows} rows, other has {other.n_rows}")
+        self._rankings.update(other._rankings)
+
+    def discard(self, metric):
+        self._rankings.pop(metric, None)
+
+    def _index(self, metrics, keys, signs):
+        """Sort the (metrics, rows) ``keys`` matrix and store each row as a ranking."""
+        position = np.int32 if self.n_rows <= np.iinfo(np.int32).max else np.intp
+        orders = np.argsort(keys, axis=1, kind='stable').astype(position, copy=False)
+        sorted_keys = np.take_along_axis(keys, orders, axis=1)
+        n_valid = np.count_nonzero(~np.isnan(keys), axis=1)
+
+        class_orders = class_keys = None
+        if self.classes is not None:
+            codes = self.classes.codes
+            # Rows without a class sort first and are left out, as in ClassIndex
+            missing = len(codes) - self.classes.offsets[-1]
+            grouped = np.argsort(codes[orders], axis=1, kind='stable')[:, missing:]
+            class_orders = np.take_along_axis(orders, grouped, axis=1)
+            class_keys = np.take_along_axis(sorted_keys, grouped, axis=1)
+            has_class = codes >= 0
+
+        for i, metric in enumerate(metrics):
+            ranking = _Ranking(signs[i], keys[i], orders[i], sorted_keys[i], int(n_valid[i]))
+            if class_orders is not None:
+                valid = has_class & ~np.isnan(keys[i])
+                ranking.class_order, ranking.class_keys = class_orders[i], class_keys[i]
+                ranking.class_valid = np.bincount(codes[valid], minlength=len(self.classes))
+            self._rankings[metric] = ranking
+
+    def _ranking(self, metric):
+        ranking = self._rankings.get(metric)
+        if ranking is None:
+            raise KeyError(f"metric {metric!r} is not indexed; indexed: {', '.join(self._rankings)}")
+        return ranking
+
+    def _class_code(self, weapon_class):
+        if self.classes is None:
+            raise ValueError("index was built without a ClassIndex")
+        try:
+            return self.classes.names.index(weapon_class)
+        except ValueError:
+            raise KeyError(f"unknown class {weapon_class!r}") from None
+
+    def _run(self, ranking, code):
+        """(order, keys, valid count) of one class, or overall when ``code`` is None."""
+        if code is None:
+            return ranking.order, ranking.keys, ranking.n_valid
+        lo, hi = self.classes.offsets[code], self.classes.offsets[code + 1]
+        return ranking.class_order[lo:hi], ranking.class_keys[lo:hi], int(ranking.class_valid[code])
+
+    # -- queries ------------------------------------------------------------
+
+    def ordered(self, metric, weapon_class=None):
+        """(row positions, sorted keys, valid count) of ``metric``, best first.
+
+        The arrays are the index's own and must not be modified.  Keys are
+        the values, negated for descending metrics; missing rows come last.
+        """
+        code = None if weapon_class is None else self._class_code(weapon_class)
+        return self._run(self._ranking(metric), code)
+
+    def top(self, metric, n, worst=False, weapon_class=None):
+        """Row positions of the best (or ``worst``) ``n`` rows by ``metric``, in order.
+
+        ``weapon_class`` restricts the leaderboard to one class.  Rows
+        without a value are left out.
+        """
+        order, keys, n_valid = self.ordered(metric, weapon_class)
+        if not worst:
+            return order[:min(n, n_valid)].astype(np.intp)
+        # From the end of the order one group of equal keys at a time, since
+        # tied rows still rank in row order
+        parts, hi, count = [], n_valid, 0
+        while hi > 0 and count < n:
+            lo = np.searchsorted(keys[:hi], keys[hi - 1], side='left')
+            parts.append(order[lo:min(hi, lo + n - count)])
+            count += len(parts[-1])
+            hi = lo
+        return np.concatenate(parts).astype(np.intp) if parts else np.empty(0, dtype=np.intp)
+
+    def position(self, metric, value, row, weapon_class=None):
+        """0-based place of ``row`` in the order of ``metric`` if it had ``value``.
+
+        The row's current entry is still counted, so this is where it would
+        be inserted before being removed from its current place.
+        """
+        ranking = self._ranking(metric)
+        code = None if weapon_class is None else self._class_code(weapon_class)
+        return _locate(*self._run(ranking, code), ranking.sign * value, row)
+
+    def rank(self, metric, rows, by_class=False):
+        """1-based ranks of ``rows`` by ``metric``; NaN for rows without a value.
+
+        ``by_class`` ranks every row within its own class.
+        """
+        ranking = self._ranking(metric)
+        if by_class and self.classes is None:
+            raise ValueError("index was built without a ClassIndex")
+        rows = np.atleast_1d(rows)
+        ranks = np.full(len(rows), np.nan)
+        for i, row in enumerate(rows):
+            key = ranking.row_keys[row]
+            code = self.classes.codes[row] if by_class else None
+            if code is not None and code < 0:
+                continue
+            if not np.isnan(key):
+                ranks[i] = _locate(*self._run(ranking, code), key, row) + 1
+        return ranks
+
+    # -- updates ------------------------------------------------------------
+
+    def update(self, rows, values):
+        """Give ``rows`` new ``values`` (metric -> one value per row) and re-rank them.
+
+        The rows must be distinct.  Each changed row moves to its new place,
+        overall and within its class; a metric with more than UPDATE_ROWS
+        changed rows is re-sorted instead.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        for metric, new in values.items():
+            ranking = self._ranking(metric)
+            new_keys = ranking.sign * np.asarray(new, dtype=np.float64)
+            old_keys = ranking.row_keys[rows]
+            changed = ~((old_keys == new_keys) | (np.isnan(old_keys) & np.isnan(new_keys)))
+            if np.count_nonzero(changed) > UPDATE_ROWS:
+                ranking.row_keys[rows] = new_keys
+                self._index([metric], ranking.row_keys[None, :], [ranking.sign])
+                continue
+            for row, old, key in zip(rows[changed], old_keys[changed], new_keys[changed]):
+                ranking.n_valid = _move(ranking.order, ranking.keys, ranking.n_valid, row, old, key)
+                code = -1 if self.classes is None else self.classes.codes[row]
+                if code >= 0:
+                    order, keys, n_valid = self._run(ranking, code)
+                    ranking.class_valid[code] = _move(order, keys, n_valid, row, old, key)
+                ranking.row_keys[row] = key
@@ -0,0 +1,141 @@
+"""Weight sensitivity of the composite ranking.
+
+The composite score is ``composite_components(df) @ weights``, and the
+0.4 / 0.3 / 0.15 / 0.15 weights are only one reasonable choice.  This
+module scores every weapon under a whole matrix of weight vectors at once,
+one matrix multiply per chunk of vectors, and reports how stable the
+ranking is:
+
+* how often each weapon ranks first and lands in the top N, and
+* the region of weight space where each weapon wins, summarised by the
+  mean, minimum and maximum of every weight over its winning vectors.
+
+Weight vectors are usually drawn from a Dirichlet distribution with
+``sample_weights``: uniform over the simplex by default, or concentrated
+around a reference vector such as COMPOSITE_WEIGHTS.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from analyses import COMPOSITE_WEIGHTS, ID_COLUMNS, composite_components
+
+# Scores held in memory at once: (vectors per chunk) x n_weapons float64s
+SCORE_BUDGET = 8_000_000
+
+
+@dataclass
+class StabilityReport:
+    """Rank stability of every weapon over ``n_vectors`` weight vectors.
+
+    ``weapons`` has one row per weapon (win and top-N counts and shares,
+    ordered by win share); ``regions`` has the mean / min / max of each
+    weight over the vectors a weapon wins, for weapons that win any.
+    """
+    n_vectors: int
+    top_n: int
+    weapons: pd.DataFrame
+    regions: pd.DataFrame
+
+
+def sample_weights(n, center=None, concentration=None, seed=0, components=None):
+    """``n`` Dirichlet-distributed weight vectors, shape (n, n_components).
+
+    Without ``center`` the vectors are uniform over the simplex.  With a
+    ``center`` (a mapping like COMPOSITE_WEIGHTS or an array) they scatter
+    around it, more tightly the larger ``concentration`` is.
+    """
+    if components is None:
+        components = list(COMPOSITE_WEIGHTS)
+    rng = np.random.default_rng(seed)
+    if center is None:
+        alpha = np.ones(len(components))
+    else:
+        if isinstance(center, dict):
+            center = [center[c] for c in components]
+        center = np.asarray(center, dtype=np.float64)
+        alpha = center / center.sum() * (concentration or 100.0)
+    return rng.dirichlet(alpha, size=n)
+
+
+def scores(components, weights):
+    """Composite scores of every weapon under every vector, (n_vectors, n_weapons)."""
+    return np.asarray(weights, dtype=np.float64) @ np.asarray(components, dtype=np.float64).T
+
+
+def rank_stability(df, weights, top_n=5, chunk_size=None):
+    """StabilityReport of the weapons in ``df`` under ``weights``.
+
+    ``weights`` has one row per weight vector and one column per
+    COMPOSITE_WEIGHTS component.  Vectors are processed ``chunk_size`` at a
+    time (by default as many as fit SCORE_BUDGET) so memory stays bounded
+    for millions of vectors.  Ties go to the weapon listed first.
+    """
+    components = composite_components(df)
+    weights = np.asarray(weights, dtype=np.float64)
+    n_weapons, n_components = components.shape
+    if weights.ndim != 2 or weights.shape[1] != n_components:
+        raise ValueError(f"weights must have shape (n, {n_components}), got {weights.shape}")
+    top_n = min(top_n, n_weapons)
+    if chunk_size is None:
+        chunk_size = max(1, SCORE_BUDGET // n_weapons)
+
+    # Weapons with a missing metric never win or make the top N
+    incomplete = np.isnan(components).any(axis=1)
+    wins = np.zeros(n_weapons, dtype=np.int64)
+    in_top = np.zeros(n_weapons, dtype=np.int64)
+    weight_sum = np.zeros((n_weapons, n_components))
+    weight_min = np.full((n_weapons, n_components), np.inf)
+    weight_max = np.full((n_weapons, n_components), -np.inf)
+
+    for lo in range(0, len(weights), chunk_size):
+        block = weights[lo:lo + chunk_size]
+        chunk_scores = scores(components, block)
+        chunk_scores[:, incomplete] = -np.inf
+
+        winner = chunk_scores.argmax(axis=1)
+        wins += np.bincount(winner, minlength=n_weapons)
+        if top_n == n_weapons:
+            in_top += len(block)
+        else:
+            top = np.argpartition(-chunk_scores, top_n - 1, axis=1)[:, :top_n]
+            in_top += np.bincount(top.ravel(), minlength=n_weapons)
+
+        for j in range(n_components):
+            weight_sum[:, j] += np.bincount(winner, weights=block[:, j], minlength=n_weapons)
+            np.minimum.at(weight_min[:, j], winner, block[:, j])
+            np.maximum.at(weight_max[:, j], winner, block[:, j])
+
+    n = len(weights)
+    table = df[ID_COLUMNS].reset_index(drop=True)
+    table['Wins'] = wins
+    table['Win Share'] = wins / n if n else np.nan
+    table[f'Top {top_n}'] = in_top
+    table[f'Top {top_n} Share'] = in_top / n if n else np.nan
+    table = table.sort_values(['Win Share', f'Top {top_n} Share'], ascending=False, kind='stable')
+
+    winners = np.flatnonzero(wins)
+    names = list(COMPOSITE_WEIGHTS)
+    regions = df[ID_COLUMNS].iloc[winners].reset_index(drop=True)
+    regions['Win Share'] = wins[winners] / n
+    for stat, values in [('mean', weight_sum[winners] / wins[winners, None]),
+                         ('min', weight_min[winners]), ('max', weight_max[winners])]:
+        for j, name in enumerate(names):
+            regions[f'{name} {stat}'] = values[:, j]
+    regions = regions.sort_values('Win Share', ascending=False, kind='stable')
+
+    return StabilityReport(n_vectors=n, top_n=top_n, weapons=table.reset_index(drop=True),
+                           regions=regions.reset_index(drop=True))
+
+
+if __name__ == '__main__':
+    from analyses import prepare_frame
+    from weapon_data import load_weapons
+
+    df = prepare_frame(load_weapons())
+    report = rank_stability(df, sample_weights(1_000_000), top_n=5)
+    print(f"Rank stability over {report.n_vectors:,} uniform weight vectors:\n")
+    print(report.weapons.head(15).to_string(index=False, float_format='{:.3f}'.format))
+    print("\nWeight regions where each weapon wins:\n")
+    print(report.regions.to_string(index=False, float_format='{:.3f}'.format))
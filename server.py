@@ -0,0 +1,539 @@
+"""Long-running local HTTP service for the weapon analyses.
+
+Dashboards and bots used to run analyze_weapons.py once per request.  The
+server loads data.csv once instead, and keeps in memory:
+
+* the prepared weapons frame;
+* every analysis result computed so far (analyses run on first request,
+  in a thread, with their dependencies reused);
+* the serialized body of the RESPONSE_CACHE_SIZE most recently used
+  successful JSON responses;
+* a RankIndex of every metric a leaderboard was asked for, so a
+  leaderboard (overall or per class) reads its top rows off a sorted
+  order; and
+* rendered chart PNGs, keyed by charts.job_key.
+
+A cached response is a dictionary lookup, so repeated leaderboard queries
+return in well under a millisecond of server time.
+
+The CSV is polled for changes.  A changed file is reloaded once its size
+and modification time settle, and compared with the previous frame
+column by column.  Rows whose leaderboard metrics changed are moved to
+their new place in the RankIndex.  Only analysis results and responses
+that read a changed column are dropped (an analysis reads its own columns and those
+of its dependencies, see analyses.required_columns).  If weapons were
+added, removed or reordered, everything is dropped.  A file that fails to
+load keeps the previous data in service.
+
+Charts render in a process pool, so a slow figure never blocks the event
+loop or other queries.  Concurrent requests for the same figure share one
+render.
+
+Endpoints (GET; JSON unless noted):
+
+    /status                         source file, digest, rows, cache sizes
+    /analyses                       registered analyses
+    /analyses/<name>                every table and scalar of one analysis
+    /analyses/<name>/<table>        one table, as records
+    /leaderboard?metric=RPM&n=10&order=desc&class=SMG
+    /charts                         available figures
+    /charts/<file>.png              one figure (PNG)
+"""
+import argparse
+import asyncio
+import collections
+import http
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from analyses import REGISTRY, ID_COLUMNS, LOWER_IS_BETTER, prepare_frame, required_columns, run
+from analyze_weapons import chart_frame
+from charts import analysis_charts, job_key, render_png
+from rank_index import UPDATE_ROWS, RankIndex
+from weapon_data import DATA_FILE, file_digest, load_weapons
+
+HOST = '127.0.0.1'
+PORT = 8765
+# Seconds between checks of the CSV's modification time and size
+POLL_INTERVAL = 1.0
+LEADERBOARD_DEFAULT = 10
+LEADERBOARD_MAX = 1000
+# Successful JSON responses kept, least recently used dropped first; every
+# distinct query string is its own entry
+RESPONSE_CACHE_SIZE = 1024
+# Analyses run in worker threads of this process, where forking a process
+# pool can deadlock, so any that can start one is kept in-process
+ANALYSIS_OPTIONS = {'correlation': {'workers': 1}}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _is_text(dtype):
+    return isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype)
+
+
+def _same_values(old, new):
+    """Whether two columns hold the same values.
+
+    Text columns compare by value, so a column read from the cache and the
+    same column parsed from the CSV match whatever their text dtype.
+    """
+    if old.dtype == new.dtype:
+        return old.equals(new)
+    if _is_text(old.dtype) and _is_text(new.dtype):
+        return np.array_equal(old.to_numpy(dtype=object), new.to_numpy(dtype=object))
+    return False
+
+
+def changed_columns(old, new):
+    """Columns whose values differ between two frames of the same weapons.
+
+    Returns None when the frames are not comparable column by column: no
+    previous frame, different columns, or different weapons or row order.
+    A one-cell edit reports only that cell's column, even when the weapon
+    names come back with another text dtype:
+
+    >>> old = pd.DataFrame({'Weapon': pd.Series(['TR-7', 'M433'], dtype='str'),
+    ...                     'RPM': [720, 800], 'Velocity, ms': [600, 650]})
+    >>> new = pd.DataFrame({'Weapon': pd.Series(['TR-7', 'M433'], dtype=object),
+    ...                     'RPM': [1200, 800], 'Velocity, ms': [600, 650]})
+    >>> changed_columns(old, new)
+    {'RPM'}
+    """
+    if old is None or len(old) != len(new) or list(old.columns) != list(new.columns):
+        return None
+    if not _same_values(old['Weapon'], new['Weapon']):
+        return None
+    return {col for col in new.columns if not _same_values(old[col], new[col])}
+
+
+def _chart_columns(job):
+    """Weapons-frame columns a chart depends on, with derived ones resolved."""
+    columns = set(job.columns)
+    if 'BTK_Variance' in columns:
+        columns.discard('BTK_Variance')
+        columns.update(required_columns(['falloff']))
+    return columns
+
+
+def _records(table):
+    """A table as JSON-ready records, with a labelled index (not row numbers) as a column."""
+    if not pd.api.types.is_integer_dtype(table.index):
+        table = table.rename_axis(table.index.name or 'Name').reset_index()
+    return json.loads(table.to_json(orient='records'))
+
+
+def _scalars(values):
+    """The JSON-serialisable scalar values of an AnalysisResult."""
+    out = {}
+    for key, value in values.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is None or isinstance(value, (bool, int, float, str)):
+            out[key] = value
+    return out
+
+
+def _json(payload):
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+class AnalysisServer:
+    """In-memory analysis results for one CSV, kept in step with the file."""
+
+    def __init__(self, path=DATA_FILE, workers=None, use_cache=True, log=None, lean=False):
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.use_cache = use_cache
+        self.lean = lean
+        self.log = log or (lambda message: None)
+        self.jobs = {job.filename: job for job in analysis_charts()}
+
+        self.df = None
+        self.digest = None
+        self.loaded_at = None
+        # Bumped on every reload; work started on an older frame is not cached
+        self.generation = 0
+        self.results = {}
+        # Request target -> (columns, (status, type, body)), least recently used first
+        self.responses = collections.OrderedDict()
+        self.pngs = {}        # chart filename -> (job key, PNG bytes)
+        self.rankings = None  # RankIndex of the metrics leaderboards were asked for
+        self._chart_data = None
+        self._chart_keys = {}
+        self._rendering = {}
+        self._stat = None
+        self._pool = None
+        self._reload_lock = asyncio.Lock()
+
+    # -- data ---------------------------------------------------------------
+
+    def _load(self):
+        with profiling.span('reload', 'server'):
+            digest = file_digest(self.path)
+            df = load_weapons(self.path, use_cache=self.use_cache, lean=self.lean)
+            return prepare_frame(df, lean=self.lean), digest
+
+    async def reload(self):
+        """Reload the CSV if its content changed.
+
+        Returns the changed columns, None when everything was invalidated,
+        or an empty set when nothing changed or the file could not be read.
+        """
+        async with self._reload_lock:
+            stat = os.stat(self.path)
+            try:
+                df, digest = await asyncio.to_thread(self._load)
+            except Exception as exc:  # a half-written or malformed CSV
+                self._stat = (stat.st_mtime_ns, stat.st_size)
+                if self.df is None:
+                    raise
+                self.log(f"reload of {self.path} failed, keeping previous data: {exc}")
+                return set()
+            self._stat = (stat.st_mtime_ns, stat.st_size)
+            if digest == self.digest:
+                return set()
+
+            changed = changed_columns(self.df, df)
+            self._rerank(self.df, df, changed)
+            first = self.df is None
+            self.df, self.digest, self.loaded_at = df, digest, time.time()
+            self.generation += 1
+            self._invalidate(changed)
+            self.log(f"loaded {self.path} ({len(df)} weapons); "
+                     + ("ready" if first else "all results invalidated" if changed is None
+                        else f"changed columns: {', '.join(sorted(changed)) or 'none'}"))
+            return changed
+
+    def _invalidate(self, changed):
+        self._chart_data = None
+        self._chart_keys = {}
+        if changed is None:
+            self.results.clear()
+            self.responses.clear()
+            self.pngs.clear()
+            return
+        self.results = {name: result for name, result in self.results.items()
+                        if not changed.intersection(required_columns([name]))}
+        self.responses = collections.OrderedDict(
+            (key, entry) for key, entry in self.responses.items()
+            if not changed.intersection(entry[0]))
+        self.pngs = {name: entry for name, entry in self.pngs.items()
+                     if not changed.intersection(_chart_columns(self.jobs[name]))}
+
+    def _rerank(self, old, new, changed):
+        """Move the rows whose indexed metrics changed, or drop the RankIndex."""
+        if self.rankings is None:
+            return
+        if changed is None or 'Weapon Class' in changed:
+            self.rankings = None
+            return
+        for metric in changed.intersection(self.rankings.metrics):
+            before = old[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+            after = new[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+            rows = np.flatnonzero(~((before == after) | (np.isnan(before) & np.isnan(after))))
+            if len(rows) > UPDATE_ROWS:
+                # Re-sorted in a thread by the next leaderboard that reads it
+                self.rankings.discard(metric)
+            else:
+                self.rankings.update(rows, {metric: after[rows]})
+
+    async def watch(self, interval=POLL_INTERVAL):
+        """Reload once the CSV's modification time or size changes and settles.
+
+        A change is only acted on when two consecutive polls agree, so a file
+        caught halfway through being written is not loaded.
+        """
+        pending = None
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                continue
+            current = (stat.st_mtime_ns, stat.st_size)
+            if current == self._stat:
+                pending = None
+            elif current != pending:
+                pending = current
+            else:
+                pending = None
+                await self.reload()
+
+    async def result(self, name):
+        """The AnalysisResult of ``name``, computed in a thread on first use."""
+        if name not in REGISTRY:
+            raise HTTPError(404, f"unknown analysis {name!r}")
+        if name in self.results:
+            return self.results[name]
+        generation, df = self.generation, self.df
+        computed = await asyncio.to_thread(run, df, [name], dict(self.results), ANALYSIS_OPTIONS)
+        if generation == self.generation:
+            for key, value in computed.items():
+                self.results.setdefault(key, value)
+        return computed[name]
+
+    async def ranking(self, metric):
+        """A RankIndex with ``metric`` indexed, and the frame it ranks.
+
+        A metric is sorted in a thread on first use and kept in
+        ``self.rankings``, which reloads update in place.
+        """
+        generation, df = self.generation, self.df
+        classes = (await self.result('class_index')).values['index']
+        if generation == self.generation and self.rankings is not None and metric in self.rankings:
+            return self.rankings, df
+        values = df[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+        descending = () if metric in LOWER_IS_BETTER else (metric,)
+        built = await asyncio.to_thread(RankIndex, {metric: values}, descending, classes)
+        if generation == self.generation:
+            if self.rankings is None:
+                self.rankings = RankIndex(classes=classes)
+            self.rankings.merge(built)
+        return built, df
+
+    # -- charts -------------------------------------------------------------
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def chart(self, filename):
+        """PNG bytes of one figure, rendered in the process pool when stale."""
+        job = self.jobs.get(filename)
+        if job is None:
+            raise HTTPError(404, f"unknown chart {filename!r}")
+        generation, data = self.generation, self._chart_data
+        if data is None:
+            data = await asyncio.to_thread(chart_frame, self.df)
+            # A reload during the thread leaves this data to the one request
+            if generation == self.generation:
+                self._chart_data = data
+        key = self._chart_keys.get(filename) if generation == self.generation else None
+        if key is None:
+            key = job_key(job, data)
+            if generation == self.generation:
+                self._chart_keys[filename] = key
+
+        cached = self.pngs.get(filename)
+        if cached and cached[0] == key:
+            return cached[1]
+        future = self._rendering.get(key)
+        if future is None:
+            classes = (await self.result('class_index')).values['index'] if job.by_class else None
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor(), render_png, job, data[job.columns].copy(), classes)
+            self._rendering[key] = future
+            future.add_done_callback(lambda _: self._rendering.pop(key, None))
+        # Shielded so a client that disconnects does not cancel a shared render
+        png = await asyncio.shield(future)
+        if generation == self.generation:
+            self.pngs[filename] = (key, png)
+        return png
+
+    # -- requests -----------------------------------------------------------
+
+    async def _cached(self, target, columns, build):
+        """The response to ``target``, built by ``build`` unless a successful one is cached."""
+        entry = self.responses.get(target)
+        if entry is not None:
+            self.responses.move_to_end(target)
+            return entry[1]
+        generation = self.generation
+        response = await build()
+        if generation == self.generation and response[0] == 200:
+            self.responses[target] = (frozenset(columns), response)
+            if len(self.responses) > RESPONSE_CACHE_SIZE:
+                self.responses.popitem(last=False)
+        return response
+
+    async def _analysis_list(self):
+        return 200, 'application/json', _json([
+            {'name': spec.name, 'title': spec.title, 'requires': list(spec.requires),
+             'chart': spec.chart} for spec in REGISTRY.values()])
+
+    async def _analysis(self, name, table=None):
+        result = await self.result(name)
+        if table is None:
+            payload = {'name': name, 'title': REGISTRY[name].title,
+                       'tables': {key: _records(value) for key, value in result.tables.items()},
+                       'values': _scalars(result.values)}
+        elif table in result.tables:
+            payload = _records(result.tables[table])
+        else:
+            raise HTTPError(404, f"analysis {name!r} has no table {table!r}; "
+                                 f"available: {', '.join(result.tables)}")
+        return 200, 'application/json', _json(payload)
+
+    async def _leaderboard(self, query):
+        metric = query.get('metric')
+        numeric = [col for col in self.df.columns if pd.api.types.is_numeric_dtype(self.df[col])]
+        if metric not in numeric:
+            raise HTTPError(400, f"metric must be one of: {', '.join(numeric)}")
+        try:
+            n = int(query.get('n', LEADERBOARD_DEFAULT))
+        except ValueError:
+            raise HTTPError(400, "n must be an integer") from None
+        if not 1 <= n <= LEADERBOARD_MAX:
+            raise HTTPError(400, f"n must be between 1 and {LEADERBOARD_MAX}")
+        order = query.get('order', 'asc' if metric in LOWER_IS_BETTER else 'desc')
+        if order not in ('asc', 'desc'):
+            raise HTTPError(400, "order must be 'asc' or 'desc'")
+
+        index, df = await self.ranking(metric)
+        try:
+            # The index ranks each metric in its LOWER_IS_BETTER direction
+            rows = index.top(metric, n, worst=(order == 'desc') == (metric in LOWER_IS_BETTER),
+                             weapon_class=query.get('class'))
+        except KeyError:  # a class with no weapons
+            rows = []
+        table = df.iloc[rows, [df.columns.get_loc(col) for col in ID_COLUMNS + [metric]]]
+        return 200, 'application/json', _json(_records(table.reset_index(drop=True)))
+
+    def _status(self):
+        return 200, 'application/json', _json({
+            'source': os.path.abspath(self.path), 'digest': self.digest, 'weapons': len(self.df),
+            'loaded_at': self.loaded_at, 'generation': self.generation,
+            'cached': {'analyses': sorted(self.results), 'responses': len(self.responses),
+                       'charts': sorted(self.pngs)}})
+
+    async def respond(self, target):
+        """(status, content type, body) of a GET of ``target``."""
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if self.df is None:
+            raise HTTPError(503, "weapon data is not loaded")
+        route = parts[0] if parts else 'status'
+
+        if route == 'status' and len(parts) <= 1:
+            return self._status()
+        if route == 'analyses' and len(parts) == 1:
+            return await self._cached(target, (), self._analysis_list)
+        if route == 'analyses' and len(parts) in (2, 3):
+            name = parts[1]
+            if name not in REGISTRY:
+                raise HTTPError(404, f"unknown analysis {name!r}")
+            return await self._cached(target, required_columns([name]),
+                                      lambda: self._analysis(*parts[1:]))
+        if route == 'leaderboard' and len(parts) == 1:
+            columns = set(ID_COLUMNS) | {query.get('metric')}
+            return await self._cached(target, columns, lambda: self._leaderboard(query))
+        if route == 'charts' and len(parts) == 1:
+            return 200, 'application/json', _json(list(self.jobs))
+        if route == 'charts' and len(parts) == 2:
+            return 200, 'image/png', await self.chart(parts[1])
+        raise HTTPError(404, f"no route for {url.path!r}")
+
+    async def _respond_safely(self, target):
+        try:
+            return await self.respond(target)
+        except HTTPError as exc:
+            return exc.status, 'application/json', _json({'error': str(exc)})
+        except Exception as exc:
+            self.log(f"error serving {target}: {exc!r}")
+            return 500, 'application/json', _json({'error': repr(exc)})
+
+    async def _client(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection until it closes."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length:
+                    await reader.readexactly(length)
+
+                start = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    method, target, version = '', '', 'HTTP/1.0'
+                    status, content_type, body = 400, 'application/json', _json(
+                        {'error': "malformed request line"})
+                else:
+                    if method in ('GET', 'HEAD'):
+                        status, content_type, body = await self._respond_safely(target)
+                    else:
+                        status, content_type, body = 405, 'application/json', _json(
+                            {'error': f"method {method} not allowed"})
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                head = (f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Length: {len(body)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+                writer.write(head.encode('latin-1') + (b'' if method == 'HEAD' else body))
+                await writer.drain()
+                self.log(f"{method} {target} {status} {(time.perf_counter() - start) * 1000:.2f} ms")
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT, poll=POLL_INTERVAL):
+        """Load the data, then serve and watch the CSV until cancelled."""
+        await self.reload()
+        server = await asyncio.start_server(self._client, host, port)
+        watcher = asyncio.create_task(self.watch(poll))
+        self.log(f"serving {self.path} on http://{host}:{port}/")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the weapon analyses over local HTTP.")
+    parser.add_argument('--data', default=DATA_FILE, help="weapon CSV (default: %(default)s)")
+    parser.add_argument('--host', default=HOST, help="address to bind (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=PORT, help="port (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="chart render processes (default: one per CPU)")
+    parser.add_argument('--poll', type=float, default=POLL_INTERVAL,
+                        help="seconds between checks of the CSV (default: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always parse the CSV instead of using the typed column cache")
+    parser.add_argument('--lean', action='store_true',
+                        help="keep weapon names categorical and TTKs in float32")
+    parser.add_argument('--quiet', action='store_true', help="do not log requests")
+    args = parser.parse_args(argv)
+
+    log = None if args.quiet else (lambda message: print(message, file=sys.stderr, flush=True))
+    server = AnalysisServer(args.data, args.workers, use_cache=not args.no_cache, log=log,
+                            lean=args.lean)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.poll))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""Append-only history of data.csv versions (balance patches).
+
+Every ingested CSV becomes a snapshot with a label and a timestamp.  Rows
+are deduplicated by content: a weapon row that did not change between
+patches is stored once and shared by every snapshot that contains it.
+Only rows never seen before are written, as a new columnar segment (one
+``.npy`` file per column, the same layout as the load cache in
+weapon_data.py).  Old CSVs are never parsed again.
+
+Layout of the store directory::
+
+    manifest.json          snapshots, segments and the weapon name table
+    segments/00000/        unique rows first seen in snapshot 0
+    segments/00016-compact/  every row up to snapshot 16, after merging
+    members/00000.npy      row ids of snapshot 0, in file order
+
+Segments and member lists are written before the manifest that refers to
+them, and the manifest is replaced atomically, so an interrupted ingest
+leaves the store unchanged.
+
+Segments are merged once there are more than MAX_SEGMENTS, so opening a
+store with hundreds of snapshots reads only a handful of them.  Row ids
+never change, because merging keeps the rows in order.
+
+On open, the store builds a (snapshots x weapons) grid of row ids, so a
+delta between two patches or a weapon's trajectory across every patch is a
+single fancy-indexing operation.  Weapons are identified by name, so a CSV
+that names a weapon on more than one row is rejected on ingest.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from weapon_data import DATA_FILE, file_digest, read_columns, read_weapons_csv, write_columns
+
+STORE_DIR = 'history'
+MANIFEST_FILE = 'manifest.json'
+STORE_VERSION = 1
+# Internal columns kept next to the weapon columns in every segment
+HASH_COLUMN = '_row_hash'
+WEAPON_ID_COLUMN = '_weapon_id'
+# Segments are merged into one once there are more than this many
+MAX_SEGMENTS = 16
+
+
+def _concat_rows(frames):
+    """Stack row segments, keeping the dtypes ``read_weapons_csv`` produces."""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame({HASH_COLUMN: np.empty(0, np.uint64),
+                             WEAPON_ID_COLUMN: np.empty(0, np.int32)})
+    rows = pd.concat(frames, ignore_index=True)
+    # Segments each carry their own category set, and concat would infer a
+    # string dtype for the object columns
+    rows['Weapon Class'] = rows['Weapon Class'].astype('category')
+    rows['Weapon'] = rows['Weapon'].astype(object)
+    return rows
+
+
+class SnapshotStore:
+    """A patch history on disk; see the module docstring for the layout."""
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest.get('version') != STORE_VERSION:
+                raise ValueError(f"{manifest_path} has store version "
+                                 f"{self.manifest.get('version')}, expected {STORE_VERSION}")
+        else:
+            self.manifest = {'version': STORE_VERSION, 'weapons': [], 'segments': [],
+                             'snapshots': []}
+        self._load()
+
+    def _load(self):
+        frames = [read_columns(os.path.join(self.path, 'segments', seg))
+                  for seg in self.manifest['segments']]
+        self.rows = _concat_rows(frames)
+        self._row_of_hash = dict(zip(self.rows[HASH_COLUMN].tolist(), range(len(self.rows))))
+        self.members = [np.load(os.path.join(self.path, 'members', f"{snap['id']:05d}.npy"))
+                        for snap in self.manifest['snapshots']]
+        self._index()
+
+    def _index(self):
+        """Rebuild the weapon name index and the (snapshots x weapons) grid."""
+        self.weapon_index = {name: i for i, name in enumerate(self.manifest['weapons'])}
+        weapon_ids = self.rows[WEAPON_ID_COLUMN].to_numpy()
+        self.grid = np.full((len(self.members), len(self.weapon_index)), -1, dtype=np.int64)
+        for s, members in enumerate(self.members):
+            self.grid[s, weapon_ids[members]] = members
+
+    def _write_manifest(self, manifest):
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        self.manifest = manifest
+
+    def compact(self):
+        """Merge every segment into one; row ids and snapshots are unchanged."""
+        old = self.manifest['segments']
+        if len(old) <= 1:
+            return
+        name = f'{len(self) - 1:05d}-compact'
+        write_columns(self.rows, os.path.join(self.path, 'segments', name))
+        self._write_manifest(dict(self.manifest, segments=[name]))
+        for seg in old:
+            if seg != name:
+                shutil.rmtree(os.path.join(self.path, 'segments', seg), ignore_errors=True)
+
+    def __len__(self):
+        return len(self.manifest['snapshots'])
+
+    def snapshots(self):
+        """One row per snapshot: id, label, timestamp, size and new rows."""
+        columns = ['id', 'label', 'timestamp', 'rows', 'new_rows', 'digest']
+        return pd.DataFrame(self.manifest['snapshots'], columns=columns)
+
+    def snapshot_id(self, key):
+        """Resolve a snapshot id, negative index or label (latest wins)."""
+        if isinstance(key, (int, np.integer)):
+            if not -len(self) <= key < len(self):
+                raise KeyError(f"no snapshot {key}; the store has {len(self)}")
+            return int(key) % len(self)
+        for snap in reversed(self.manifest['snapshots']):
+            if snap['label'] == key:
+                return snap['id']
+        raise KeyError(f"no snapshot labelled {key!r}")
+
+    def ingest(self, path=DATA_FILE, label=None, timestamp=None):
+        """Append the CSV at ``path`` as a new snapshot and return its id.
+
+        Re-ingesting the same file contents as the latest snapshot is a
+        no-op that returns the latest id.  Raises ValueError, before
+        anything is written, when a weapon name appears on more than one row.
+        """
+        digest = file_digest(path)
+        snaps = self.manifest['snapshots']
+        if snaps and snaps[-1]['digest'] == digest:
+            return snaps[-1]['id']
+
+        df = read_weapons_csv(path)
+        repeated = df.loc[df['Weapon'].duplicated(), 'Weapon'].unique()
+        if len(repeated):
+            shown = ', '.join(map(repr, repeated[:5])) + (', ...' if len(repeated) > 5 else '')
+            raise ValueError(f"{path} has more than one row for {len(repeated)} weapon "
+                             f"name(s): {shown}; snapshots identify weapons by name")
+        hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        weapons = list(self.manifest['weapons'])
+        weapon_index = dict(self.weapon_index)
+        for name in df['Weapon']:
+            if name not in weapon_index:
+                weapon_index[name] = len(weapons)
+                weapons.append(name)
+
+        row_ids = np.empty(len(df), dtype=np.int64)
+        new = []
+        seen = dict(self._row_of_hash)
+        for i, h in enumerate(hashes.tolist()):
+            if h not in seen:
+                seen[h] = len(self.rows) + len(new)
+                new.append(i)
+            row_ids[i] = seen[h]
+
+        snap_id = len(snaps)
+        segments = list(self.manifest['segments'])
+        os.makedirs(os.path.join(self.path, 'segments'), exist_ok=True)
+        os.makedirs(os.path.join(self.path, 'members'), exist_ok=True)
+        segment = df.iloc[new].reset_index(drop=True)
+        segment[HASH_COLUMN] = hashes[new]
+        segment[WEAPON_ID_COLUMN] = np.array([weapon_index[w] for w in segment['Weapon']],
+                                             dtype=np.int32)
+        if new:
+            name = f'{snap_id:05d}'
+            write_columns(segment, os.path.join(self.path, 'segments', name))
+            segments.append(name)
+        members_path = os.path.join(self.path, 'members', f'{snap_id:05d}.npy')
+        with open(members_path + '.tmp', 'wb') as f:
+            np.save(f, row_ids, allow_pickle=False)
+        os.replace(members_path + '.tmp', members_path)
+
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self._write_manifest(dict(self.manifest, weapons=weapons, segments=segments,
+                                  snapshots=snaps + [{
+            'id': snap_id, 'label': label or f'snapshot {snap_id}', 'timestamp': str(timestamp),
+            'rows': len(df), 'new_rows': len(new), 'digest': digest,
+            'source': os.path.basename(path)}]))
+
+        # Update the in-memory view instead of re-reading every segment
+        if new:
+            self.rows = _concat_rows([self.rows, segment])
+        self._row_of_hash = seen
+        self.members.append(row_ids)
+        self._index()
+        if len(segments) > MAX_SEGMENTS:
+            self.compact()
+        return snap_id
+
+    def frame(self, key=-1):
+        """The weapons frame of one snapshot, as ``load_weapons`` returns it."""
+        members = self.members[self.snapshot_id(key)]
+        return self.rows.iloc[members].drop(columns=[HASH_COLUMN, WEAPON_ID_COLUMN]) \
+            .reset_index(drop=True)
+
+    def _values(self, metric):
+        return self.rows[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def changed(self, a, b):
+        """Names of weapons whose row differs between snapshots ``a`` and ``b``."""
+        ra, rb = self.grid[self.snapshot_id(a)], self.grid[self.snapshot_id(b)]
+        return [self.manifest['weapons'][w] for w in np.flatnonzero(ra != rb)]
+
+    def delta(self, a, b, metric, weapon_class=None):
+        """``metric`` in snapshots ``a`` and ``b`` and its change, per weapon.
+
+        Only weapons present in both snapshots are listed, optionally only
+        those of ``weapon_class`` (as of snapshot ``b``), in ``b``'s row
+        order.
+        """
+        a, b = self.snapshot_id(a), self.snapshot_id(b)
+        rb = self.members[b]
+        ra = self.grid[a, self.rows[WEAPON_ID_COLUMN].to_numpy()[rb]]
+        keep = ra >= 0
+        if weapon_class is not None:
+            keep &= (self.rows['Weapon Class'].to_numpy()[rb] == weapon_class)
+        ra, rb = ra[keep], rb[keep]
+        values = self._values(metric)
+        return pd.DataFrame({'Weapon': self.rows['Weapon'].to_numpy()[rb],
+                             'Weapon Class': self.rows['Weapon Class'].to_numpy()[rb],
+                             'Before': values[ra], 'After': values[rb],
+                             'Delta': values[rb] - values[ra]})
+
+    def trajectory(self, weapon, metrics=None):
+        """One weapon's ``metrics`` (all by default) across every snapshot.
+
+        Snapshots without the weapon give NaN.
+        """
+        if weapon not in self.weapon_index:
+            raise KeyError(f"{weapon!r} is not in any snapshot")
+        rows = self.grid[:, self.weapon_index[weapon]]
+        present = rows >= 0
+        if metrics is None:
+            metrics = [col for col in self.rows.columns
+                       if col not in (HASH_COLUMN, WEAPON_ID_COLUMN, 'Weapon', 'Weapon Class')]
+        table = self.snapshots()[['id', 'label', 'timestamp']]
+        for metric in metrics:
+            table[metric] = np.where(present, self._values(metric)[np.maximum(rows, 0)], np.nan)
+        return table
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Patch history of the weapon data.")
+    parser.add_argument('--store', default=STORE_DIR, help="store directory (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="append a CSV version as a snapshot")
+    ingest.add_argument('csv', nargs='?', default=DATA_FILE)
+    ingest.add_argument('--label', help="patch name (default: 'snapshot <id>')")
+    ingest.add_argument('--timestamp', help="ISO time of the patch (default: now)")
+
+    commands.add_parser('list', help="list the snapshots")
+
+    delta = commands.add_parser('delta', help="change of one metric between two snapshots")
+    delta.add_argument('before', help="snapshot id or label")
+    delta.add_argument('after', help="snapshot id or label")
+    delta.add_argument('metric')
+    delta.add_argument('--class', dest='weapon_class', help="only this weapon class")
+
+    trajectory = commands.add_parser('trajectory', help="one weapon across every snapshot")
+    trajectory.add_argument('weapon')
+    trajectory.add_argument('metrics', nargs='*', help="columns to show (default: all)")
+    return parser
+
+
+def _key(value):
+    """Snapshot ids from the command line are numbers; anything else is a label."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = SnapshotStore(args.store)
+
+    if args.command == 'ingest':
+        before = len(store)
+        snap_id = store.ingest(args.csv, args.label, args.timestamp)
+        snap = store.manifest['snapshots'][snap_id]
+        if len(store) == before:
+            print(f"Unchanged: {args.csv} matches snapshot {snap_id} ({snap['label']})")
+        else:
+            print(f"Snapshot {snap_id} ({snap['label']}): {snap['rows']} rows, "
+                  f"{snap['new_rows']} new")
+    elif args.command == 'list':
+        print(store.snapshots().drop(columns='digest').to_string(index=False))
+    elif args.command == 'delta':
+        table = store.delta(_key(args.before), _key(args.after), args.metric, args.weapon_class)
+        print(table.to_string(index=False))
+    else:
+        print(store.trajectory(args.weapon, args.metrics or None).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
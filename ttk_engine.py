@@ -0,0 +1,199 @@
+"""Vectorized BTK/TTK engine.
+
+Derives bullets-to-kill and time-to-kill at arbitrary distances from the
+weapon primitives in data.csv (RPM / fire interval, muzzle velocity and the
+BTK breakpoints) instead of relying on the four precomputed
+``TTK at ... m, ms`` columns.
+
+The spreadsheet model is reproduced exactly:
+
+    TTK(d) = (BTK(d) - 1) * fire_interval + d / velocity * 1000
+
+where BTK(d) is the BTK of the nearest breakpoint at or above ``d``: a
+breakpoint column covers the band up to and including its own distance, so
+``BTK at 35`` applies from just past 20 m to 35 m, and the value measured at
+75 m is held beyond it.  The spreadsheet's own power scores follow this
+rule: the 21 m score scales with the 35 m TTK, because ``BTK at 35`` is
+the BTK that applies at 21 m.  Recomputing that column from the engine:
+
+    >>> from weapon_data import load_weapons
+    >>> df = load_weapons(use_cache=False)
+    >>> bool((btk_frame(df, [21])['BTK at 21'] == df['BTK at 35']).all())
+    True
+    >>> ttk = ttk_frame(df, BTK_DISTANCES)
+    >>> power = '21 m Power Score'
+    >>> score = df['20 m Power Score'] / ttk['TTK at 20 m, ms'] * ttk[POWER_TTK[power]]
+    >>> bool(((score - df[power]).abs() / df[power]).max() < 0.005)
+    True
+
+Every function works on whole weapons x distances grids at once.
+"""
+import numpy as np
+import pandas as pd
+
+# Distances (m) at which the spreadsheet measures bullets to kill
+BTK_DISTANCES = np.array([0, 20, 35, 75], dtype=np.float64)
+BTK_COLUMNS = ['BTK at 0', 'BTK at 20', 'BTK at 35', 'BTK at 75']
+TTK_COLUMNS = ['TTK at 0 m, ms', 'TTK at 20 m, ms', 'TTK at 35 m, ms', 'TTK at 75 m, ms']
+# Distance (m) of every spreadsheet power score; the TTK column each one
+# scales with (POWER_TTK, below) follows from the breakpoint rule.  The
+# power formula itself is not part of data.csv.
+POWER_DISTANCES = {
+    '20 m Power Score': 20,
+    '21 m Power Score': 21,
+    '35 m Power Score': 35,
+    '75 m Power Score': 75,
+}
+# Rows per block in ttk_grid, which bounds its float64 temporaries
+GRID_CHUNK_ROWS = 131_072
+
+
+def ttk_column(distance):
+    """Column name used for the TTK at ``distance`` metres."""
+    return f'TTK at {distance:g} m, ms'
+
+
+def weapon_primitives(df):
+    """Extract the (btk, fire_interval, velocity) arrays the engine works on.
+
+    ``btk`` has shape (n_weapons, 4) and holds the BTK breakpoints.  The fire
+    interval is taken from RPM where available because the
+    ``fire interval ms`` column is rounded to whole milliseconds (83 for
+    720 RPM) while the spreadsheet TTKs use the exact interval.
+    """
+    btk = df[BTK_COLUMNS].to_numpy(dtype=np.float64)
+    fire_interval = exact_fire_interval(df['RPM'].to_numpy(dtype=np.float64),
+                                        df['fire interval ms'].to_numpy(dtype=np.float64))
+    velocity = df['Velocity, ms'].to_numpy(dtype=np.float64)
+    return btk, fire_interval, velocity
+
+
+def exact_fire_interval(rpm, fire_interval):
+    """Fire interval in ms from ``rpm``, falling back to the rounded column."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exact = 60000.0 / rpm
+    return np.where(np.isfinite(exact) & (rpm > 0), exact, fire_interval)
+
+
+def _breakpoint_index(distances, breakpoints, n_rows):
+    """Index of the governing breakpoint for every (row, distance) pair.
+
+    That is the nearest breakpoint at or above the distance, or the last one
+    beyond it.  Shared 1-D breakpoints give a (n_distances,) index; per-row
+    2-D breakpoints (n_rows, n_breakpoints) give a (n_rows, n_distances)
+    index.
+    """
+    breakpoints = np.asarray(breakpoints, dtype=np.float64)
+    if breakpoints.ndim == 1:
+        idx = np.searchsorted(breakpoints, distances, side='left')
+        return np.minimum(idx, len(breakpoints) - 1)
+
+    idx = np.zeros((n_rows, len(distances)), dtype=np.intp)
+    for k in range(breakpoints.shape[1] - 1):
+        idx += distances[None, :] > breakpoints[:, k, None]
+    return idx
+
+
+def breakpoint_column(distance):
+    """Index into BTK_COLUMNS / TTK_COLUMNS of the breakpoint governing ``distance``."""
+    return int(_breakpoint_index(np.array([distance], dtype=np.float64), BTK_DISTANCES, 1)[0])
+
+
+# TTK column each spreadsheet power score scales with
+POWER_TTK = {power: TTK_COLUMNS[breakpoint_column(distance)]
+             for power, distance in POWER_DISTANCES.items()}
+
+
+def btk_at(btk, distances, breakpoints=BTK_DISTANCES):
+    """BTK for every weapon at every distance, shape (n_weapons, n_distances).
+
+    ``breakpoints`` is either shared by all weapons (1-D, sorted) or given
+    per weapon (2-D), e.g. when attachments shift the damage drop-off.
+    """
+    btk = np.asarray(btk)
+    distances = np.atleast_1d(np.asarray(distances, dtype=np.float64))
+    idx = _breakpoint_index(distances, breakpoints, len(btk))
+    if idx.ndim == 1:
+        return btk[:, idx]
+    return np.take_along_axis(btk, idx, axis=1)
+
+
+def ttk_at(btk, fire_interval, velocity, distances, breakpoints=BTK_DISTANCES,
+           dtype=np.float32):
+    """TTK in ms for every weapon at every distance, shape (n_weapons, n_distances).
+
+    The grid is built in a single pre-allocated ``dtype`` array: the travel
+    time term is written first and the per-breakpoint shot time is added in
+    place (one contiguous block of distances per breakpoint, or a masked add
+    for per-row breakpoints), so no float (n_weapons x n_distances)
+    temporaries are created.
+    """
+    btk = np.asarray(btk, dtype=np.float64)
+    fire_interval = np.asarray(fire_interval, dtype=np.float64)
+    velocity = np.asarray(velocity, dtype=np.float64)
+    distances = np.atleast_1d(np.asarray(distances, dtype=np.float64))
+
+    # Time spent firing the remaining shots after the first one lands
+    shot_time = ((btk - 1) * fire_interval[:, None]).astype(dtype)
+    with np.errstate(divide='ignore'):
+        ms_per_metre = (1000.0 / velocity).astype(dtype)
+
+    order = np.argsort(distances, kind='stable')
+    presorted = np.all(order == np.arange(len(distances)))
+    sorted_distances = distances if presorted else distances[order]
+
+    out = np.multiply.outer(ms_per_metre, sorted_distances.astype(dtype))
+    if np.ndim(breakpoints) == 1:
+        idx = _breakpoint_index(sorted_distances, breakpoints, len(btk))
+        bounds = np.searchsorted(idx, np.arange(shot_time.shape[1] + 1))
+        for k in range(shot_time.shape[1]):
+            lo, hi = bounds[k], bounds[k + 1]
+            if lo < hi:
+                out[:, lo:hi] += shot_time[:, k:k + 1]
+    else:
+        # Per-row breakpoints: add the step in shot time at each breakpoint
+        # the distance has gone past, masked in place.
+        breakpoints = np.asarray(breakpoints, dtype=np.float64)
+        out += shot_time[:, :1]
+        step = np.diff(shot_time, axis=1)
+        mask = np.empty(out.shape, dtype=bool)
+        for k in range(1, shot_time.shape[1]):
+            np.greater(sorted_distances[None, :], breakpoints[:, k - 1, None], out=mask)
+            np.add(out, step[:, k - 1:k], out=out, where=mask)
+
+    if presorted:
+        return out
+    return out[:, np.argsort(order)]
+
+
+def ttk_grid(df, distances, dtype=np.float32):
+    """TTK grid for the weapons in ``df`` at ``distances``.
+
+    Rows are computed GRID_CHUNK_ROWS at a time straight into the result,
+    so large frames never hold full-length float64 primitives.
+    """
+    distances = np.atleast_1d(np.asarray(distances, dtype=np.float64))
+    out = np.empty((len(df), len(distances)), dtype=dtype)
+    for lo in range(0, len(df), GRID_CHUNK_ROWS):
+        btk, fire_interval, velocity = weapon_primitives(df.iloc[lo:lo + GRID_CHUNK_ROWS])
+        out[lo:lo + GRID_CHUNK_ROWS] = ttk_at(btk, fire_interval, velocity, distances, dtype=dtype)
+    return out
+
+
+def ttk_frame(df, distances):
+    """TTK at ``distances`` as a DataFrame aligned with ``df``.
+
+    Columns are named like the spreadsheet (``TTK at 20 m, ms``) so the
+    result can be assigned straight back into the weapons frame.
+    """
+    distances = np.atleast_1d(np.asarray(distances, dtype=np.float64))
+    grid = ttk_grid(df, distances, dtype=np.float64)
+    return pd.DataFrame(grid, index=df.index, columns=[ttk_column(d) for d in distances])
+
+
+def btk_frame(df, distances):
+    """BTK at ``distances`` as a DataFrame aligned with ``df``."""
+    distances = np.atleast_1d(np.asarray(distances, dtype=np.float64))
+    btk, _, _ = weapon_primitives(df)
+    return pd.DataFrame(btk_at(btk, distances), index=df.index,
+                        columns=[f'BTK at {d:g}' for d in distances])
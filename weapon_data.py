@@ -0,0 +1,257 @@
+"""Typed, cached ingestion of data.csv.
+
+The spreadsheet export carries 22 metric columns followed by free-text
+explanation columns with multi-line cells.  ``load_weapons`` parses only
+the columns named in SCHEMA, coerces each one to its declared compact
+dtype and caches the result on disk as one ``.npy`` file per column, keyed
+by the content hash of the CSV.
+
+Warm loads memory-map the cached columns (copy-on-write, so callers can
+still modify the frame) and wrap them in a DataFrame without copying.  The
+CSV's content hash is remembered against its size and mtime, so a warm load
+does not read the CSV at all.
+
+Text columns are stored dictionary-encoded (distinct values plus integer
+codes).  Variant datasets repeat each base weapon's name across many rows,
+so a warm load builds one string object per distinct name rather than one
+per row, and a ``lean`` load keeps repeated names categorical.  Unique
+names stay plain strings, where categorical codes would only add to them.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+DATA_FILE = 'data.csv'
+CACHE_DIR = '.weapon_cache'
+INDEX_FILE = 'index.json'
+
+# Declared dtype of every column kept from data.csv, in file order.  'str'
+# and 'category' columns are text; integer columns that turn out to have
+# missing values are widened to float32 so NaN can be represented.
+SCHEMA = {
+    'Weapon': 'str',
+    'Weapon Class': 'category',
+    'BTK at 0': 'int8',
+    'BTK at 20': 'int8',
+    'BTK at 35': 'int8',
+    'BTK at 75': 'int8',
+    'RPM': 'int16',
+    'fire interval ms': 'int16',
+    'Velocity, ms': 'int16',
+    'TTK at 0 m, ms': 'int16',
+    'TTK at 20 m, ms': 'int16',
+    'TTK at 35 m, ms': 'int16',
+    'TTK at 75 m, ms': 'int16',
+    'Burst Hits': 'float32',
+    'Burst Accuracy Coefficient': 'float32',
+    'CQB Accuracy Coefficient': 'float32',
+    'Long Range Accuracy Coefficient': 'float32',
+    '20 m Power Score': 'int16',
+    '21 m Power Score': 'int16',
+    '35 m Power Score': 'int16',
+    '75 m Power Score': 'int16',
+    'practical lethality coefficient': 'float32',
+}
+
+# A lean load makes a text column categorical only when it has fewer
+# distinct values than this fraction of its rows
+LEAN_CATEGORY_RATIO = 0.5
+
+# Bump when the on-disk layout or the coercion rules change
+CACHE_VERSION = 3
+
+
+def _schema_digest():
+    payload = json.dumps({'version': CACHE_VERSION, 'schema': list(SCHEMA.items())})
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def file_digest(path):
+    """Content hash of the file at ``path``."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _coerce(values, dtype):
+    """Convert one parsed column to its schema dtype."""
+    if dtype == 'str':
+        return values.astype(object).where(values.notna(), None)
+    if dtype == 'category':
+        return values.astype('category')
+    numeric = pd.to_numeric(values, errors='coerce')
+    if np.dtype(dtype).kind in 'iu' and numeric.isna().any():
+        return numeric.astype(np.float32)
+    return numeric.astype(dtype)
+
+
+def _code_dtype(n):
+    """Smallest signed integer dtype that can index ``n`` distinct values."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _lean_category(n_unique, n_rows):
+    """Whether a lean load keeps a text column with ``n_unique`` values categorical."""
+    return n_unique < LEAN_CATEGORY_RATIO * n_rows
+
+
+def read_weapons_csv(path=DATA_FILE, lean=False):
+    """Parse ``path`` into a typed weapons frame without touching the cache.
+
+    ``lean`` makes the text columns categorical as well when their values
+    repeat (see LEAN_CATEGORY_RATIO).
+    """
+    raw = pd.read_csv(path, usecols=list(SCHEMA), dtype={'Weapon': object, 'Weapon Class': object})
+    raw = raw.dropna(subset=['Weapon']).reset_index(drop=True)  # Remove rows without weapon names
+    return pd.DataFrame({col: _coerce(raw[col], 'category' if dtype == 'str' and lean and
+                                      _lean_category(raw[col].nunique(), len(raw)) else dtype)
+                         for col, dtype in SCHEMA.items()})
+
+
+def write_columns(df, entry_dir):
+    """Store ``df`` as one .npy file per column plus a JSON manifest.
+
+    The files are staged in a directory unique to this call and renamed into
+    place, so processes filling the same entry at once do not collide.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(entry_dir) + '.', suffix='.tmp',
+                               dir=os.path.dirname(entry_dir) or '.')
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        meta = {'name': col, 'file': f'{i:03d}.npy'}
+        if isinstance(series.dtype, pd.CategoricalDtype) and SCHEMA.get(col) != 'str':
+            meta['kind'] = 'category'
+            meta['categories'] = [str(c) for c in series.cat.categories]
+            data = series.cat.codes.to_numpy()
+        elif series.dtype.kind in 'biuf':
+            meta['kind'] = 'numeric'
+            data = series.to_numpy()
+        else:
+            meta['kind'] = 'str'
+            meta['values'] = f'{i:03d}.values.npy'
+            # A lean frame's text columns are already encoded.  Distinct values
+            # are sorted, the category order a cold lean parse gives.
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                codes, uniques = pd.factorize(series, sort=True)
+            data = codes.astype(_code_dtype(len(uniques)))
+            np.save(os.path.join(tmp_dir, meta['values']), uniques.to_numpy(dtype=str),
+                    allow_pickle=False)
+        np.save(os.path.join(tmp_dir, meta['file']), data, allow_pickle=False)
+        columns.append(meta)
+
+    with open(os.path.join(tmp_dir, 'columns.json'), 'w') as f:
+        json.dump({'rows': len(df), 'columns': columns}, f)
+    if not os.path.exists(os.path.join(entry_dir, 'columns.json')):
+        shutil.rmtree(entry_dir, ignore_errors=True)  # left incomplete by a crash
+    try:
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        # Another process filled the entry first, from the same CSV content
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def read_columns(entry_dir, lean=False):
+    """Memory-map a directory written by ``write_columns`` back into a DataFrame.
+
+    ``lean`` keeps text columns with repeated values categorical instead of
+    expanding them.
+    """
+    with open(os.path.join(entry_dir, 'columns.json')) as f:
+        manifest = json.load(f)
+
+    data = {}
+    for meta in manifest['columns']:
+        values = np.load(os.path.join(entry_dir, meta['file']), mmap_mode='c', allow_pickle=False)
+        if meta['kind'] == 'category':
+            data[meta['name']] = pd.Categorical.from_codes(values, meta['categories'])
+        elif meta['kind'] == 'str':
+            # Text has no zero-copy pandas representation without pyarrow;
+            # expanding the codes shares one string object per distinct value.
+            # The column is built with the dtype read_weapons_csv gives (an
+            # object array would otherwise be inferred as str), and the
+            # trailing None is what missing values (code -1) expand to.
+            uniques = np.load(os.path.join(entry_dir, meta['values']), allow_pickle=False)
+            categories = uniques.astype(object)
+            if lean and _lean_category(len(categories), manifest['rows']):
+                data[meta['name']] = pd.Categorical.from_codes(values, categories)
+            else:
+                data[meta['name']] = pd.Series(np.append(categories, None)[values], dtype=object)
+        else:
+            data[meta['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _load_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(cache_dir, index):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load_weapons(path=DATA_FILE, cache_dir=CACHE_DIR, use_cache=True, lean=False):
+    """Load the typed weapons frame for ``path``, via the on-disk cache.
+
+    ``Weapon Class`` is categorical and the metric columns use the compact
+    dtypes declared in SCHEMA.  ``lean`` makes ``Weapon`` categorical too
+    when names repeat, for large variant datasets.  Pass ``use_cache=False``
+    to always parse the CSV.
+    """
+    if not use_cache:
+        with profiling.span('read_csv', 'io'):
+            return read_weapons_csv(path, lean=lean)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    source = os.path.abspath(path)
+    stat = os.stat(source)
+    index = _load_index(cache_dir)
+    known = index.get(source)
+    if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        digest = known['digest']
+    else:
+        digest = file_digest(source)
+
+    entry_dir = os.path.join(cache_dir, f'{digest}-{_schema_digest()}')
+    if os.path.exists(os.path.join(entry_dir, 'columns.json')):
+        with profiling.span('read_cache', 'io'):
+            df = read_columns(entry_dir, lean=lean)
+    else:
+        with profiling.span('read_csv', 'io'):
+            df = read_weapons_csv(source, lean=lean)
+        with profiling.span('write_cache', 'io'):
+            write_columns(df, entry_dir)
+        # Only the latest version of each source file is kept
+        stale = known.get('entry') if known else None
+        if stale and stale != os.path.basename(entry_dir) and not any(
+                other.get('entry') == stale for key, other in index.items() if key != source):
+            shutil.rmtree(os.path.join(cache_dir, stale), ignore_errors=True)
+
+    if known is None or known.get('digest') != digest or known['mtime_ns'] != stat.st_mtime_ns:
+        index[source] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                         'digest': digest, 'entry': os.path.basename(entry_dir)}
+        _save_index(cache_dir, index)
+    return df
@@ -0,0 +1,518 @@
+"""What-if balance patches, evaluated incrementally against a baseline.
+
+A patch is a list of Deltas, each scaling, shifting or setting one input
+column (RPM, velocity, a BTK breakpoint, an accuracy coefficient, ...) for
+some weapons, some classes or every weapon.  ``WhatIf`` keeps the baseline
+value of every column and evaluates a patch without copying the frame:
+
+* the edited cells become an overlay, per column the row positions and
+  new values of only the cells that actually changed;
+* derived columns are visited in dependency order (DEPENDENCIES), and each
+  recomputes only the rows where one of its inputs changed, with the same
+  engine code that produced the baseline, so untouched cells keep their
+  exact values; and
+* ranks and leaderboards start from each metric's baseline sort order and
+  correct it for the changed rows only.
+
+The derived columns follow the rest of the repo: the fire interval is
+60000 / RPM rounded to whole milliseconds, the TTKs are the engine's (see
+ttk_engine), a power score scales with the TTK it is measured at
+(POWER_TTK; the spreadsheet's power formula is not part of data.csv), and
+the composite score is analyses'.  The composite normalises by each
+column's minimum and maximum, so a patch that moves one of them rescores
+every weapon; it is the only derived column that can change outside the
+edited rows.
+
+Ranks are 1-based positions in leaderboard order (ties keep row order, as
+in ``analyses.leaderboard``); weapons with a missing value are unranked
+(NaN).  Patches can also be written as text, e.g. ``"TR-7: RPM *0.9"`` or
+``"class LMG: Velocity, ms +50"`` (see ``parse_delta``).
+
+On the 31 weapons of data.csv, ``compare`` evaluates and ranks a
+single-weapon patch in about 0.6 ms (some 1,700 patches per second).  The
+arrays involved are a few elements long, so the time is numpy's per-call
+overhead, spread over the ten derived columns a patch revisits; it grows
+little with the number of weapons.
+"""
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from analyses import (COMPOSITE_WEIGHTS, ID_COLUMNS, LEADERBOARD_SIZE, LOWER_IS_BETTER,
+                      composite_component, composite_scores, top_rows)
+from class_index import ClassIndex
+from rank_index import RankIndex
+from ttk_engine import BTK_COLUMNS, BTK_DISTANCES, POWER_TTK, TTK_COLUMNS, exact_fire_interval, ttk_at
+
+COMPOSITE = 'composite_score'
+# Derived column -> the columns it is computed from, in dependency order.
+# The TTK at a breakpoint distance only reads that breakpoint's BTK.
+DEPENDENCIES = {
+    'fire interval ms': ['RPM'],
+    **{ttk: [btk, 'RPM', 'fire interval ms', 'Velocity, ms']
+       for btk, ttk in zip(BTK_COLUMNS, TTK_COLUMNS)},
+    **{power: [ttk] for power, ttk in POWER_TTK.items()},
+    COMPOSITE: list(COMPOSITE_WEIGHTS),
+}
+# Metrics a patch is ranked by unless others are named
+RANKED = TTK_COLUMNS + list(POWER_TTK) + [COMPOSITE]
+# With more changed rows than this, a metric is re-sorted rather than corrected
+INCREMENTAL_ROWS = 256
+# Largest rows x edited rows product tested for membership by broadcasting
+DIRECT_MEMBERSHIP = 4096
+OPERATORS = {
+    '*': np.multiply,
+    '+': np.add,
+    '-': np.subtract,
+    '=': lambda values, value: np.full_like(values, value),
+}
+DELTA_PATTERN = re.compile(r'^\s*(?P<target>[^:]+):\s*(?P<column>.+?)\s*(?P<op>[*+=-])\s*'
+                           r'(?P<value>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*$')
+
+_NO_ROWS = np.empty(0, dtype=np.intp)
+
+
+@dataclass(frozen=True)
+class Delta:
+    """One change of a patch: ``column <op> value`` for the selected weapons.
+
+    ``op`` is '*' (scale), '+' or '-' (shift) or '=' (set).  ``weapons``
+    and ``classes`` select rows by weapon name and class; with neither,
+    every weapon changes.
+    """
+    column: str
+    op: str
+    value: float
+    weapons: tuple = ()
+    classes: tuple = ()
+
+    def __str__(self):
+        target = ', '.join(self.weapons + tuple(f'class {c}' for c in self.classes)) or 'all'
+        return f'{target}: {self.column} {self.op}{self.value:g}'
+
+
+def parse_delta(text):
+    """A Delta from ``"<target>: <column> <op><value>"``.
+
+    The target is comma-separated weapon names, ``class <name>`` entries,
+    or ``all``.  For example ``"TR-7, KV9: RPM *0.9"`` or
+    ``"class LMG: Velocity, ms +50"``.
+    """
+    match = DELTA_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"cannot parse delta {text!r}; expected '<target>: <column> <op><value>'")
+    weapons, classes = [], []
+    for part in match['target'].split(','):
+        part = part.strip()
+        if part.lower().startswith('class '):
+            classes.append(part[6:].strip())
+        elif part.lower() != 'all':
+            weapons.append(part)
+    return Delta(match['column'], match['op'], float(match['value']), tuple(weapons), tuple(classes))
+
+
+def _changed(old, new):
+    """Mask of the cells where ``new`` differs from ``old`` (NaN equals NaN)."""
+    return ~((old == new) | (np.isnan(old) & np.isnan(new)))
+
+
+def _absent(rows, edited):
+    """Mask of the ``rows`` not in ``edited``.
+
+    A few edited rows are compared directly, which is several times faster
+    than ``np.isin`` at the sizes a single-weapon patch produces.
+    """
+    if len(rows) * len(edited) <= DIRECT_MEMBERSHIP:
+        return (rows[:, None] != edited).all(axis=1)
+    return ~np.isin(rows, edited)
+
+
+def _before(keys_a, rows_a, key, row):
+    """Mask of the (key, row) pairs that rank ahead of ``(key, row)``."""
+    return (keys_a < key) | ((keys_a == key) & (rows_a < row))
+
+
+@dataclass
+class PatchResult:
+    """A patch evaluated against a WhatIf baseline.
+
+    ``overlay`` maps every changed column to (row positions, new values)
+    of the cells whose value changed, rows ascending.  ``recomputed``
+    counts the cells each derived column recomputed.
+    """
+    whatif: 'WhatIf'
+    patch: list
+    overlay: dict
+    recomputed: dict
+
+    @property
+    def edited_rows(self):
+        """Rows the patch's deltas changed directly."""
+        edited = [rows for col, (rows, _) in self.overlay.items() if col not in DEPENDENCIES]
+        return np.unique(np.concatenate(edited)) if edited else _NO_ROWS
+
+    def values(self, column, rows=None):
+        """Patched values of ``column`` at ``rows`` (every row by default)."""
+        return self.whatif.overlay_values(self.overlay, column, rows)
+
+    def changes(self):
+        """Every changed cell: Column, Weapon, Weapon Class, Before and After."""
+        frames = []
+        for column, (rows, new) in self.overlay.items():
+            table = self.whatif.identity(rows)
+            table.insert(0, 'Column', column)
+            table['Before'] = self.whatif.base[column][rows]
+            table['After'] = new
+            frames.append(table)
+        if not frames:
+            return pd.DataFrame(columns=['Column'] + ID_COLUMNS + ['Before', 'After'])
+        return pd.concat(frames)
+
+    def ranks(self, metric, rows=None):
+        """Patched ranks of ``rows`` (every row by default) by ``metric``."""
+        whatif = self.whatif
+        if metric not in self.overlay:
+            return whatif.baseline_ranks(metric, rows)
+        edited, new = self.overlay[metric]
+        if rows is None or len(edited) > INCREMENTAL_ROWS:
+            ranks = whatif.rank_values(self.values(metric), metric)
+            return ranks if rows is None else ranks[rows]
+
+        # Baseline position of each row's patched (key, row), corrected for
+        # the edited rows counted there at their old key and missing at
+        # their new one
+        whatif.ordered(metric)
+        sign = whatif.sign(metric)
+        old_keys = sign * whatif.base[metric][edited]
+        new_keys = sign * new
+        rows = np.asarray(rows)
+        ranks = np.full(len(rows), np.nan)
+        for i, (row, value) in enumerate(zip(rows, self.values(metric, rows))):
+            if np.isnan(value):
+                continue
+            key = sign * value
+            ahead = whatif.index.position(metric, value, row)
+            ahead -= np.count_nonzero(_before(old_keys, edited, key, row))
+            ahead += np.count_nonzero(_before(new_keys, edited, key, row))
+            ranks[i] = ahead + 1
+        return ranks
+
+    def leaderboard(self, metric, n=LEADERBOARD_SIZE):
+        """The patched top ``n`` by ``metric``: identity columns + metric."""
+        rows = self.top(metric, n)
+        table = self.whatif.identity(rows)
+        table[metric] = self.values(metric, rows)
+        return table
+
+    def top(self, metric, n=LEADERBOARD_SIZE):
+        """Row positions of the patched top ``n`` by ``metric``, best first."""
+        whatif = self.whatif
+        edited, new = self.overlay.get(metric, (_NO_ROWS, _NO_ROWS))
+        if len(edited) > INCREMENTAL_ROWS:
+            rows = top_rows(self.values(metric), n, largest=whatif.sign(metric) < 0)
+        else:
+            # The baseline top n + len(edited) holds the top n of the
+            # unedited rows; merge the edited rows in at their new values
+            order, keys, n_valid = whatif.ordered(metric)
+            head = min(n + len(edited), n_valid)
+            keep = _absent(order[:head], edited)
+            new_keys = whatif.sign(metric) * new
+            valid = ~np.isnan(new_keys)
+            rows = np.concatenate([order[:head][keep], edited[valid]])
+            merged = np.concatenate([keys[:head][keep], new_keys[valid]])
+            rows = rows[np.lexsort((rows, merged))[:n]]
+        return rows
+
+    def rank_changes(self, metrics=None):
+        """Value and rank of the edited weapons by each metric, before and after.
+
+        One row per (metric, edited weapon) where either changed: Metric,
+        Weapon, Weapon Class, Before, After, Rank Before and Rank After.
+        """
+        whatif = self.whatif
+        rows = self.edited_rows
+        frames = []
+        for metric in metrics or RANKED:
+            metric = whatif.column(metric)
+            before, after = whatif.base[metric][rows], self.values(metric, rows)
+            rank_before, rank_after = whatif.baseline_ranks(metric, rows), self.ranks(metric, rows)
+            moved = _changed(before, after) | _changed(rank_before, rank_after)
+            table = whatif.identity(rows[moved])
+            table.insert(0, 'Metric', metric)
+            table['Before'], table['After'] = before[moved], after[moved]
+            table['Rank Before'], table['Rank After'] = rank_before[moved], rank_after[moved]
+            frames.append(table)
+        return pd.concat(frames) if frames else pd.DataFrame()
+
+
+class WhatIf:
+    """Baseline of a weapons frame that patches are evaluated against.
+
+    ``df`` is a frame as returned by ``analyses.prepare_frame``, so that its
+    TTKs are the engine's and recomputed cells match untouched ones.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.base = {col: df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                     for col in df.columns if pd.api.types.is_numeric_dtype(df[col])}
+        self.base[COMPOSITE] = composite_scores(df)
+        self.limits = {col: (float(df[col].min()), float(df[col].max())) for col in COMPOSITE_WEIGHTS}
+        self.ttk_dtypes = {col: df[col].dtype for col in TTK_COLUMNS}
+        self.names = ClassIndex.from_labels(df['Weapon'])
+        # Name of every code, with None last for code -1 (no name)
+        self._name_values = np.array(list(self.names.names) + [None], dtype=object)
+        self.classes = ClassIndex.from_frame(df)
+        self._name_codes = {name: i for i, name in enumerate(self.names.names)}
+        self._class_codes = {name: i for i, name in enumerate(self.classes.names)}
+        self._columns = {col.lower(): col for col in self.base}
+        self._id_positions = [df.columns.get_loc(col) for col in ID_COLUMNS]
+        self.index = RankIndex(classes=self.classes)
+        self._rank_cache = {}
+
+    def identity(self, rows):
+        """Identity columns of ``rows``, without touching the other columns."""
+        return self.df.iloc[rows, self._id_positions]
+
+    def _weapon_names(self, rows):
+        """Weapon names of ``rows``, from the name codes rather than the frame."""
+        return self._name_values[self.names.codes[rows]]
+
+    # -- baseline orders ----------------------------------------------------
+
+    def sign(self, metric):
+        """+1 where lower values rank first, -1 where higher ones do."""
+        return 1.0 if metric in LOWER_IS_BETTER else -1.0
+
+    def ordered(self, metric):
+        """Baseline (order, sorted keys, valid count) of ``metric``, NaNs last.
+
+        The ranked metrics are indexed together on first use of any of them.
+        """
+        if metric not in self.index:
+            metrics = [m for m in RANKED if m not in self.index] if metric in RANKED else [metric]
+            self.index.add({m: self.base[m] for m in metrics},
+                           descending={m for m in metrics if self.sign(m) < 0})
+        return self.index.ordered(metric)
+
+    def rank_values(self, values, metric):
+        """Ranks of every row for ``values`` of ``metric``."""
+        keys = self.sign(metric) * values
+        order = np.argsort(keys, kind='stable')
+        ranks = np.empty(len(keys))
+        ranks[order] = np.arange(1, len(keys) + 1)
+        ranks[np.isnan(keys)] = np.nan
+        return ranks
+
+    def baseline_ranks(self, metric, rows=None):
+        """Baseline ranks of ``rows`` (every row by default) by ``metric``."""
+        if rows is not None:
+            self.ordered(metric)
+            return self.index.rank(metric, rows)
+        if metric not in self._rank_cache:
+            order, _, n_valid = self.ordered(metric)
+            ranks = np.full(len(order), np.nan)
+            ranks[order[:n_valid]] = np.arange(1, n_valid + 1)
+            self._rank_cache[metric] = ranks
+        return self._rank_cache[metric]
+
+    # -- patches ------------------------------------------------------------
+
+    def column(self, name):
+        column = self._columns.get(name.strip().lower())
+        if column is None:
+            raise KeyError(f"unknown column {name!r}")
+        return column
+
+    def _rows(self, delta):
+        """Row positions a delta selects, ascending."""
+        if not delta.weapons and not delta.classes:
+            return np.arange(len(self.df))
+        parts = []
+        for index, codes, names, kind in ((self.names, self._name_codes, delta.weapons, 'weapon'),
+                                          (self.classes, self._class_codes, delta.classes, 'class')):
+            for name in names:
+                if name not in codes:
+                    raise KeyError(f"unknown {kind} {name!r}")
+                parts.append(index.positions(codes[name]))
+        return np.unique(np.concatenate(parts))
+
+    def overlay_values(self, overlay, column, rows=None):
+        """Values of ``column`` at ``rows`` (every row by default) under ``overlay``."""
+        values = self.base[column].copy() if rows is None else self.base[column][rows]
+        if column in overlay:
+            edited, new = overlay[column]
+            if rows is None:
+                values[edited] = new
+            elif len(edited):
+                at = np.minimum(np.searchsorted(edited, rows), len(edited) - 1)
+                hit = edited[at] == rows
+                values[hit] = new[at[hit]]
+        return values
+
+    def _set(self, overlay, column, rows, values):
+        """Record the cells of ``values`` that differ from the baseline."""
+        changed = _changed(self.base[column][rows], values)
+        if changed.any():
+            overlay[column] = (rows[changed], values[changed])
+        else:
+            overlay.pop(column, None)
+
+    def _compute(self, overlay, column, rows, ttks):
+        """Recompute derived ``column`` at ``rows``; returns (rows, values).
+
+        The composite returns every row when the patch moves a column's
+        minimum or maximum.  ``ttks`` caches the patch's TTK grids by rows,
+        so TTK columns recomputed at the same rows (an RPM or velocity
+        patch) share one engine call.
+        """
+        def value(col):
+            return self.overlay_values(overlay, col, rows)
+
+        if column == 'fire interval ms':
+            return rows, np.round(exact_fire_interval(value('RPM'), self.base[column][rows]))
+        if column in self.ttk_dtypes:
+            key = (rows.tobytes(), self.ttk_dtypes[column])
+            if key not in ttks:
+                btk = np.column_stack([value(col) for col in BTK_COLUMNS])
+                fire_interval = exact_fire_interval(value('RPM'), value('fire interval ms'))
+                ttks[key] = ttk_at(btk, fire_interval, value('Velocity, ms'), BTK_DISTANCES,
+                                   dtype=self.ttk_dtypes[column])
+            return rows, ttks[key][:, TTK_COLUMNS.index(column)].astype(np.float64)
+        if column in POWER_TTK:
+            ttk = POWER_TTK[column]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return rows, self.base[column][rows] * value(ttk) / self.base[ttk][rows]
+
+        limits = {col: self._limits(overlay, col) for col in COMPOSITE_WEIGHTS}
+        if limits != self.limits:
+            rows = None
+        components = np.column_stack([
+            composite_component(col, self.overlay_values(overlay, col, rows), *limits[col])
+            for col in COMPOSITE_WEIGHTS])
+        scores = components @ np.array(list(COMPOSITE_WEIGHTS.values()))
+        return (np.arange(len(self.df)) if rows is None else rows), scores
+
+    def _limits(self, overlay, column):
+        """(min, max) of ``column`` under ``overlay``, from the baseline order."""
+        if column not in overlay:
+            return self.limits[column]
+        edited, new = overlay[column]
+        # The unedited extremes are among the first and last len(edited) + 1
+        # valid rows of the baseline order
+        order, _, n_valid = self.ordered(column)
+        span = len(edited) + 1
+        head, tail = order[:min(span, n_valid)], order[max(n_valid - span, 0):n_valid]
+        head, tail = head[_absent(head, edited)], tail[_absent(tail, edited)]
+        values = np.concatenate([self.base[column][head[:1]], self.base[column][tail[-1:]], new])
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return (np.nan, np.nan)
+        return (float(values.min()), float(values.max()))
+
+    def evaluate(self, patch):
+        """PatchResult of ``patch``: a Delta, a delta string, or a list of them."""
+        if isinstance(patch, (str, Delta)):
+            patch = [patch]
+        patch = [parse_delta(d) if isinstance(d, str) else d for d in patch]
+
+        # Deltas on the same column apply in order, to the running values
+        edits = {}
+        for delta in patch:
+            column = self.column(delta.column)
+            if column in DEPENDENCIES:
+                raise ValueError(f"{column!r} is derived from {', '.join(DEPENDENCIES[column])}; "
+                                 "patch those instead")
+            if delta.op not in OPERATORS:
+                raise ValueError(f"op must be one of {list(OPERATORS)}, got {delta.op!r}")
+            rows = self._rows(delta)
+            old_rows, old_values = edits.get(column, (_NO_ROWS, _NO_ROWS))
+            all_rows = np.union1d(old_rows, rows)
+            values = self.base[column][all_rows]
+            values[np.searchsorted(all_rows, old_rows)] = old_values
+            at = np.searchsorted(all_rows, rows)
+            values[at] = OPERATORS[delta.op](values[at], delta.value)
+            edits[column] = (all_rows, values)
+
+        overlay = {}
+        for column, (rows, values) in edits.items():
+            self._set(overlay, column, rows, values)
+        recomputed, ttks = {}, {}
+        for column, inputs in DEPENDENCIES.items():
+            changed = [overlay[col][0] for col in inputs if col in overlay]
+            if not changed:
+                continue
+            # Overlay rows are ascending and unique already
+            rows = changed[0] if len(changed) == 1 else np.unique(np.concatenate(changed))
+            rows, values = self._compute(overlay, column, rows, ttks)
+            recomputed[column] = len(rows)
+            self._set(overlay, column, rows, values)
+        return PatchResult(self, patch, overlay, recomputed)
+
+    def compare(self, patches, metric=COMPOSITE, n=LEADERBOARD_SIZE):
+        """How each patch changes the top ``n`` by ``metric``.
+
+        One row per patch: the patch, the new leader, and the weapons that
+        enter and leave the top ``n``.  Leaderboards are compared as row
+        positions; only the weapons that moved are looked up by name.
+        """
+        metric = self.column(metric)
+        order, _, n_valid = self.ordered(metric)
+        baseline = order[:min(n, n_valid)].tolist()
+        in_baseline = set(baseline)
+        rows = []
+        for patch in patches:
+            result = self.evaluate(patch)
+            top = result.top(metric, n).tolist()
+            in_top = set(top)
+            entered = [row for row in top if row not in in_baseline]
+            left = [row for row in baseline if row not in in_top]
+            rows.append({'Patch': '; '.join(map(str, result.patch)),
+                         'Leader': self._weapon_names(top[0]) if top else None,
+                         'Entered': ', '.join(map(str, self._weapon_names(entered))),
+                         'Left': ', '.join(map(str, self._weapon_names(left)))})
+        return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    from analyses import prepare_frame
+    from weapon_data import DATA_FILE, load_weapons
+
+    parser = argparse.ArgumentParser(description="Evaluate a hypothetical balance patch.")
+    parser.add_argument('deltas', nargs='+', metavar='DELTA',
+                        help="'<target>: <column> <op><value>', e.g. 'TR-7: RPM *0.9' or "
+                             "'class LMG: Velocity, ms +50'")
+    parser.add_argument('--data', default=DATA_FILE, help="weapon CSV (default: %(default)s)")
+    parser.add_argument('--metric', default=COMPOSITE,
+                        help="metric of the leaderboard comparison (default: %(default)s)")
+    parser.add_argument('--top', type=int, default=LEADERBOARD_SIZE,
+                        help="leaderboard size (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    whatif = WhatIf(prepare_frame(load_weapons(args.data)))
+    try:
+        result = whatif.evaluate(args.deltas)
+        metric = whatif.column(args.metric)
+    except (KeyError, ValueError) as e:
+        parser.error(str(e.args[0]))
+
+    print(f"Patch: {'; '.join(map(str, result.patch))}\n")
+    print(result.changes().to_string(index=False, float_format='{:.2f}'.format))
+    print("\nRank changes of the patched weapons:\n")
+    rank = '{:.0f}'.format
+    print(result.rank_changes().to_string(index=False, float_format='{:.2f}'.format,
+                                          formatters={'Rank Before': rank, 'Rank After': rank}))
+    before = PatchResult(whatif, [], {}, {}).leaderboard(metric, args.top)
+    after = result.leaderboard(metric, args.top)
+    print(f"\nTop {args.top} by {metric}, before -> after:\n")
+    for rank, (old, new) in enumerate(zip(before['Weapon'], after['Weapon']), start=1):
+        print(f"  {rank:2d}. {old:20s} -> {new}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())